@@ -0,0 +1,32 @@
+"""Benchmark loading a directory of ChemKED files serially and with a process pool.
+
+Run with ``python benchmarks/bench_collection.py``.
+"""
+import os
+from tempfile import TemporaryDirectory
+
+import yaml
+
+from pyked.chemked import ChemKEDCollection
+
+from common import synthetic_properties, best_time
+
+
+def main(n_files=32, n_datapoints=50):
+    properties = synthetic_properties(n_datapoints)
+    with TemporaryDirectory() as root:
+        for i in range(n_files):
+            subdir = os.path.join(root, 'group-{}'.format(i % 4))
+            os.makedirs(subdir, exist_ok=True)
+            with open(os.path.join(subdir, 'file-{}.yaml'.format(i)), 'w') as f:
+                yaml.safe_dump(properties, f)
+
+        print('{} files with {} datapoints each ({} CPUs):'.format(
+            n_files, n_datapoints, os.cpu_count()))
+        for max_workers in [1, 2, 4, None]:
+            t = best_time(lambda: ChemKEDCollection(root, max_workers=max_workers), repeat=1)
+            print('    max_workers={!s:4} {:7.2f} s'.format(max_workers, t))
+
+
+if __name__ == '__main__':
+    main()
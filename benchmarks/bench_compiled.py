@@ -0,0 +1,23 @@
+"""Benchmark validating a large ChemKED file with Cerberus and with the compiled validator.
+
+Run with ``python benchmarks/bench_compiled.py``.
+"""
+from pyked.validation import schema, OurValidator
+from pyked.compiled import CompiledValidator
+
+from common import synthetic_properties, best_time
+
+
+def main():
+    for n_datapoints in [100, 1000]:
+        properties = synthetic_properties(n_datapoints)
+        print('{} datapoints:'.format(n_datapoints))
+        cerberus = best_time(lambda: OurValidator(schema).validate(properties))
+        print('    cerberus {:9.2f} ms'.format(cerberus * 1e3))
+        compiled = best_time(lambda: CompiledValidator(schema).validate(properties))
+        print('    compiled {:9.2f} ms ({:.1f}x faster)'.format(
+            compiled * 1e3, cerberus / compiled))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+"""Benchmark building a pandas DataFrame from a ChemKED file with many species and datapoints.
+
+Run with ``python benchmarks/bench_dataframe.py``.
+"""
+from pyked.chemked import ChemKED
+
+from common import synthetic_properties, best_time
+
+
+def many_species_properties(n_datapoints, n_species):
+    """Build shock tube properties where each datapoint has a different set of species."""
+    properties = synthetic_properties(n_datapoints)
+    for i, dp in enumerate(properties['datapoints']):
+        species = []
+        for j in range(4):
+            name = 'S{}'.format((i + j) % n_species)
+            species.append({'species-name': name, 'amount': [0.25],
+                            'InChI': '1S/{}'.format(name)})
+        dp['composition']['species'] = species
+    return properties
+
+
+def main():
+    for n_datapoints, n_species in [(1000, 10), (5000, 200)]:
+        c = ChemKED(dict_input=many_species_properties(n_datapoints, n_species),
+                    skip_validation=True)
+        print('{} datapoints, {} species:'.format(n_datapoints, n_species))
+        for si_units in [False, True]:
+            t = best_time(lambda: c.get_dataframe(si_units=si_units))
+            print('    si_units={!s:5} {:9.2f} ms'.format(si_units, t * 1e3))
+
+
+if __name__ == '__main__':
+    main()
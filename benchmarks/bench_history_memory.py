@@ -0,0 +1,112 @@
+"""Benchmark the memory used by the time histories of an RCM file with several long histories.
+
+The file has one datapoint with five time histories, whose values are in one CSV file with a
+time column and a column for each history. Each way of storing the values is loaded in a new
+process, all of the histories are used, and the increase of the peak resident set size over the
+process after importing PyKED is reported. For comparison, ``genfromtxt per history`` reads the
+file once for each history and wraps the strided columns, as PyKED did before the values were
+shared, and ``copied columns`` makes the contiguous copies of the strided columns that NumPy
+code often needs.
+
+Run with ``python benchmarks/bench_history_memory.py``.
+"""
+import os
+import time
+import resource
+import multiprocessing
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import yaml
+
+from common import load_properties
+
+HISTORY_TYPES = [('pressure', 'bar'), ('volume', 'cm3'), ('temperature', 'K'),
+                 ('piston position', 'mm'), ('light emission', 'dimensionless')]
+
+
+def write_file(directory, n_rows):
+    """Write an RCM file with a time history of each type in ``HISTORY_TYPES``."""
+    values = np.empty((n_rows, len(HISTORY_TYPES) + 1))
+    values[:, 0] = np.linspace(0.0, 0.1, n_rows)
+    for i in range(len(HISTORY_TYPES)):
+        values[:, i + 1] = np.sin(values[:, 0] * (i + 1)) + 2.0
+    np.savetxt(os.path.join(directory, 'histories.csv'), values, delimiter=',')
+    np.save(os.path.join(directory, 'histories.npy'), np.asfortranarray(values))
+
+    properties = load_properties('testfile_rcm.yaml')
+    properties['datapoints'][0]['time-histories'] = [
+        {'type': kind, 'time': {'units': 's', 'column': 0},
+         'quantity': {'units': units, 'column': i + 1},
+         'values': {'filename': 'histories.csv'}}
+        for i, (kind, units) in enumerate(HISTORY_TYPES)
+    ]
+    filename = os.path.join(directory, 'rcm.yaml')
+    with open(filename, 'w') as f:
+        yaml.safe_dump(properties, f)
+
+    properties['datapoints'][0]['time-histories'] = [
+        dict(hist, values={'filename': 'histories.npy'})
+        for hist in properties['datapoints'][0]['time-histories']
+    ]
+    with open(os.path.join(directory, 'rcm_npy.yaml'), 'w') as f:
+        yaml.safe_dump(properties, f)
+    return filename
+
+
+def peak_rss():
+    """Return the peak resident set size of this process in MB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load(mode, directory):
+    """Load the file in a new process and use all of its time histories."""
+    from pyked.chemked import ChemKED, TimeHistory
+    from pyked.validation import Q_
+
+    before = peak_rss()
+    start = time.perf_counter()
+    if mode in ['genfromtxt per history', 'copied columns']:
+        histories = []
+        c = ChemKED(os.path.join(directory, 'rcm.yaml'), skip_validation=True)
+        for hist in c._properties['datapoints'][0]['time-histories']:
+            values = np.genfromtxt(os.path.join(directory, 'histories.csv'), delimiter=',')
+            history = TimeHistory(time=Q_(values[:, hist['time']['column']], 's'),
+                                  quantity=Q_(values[:, hist['quantity']['column']], 'bar'),
+                                  type=hist['type'])
+            if mode == 'copied columns':
+                history = history._replace(
+                    time=Q_(np.ascontiguousarray(history.time.magnitude), 's'),
+                    quantity=Q_(np.ascontiguousarray(history.quantity.magnitude), 'bar'))
+            histories.append(history)
+    else:
+        filename = 'rcm_npy.yaml' if mode == 'npy (memory-mapped)' else 'rcm.yaml'
+        history_dtype = 'float32' if mode == 'shared, float32' else None
+        c = ChemKED(os.path.join(directory, filename), skip_validation=True,
+                    history_dtype=history_dtype)
+        d = c.datapoints[0]
+        histories = [getattr(d, '{}_history'.format(kind.replace(' ', '_')))
+                     for kind, units in HISTORY_TYPES]
+    total = sum(float(h.quantity.magnitude.sum()) for h in histories)
+    elapsed = time.perf_counter() - start
+    return peak_rss() - before, elapsed, total
+
+
+def main():
+    modes = ['genfromtxt per history', 'copied columns', 'shared, float64', 'shared, float32',
+             'npy (memory-mapped)']
+    context = multiprocessing.get_context('spawn')
+    with TemporaryDirectory() as temp_dir:
+        for n_rows in [100000, 1000000]:
+            write_file(temp_dir, n_rows)
+            size = os.path.getsize(os.path.join(temp_dir, 'histories.csv')) / 2**20
+            print('{} histories of {} rows ({:.0f} MB of CSV):'.format(
+                len(HISTORY_TYPES), n_rows, size))
+            for mode in modes:
+                with context.Pool(1) as pool:
+                    rss, elapsed, total = pool.apply(load, (mode, temp_dir))
+                print('    {:24} peak RSS +{:8.1f} MB  {:8.2f} s'.format(mode, rss, elapsed))
+
+
+if __name__ == '__main__':
+    main()
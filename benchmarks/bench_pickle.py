@@ -0,0 +1,40 @@
+"""Benchmark sending the datapoints of a large ChemKED file between processes.
+
+The datapoints are pickled with `DataPoint.__getstate__`, which stores the quantities as magnitudes
+and unit strings, and for comparison with Pint's own pickling of the quantities.
+
+Run with ``python benchmarks/bench_pickle.py``.
+"""
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+from pyked.chemked import ChemKED
+
+from common import synthetic_properties, best_time
+
+
+def count(datapoints):
+    return len(datapoints)
+
+
+def main():
+    for n_datapoints in [1000, 10000]:
+        c = ChemKED(dict_input=synthetic_properties(n_datapoints), skip_validation=True)
+        datapoints = c.datapoints
+        states = [dp.__dict__ for dp in datapoints]
+        print('{} datapoints:'.format(n_datapoints))
+        for name, obj in [('DataPoint', datapoints), ('Pint pickling', states)]:
+            data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+            dump_time = best_time(lambda: pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+            load_time = best_time(lambda: pickle.loads(data))
+            print('    {:14} {:8.1f} kB  dump {:8.2f} ms  load {:8.2f} ms'.format(
+                name, len(data) / 1e3, dump_time * 1e3, load_time * 1e3))
+
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            executor.submit(count, []).result()
+            pool_time = best_time(lambda: executor.submit(count, datapoints).result())
+        print('    round trip to a worker process: {:8.2f} ms'.format(pool_time * 1e3))
+
+
+if __name__ == '__main__':
+    main()
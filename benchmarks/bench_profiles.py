@@ -0,0 +1,27 @@
+"""Benchmark validating a large ChemKED file with each validation profile.
+
+The DOI and ORCIDs are removed from the file, so the ``full`` profile does not include the time
+spent looking them up.
+
+Run with ``python benchmarks/bench_profiles.py``.
+"""
+from pyked.validation import OurValidator, prepare_schema, profile_schema, validation_profiles
+from pyked.compiled import CompiledValidator
+
+from common import synthetic_properties, best_time
+
+
+def main():
+    properties = synthetic_properties(1000)
+    print('1000 datapoints:')
+    for profile in sorted(validation_profiles):
+        profile_schema_ = profile_schema(profile)
+        cerberus = best_time(lambda: OurValidator(prepare_schema(profile_schema_)).validate(
+            properties))
+        compiled = best_time(lambda: CompiledValidator(profile_schema_).validate(properties))
+        print('    {:10} cerberus {:9.2f} ms    compiled {:9.2f} ms'.format(
+            profile, cerberus * 1e3, compiled * 1e3))
+
+
+if __name__ == '__main__':
+    main()
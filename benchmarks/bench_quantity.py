@@ -0,0 +1,59 @@
+"""Benchmark parsing quantities with the fast-path parser compared to the pint parser.
+
+Run with ``python benchmarks/bench_quantity.py``.
+"""
+from pyked import chemked, validation
+from pyked.chemked import ChemKED
+from pyked.validation import Q_, parse_quantity
+
+from common import load_properties, synthetic_properties, best_time
+
+
+def quantity_strings(properties):
+    """Collect the value strings from the datapoints of ``properties``."""
+    strings = []
+    for dp in properties['datapoints']:
+        for prop in ['temperature', 'ignition-delay', 'pressure']:
+            if prop in dp:
+                strings.append(dp[prop][0])
+    return strings
+
+
+def use_pint_parser():
+    """Switch PyKED back to the pint expression parser."""
+    chemked.parse_quantity = Q_
+    validation.parse_quantity = Q_
+
+
+def use_fast_parser():
+    chemked.parse_quantity = parse_quantity
+    validation.parse_quantity = parse_quantity
+
+
+def main():
+    cases = [
+        ('testfile_many_species.yaml', load_properties('testfile_many_species.yaml')),
+        ('synthetic, 10k datapoints', synthetic_properties(10000)),
+    ]
+    for name, properties in cases:
+        strings = quantity_strings(properties)
+        pint_time = best_time(lambda: [Q_(s) for s in strings])
+        fast_time = best_time(lambda: [parse_quantity(s) for s in strings])
+        print('{}: {} value strings'.format(name, len(strings)))
+        print('    pint parser:       {:10.2f} ms'.format(pint_time * 1e3))
+        print('    fast-path parser:  {:10.2f} ms'.format(fast_time * 1e3))
+
+        # Validation of the full synthetic file is slow, so only construct the first 1000 points
+        properties = dict(properties, datapoints=properties['datapoints'][:1000])
+        number = 20 if len(properties['datapoints']) < 100 else 1
+        use_pint_parser()
+        pint_time = best_time(lambda: ChemKED(dict_input=properties), number=number)
+        use_fast_parser()
+        fast_time = best_time(lambda: ChemKED(dict_input=properties), number=number)
+        print('    ChemKED ({} datapoints):'.format(len(properties['datapoints'])))
+        print('        pint parser:       {:10.2f} ms'.format(pint_time * 1e3))
+        print('        fast-path parser:  {:10.2f} ms'.format(fast_time * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""Benchmark loading the ChemKED schema with and without the schema cache.
+
+Run with ``python benchmarks/bench_schema.py``.
+"""
+import os
+import subprocess
+import sys
+import timeit
+from tempfile import TemporaryDirectory
+
+from pyked.validation import load_schema
+
+
+def import_time(cache_dir, repeat=5):
+    """Return the best wall time to import `pyked.validation` in a fresh interpreter."""
+    env = dict(os.environ, PYKED_CACHE_DIR=cache_dir)
+    code = ('import time; t = time.perf_counter(); import pyked.validation; '
+            'print(time.perf_counter() - t)')
+    times = []
+    for _ in range(repeat):
+        out = subprocess.check_output([sys.executable, '-c', code], env=env)
+        times.append(float(out))
+    return min(times)
+
+
+def main():
+    number = 20
+    parsed = min(timeit.repeat(lambda: load_schema(use_cache=False), number=number, repeat=3))
+    cached = min(timeit.repeat(load_schema, number=number, repeat=3))
+    print('load_schema, parsed: {:8.3f} ms'.format(parsed / number * 1e3))
+    print('load_schema, cached: {:8.3f} ms'.format(cached / number * 1e3))
+
+    with TemporaryDirectory() as cache_dir:
+        # The unwritable cache directory forces the schema to be parsed on every import
+        no_cache = os.path.join(cache_dir, 'no-cache')
+        open(no_cache, 'w').close()
+        print('import pyked.validation, no cache:   {:8.3f} ms'.format(
+            import_time(no_cache) * 1e3))
+        import_time(cache_dir, repeat=1)
+        print('import pyked.validation, warm cache: {:8.3f} ms'.format(
+            import_time(cache_dir) * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""Benchmark loading a large ChemKED file with and without a snapshot.
+
+The file is validated with the ``units`` profile, and the validation cache is disabled, so the
+time without a snapshot includes the validation.
+
+Run with ``python benchmarks/bench_snapshot.py``.
+"""
+import os
+from tempfile import TemporaryDirectory
+
+import yaml
+
+from pyked.cache import FileCache
+from pyked.chemked import ChemKED
+from pyked.snapshot import set_snapshot_cache
+from pyked.validation import set_validation_cache
+
+from common import synthetic_properties, best_time
+
+
+def main():
+    set_validation_cache(None)
+    with TemporaryDirectory() as temp_dir:
+        set_snapshot_cache(FileCache(os.path.join(temp_dir, 'snapshots')))
+        for n_datapoints in [100, 1000]:
+            filename = os.path.join(temp_dir, 'file-{}.yaml'.format(n_datapoints))
+            with open(filename, 'w') as f:
+                yaml.dump(synthetic_properties(n_datapoints), f, Dumper=yaml.CSafeDumper)
+
+            cold = best_time(lambda: ChemKED(filename, validation='units'))
+            ChemKED(filename, validation='units', use_snapshot=True)
+            warm = best_time(lambda: ChemKED(filename, validation='units', use_snapshot=True))
+            print('{:5} datapoints: without snapshot {:9.2f} ms, with snapshot {:9.2f} ms'.format(
+                n_datapoints, cold * 1e3, warm * 1e3))
+
+
+if __name__ == '__main__':
+    main()
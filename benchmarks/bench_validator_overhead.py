@@ -0,0 +1,36 @@
+"""Benchmark the per-file overhead of creating a validator for the ChemKED schema.
+
+Cerberus normalizes and checks the schema whenever a validator is created with it. The
+prepared schema (see `pyked.validation.prepare_schema`) does this once per process.
+
+Run with ``python benchmarks/bench_validator_overhead.py``.
+"""
+from pyked.validation import schema, OurValidator, prepare_schema
+from pyked.compiled import CompiledValidator
+
+from common import load_properties, best_time
+
+
+def main():
+    number = 50
+    properties = load_properties('testfile_st.yaml')
+    prepare_schema(schema)
+    CompiledValidator(schema)
+
+    print('Creating a validator:')
+    for name, create in [('schema', lambda: OurValidator(schema)),
+                         ('prepared schema', lambda: OurValidator(prepare_schema(schema))),
+                         ('compiled', lambda: CompiledValidator(schema))]:
+        t = best_time(create, number=number)
+        print('    {:16} {:9.3f} ms'.format(name, t * 1e3))
+
+    print('Validating testfile_st.yaml with a new validator:')
+    for name, create in [('schema', lambda: OurValidator(schema)),
+                         ('prepared schema', lambda: OurValidator(prepare_schema(schema))),
+                         ('compiled', lambda: CompiledValidator(schema))]:
+        t = best_time(lambda: create().validate(properties), number=number)
+        print('    {:16} {:9.3f} ms'.format(name, t * 1e3))
+
+
+if __name__ == '__main__':
+    main()
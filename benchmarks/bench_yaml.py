@@ -0,0 +1,39 @@
+"""Benchmark loading and dumping ChemKED files with libyaml and pure-Python PyYAML.
+
+Run with ``python benchmarks/bench_yaml.py``.
+"""
+import numpy as np
+import yaml
+
+from common import load_properties, best_time
+
+
+def history_properties(n_points=50000):
+    """Build the properties of an RCM file with a long inline volume history."""
+    properties = load_properties('testfile_rcm.yaml')
+    time = np.linspace(0.0, 0.1, n_points)
+    volume = 500.0 - 450.0 * np.sin(time * 10.0)
+    properties['datapoints'][0]['time-histories'][0]['values'] = np.column_stack(
+        (time, volume)).tolist()
+    return properties
+
+
+def main():
+    if not yaml.__with_libyaml__:
+        print('PyYAML was built without libyaml, nothing to compare')
+        return
+
+    for n_points in [1000, 50000]:
+        properties = history_properties(n_points)
+        text = yaml.dump(properties, Dumper=yaml.CSafeDumper)
+        print('RCM file with {} history points ({:.1f} kB):'.format(n_points, len(text) / 1e3))
+        for name, loader, dumper in [('pure Python', yaml.SafeLoader, yaml.SafeDumper),
+                                     ('libyaml', yaml.CSafeLoader, yaml.CSafeDumper)]:
+            load_time = best_time(lambda: yaml.load(text, Loader=loader))
+            dump_time = best_time(lambda: yaml.dump(properties, Dumper=dumper))
+            print('    {:12s} load: {:9.2f} ms, dump: {:9.2f} ms'.format(
+                name, load_time * 1e3, dump_time * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Shared helpers for the PyKED benchmarks.
+"""
+import os
+import timeit
+from copy import deepcopy
+
+import yaml
+
+TEST_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        'pyked', 'tests')
+
+
+def test_file(name):
+    """Return the full path to one of the test files distributed with PyKED."""
+    return os.path.join(TEST_DIR, name)
+
+
+def load_properties(name, *, offline=True):
+    """Load the properties of a test file.
+
+    With ``offline`` set, the DOI and ORCIDs are removed so that validating the properties does
+    not make any network requests.
+    """
+    with open(test_file(name), 'r') as f:
+        properties = yaml.safe_load(f)
+
+    if offline:
+        properties['reference'].pop('doi', None)
+        for author in properties['file-authors'] + properties['reference']['authors']:
+            author.pop('ORCID', None)
+
+    return properties
+
+
+def synthetic_properties(n_datapoints=10000, *, uncertainty=True):
+    """Build the properties of a shock tube file with ``n_datapoints`` datapoints.
+
+    The datapoints are based on ``testfile_st.yaml``, with a different temperature and ignition
+    delay for each point. Every other point includes an absolute uncertainty.
+    """
+    properties = load_properties('testfile_st.yaml')
+    template = properties['datapoints'][0]
+    datapoints = []
+    for i in range(n_datapoints):
+        dp = deepcopy(template)
+        dp['temperature'] = ['{:.2f} kelvin'.format(900.0 + (i % 1000) * 0.75)]
+        dp['ignition-delay'] = ['{:.2f} us'.format(50.0 + (i % 997) * 1.25)]
+        if uncertainty and i % 2:
+            dp['temperature'].append({'uncertainty-type': 'absolute', 'uncertainty': '10 K'})
+            dp['ignition-delay'].append({'uncertainty-type': 'relative', 'uncertainty': 0.1})
+        datapoints.append(dp)
+
+    properties['datapoints'] = datapoints
+    return properties
+
+
+def best_time(func, *, number=1, repeat=3):
+    """Return the best time per call of ``func`` in seconds."""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
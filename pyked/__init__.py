@@ -1,2 +1,2 @@
-from .chemked import ChemKED  # noqa: F401
+from .chemked import ChemKED, ChemKEDCollection  # noqa: F401
 from ._version import __version__  # noqa: F401
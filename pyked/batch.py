@@ -0,0 +1,239 @@
+"""
+Batch validation of ChemKED files
+
+The ``ck_validate`` command validates many ChemKED files in a pool of processes. Each process
+keeps one validator for all of the files it validates, so the schema is only prepared (and
+compiled, with ``--engine compiled``) once per process, and keeps the results of the DOI and
+ORCID lookups, so each DOI and ORCID is only looked up once per process. Lookups that failed
+for other reasons than the DOI or ORCID not being found, such as a timeout, are made again for
+the next file. Lookups are also shared between processes and between runs by the on-disk caches
+of `pyked.crossref` and `pyked.orcid`, which ``ck_validate`` enables.
+
+The result for each file is written as one line of JSON as soon as it is available, followed by
+a summary. The exit status is non-zero if any file is not valid. Files whose contents were
+already validated with the same profile are not validated again, unless ``--no-cache`` is given.
+The results are cached in ``validation.sqlite`` in the PyKED cache directory (see
+`~pyked.validation.enable_validation_cache`).
+
+Examples:
+    Validate a database in eight processes, without looking up the DOIs and ORCIDs:
+
+    .. code-block:: bash
+
+        ck_validate -j 8 --validation units ChemKED-database/
+"""
+# Standard libraries
+import os
+import sys
+import fnmatch
+import glob
+import json
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+
+# Local imports
+from .validation import (load_yaml, prefetch_metadata, profile_schema, validation_profiles,
+                         ValidationTimings, is_validated, store_validated, _needs_lookups,
+                         enable_validation_cache)
+from .offline import MissingMetadataError
+from .crossref import enable_reference_cache
+from .orcid import enable_orcid_cache
+from .chemked import _validators
+
+_worker = {}
+"""`dict`: The validator and lookups of the current process, and the options they were created
+for"""
+
+
+def find_files(paths, pattern='*.yaml'):
+    """Find the ChemKED files given by filenames, glob patterns, and directories.
+
+    Args:
+        paths (`list`): Filenames, glob patterns (e.g., ``'db/**/*.yaml'``), or directories that
+            are searched recursively for files matching ``pattern``
+        pattern (`str`, optional): Shell-style pattern of the filenames in directories
+
+    Returns:
+        `list`: The filenames, sorted and without duplicates
+    """
+    filenames = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, files in os.walk(path):
+                filenames.update(os.path.join(dirpath, f) for f in fnmatch.filter(files, pattern))
+        elif any(c in path for c in '*?['):
+            filenames.update(f for f in glob.glob(path, recursive=True) if os.path.isfile(f))
+        else:
+            filenames.add(path)
+    return sorted(filenames)
+
+
+def _get_worker(validation, validation_engine):
+    """Return the state of the current process, creating the validator on first use."""
+    options = (validation, validation_engine)
+    if _worker.get('options') != options:
+        _worker['options'] = options
+        _worker['prefetched'] = {}
+        _worker['validator'] = _validators[validation_engine](
+            profile_schema(validation), prefetched=_worker['prefetched'])
+    return _worker
+
+
+def _is_reusable(result):
+    """Return whether the result of a DOI or ORCID lookup can be used for other files.
+
+    Successful lookups and DOIs and ORCIDs that were not found, either by the web API or in the
+    offline bundle, are reusable. Other failures, such as timeouts and connection errors, may not
+    happen again, so the lookup is made again for the next file that needs it.
+    """
+    if not isinstance(result, Exception):
+        return True
+    if isinstance(result, MissingMetadataError):
+        return True
+    status_code = getattr(getattr(result, 'response', None), 'status_code', None)
+    if status_code is None:
+        status_code = getattr(result, 'status_code', None)
+    return status_code == 404
+
+
+def _validate_file(filename, validation='full', validation_engine='cerberus', profile=False,
+                   use_cache=True):
+    """Validate one ChemKED file with the validator of the current process.
+
+    Args:
+        filename (`str`): The filename of the ChemKED file
+        validation (`str`, optional): The validation profile, see `~pyked.chemked.ChemKED`
+        validation_engine (`str`, optional): ``'cerberus'`` or ``'compiled'``, see
+            `~pyked.chemked.ChemKED`
+        profile (`bool`, optional): Whether to record the time taken by each stage and rule
+        use_cache (`bool`, optional): Whether to use the validation cache
+
+    Returns:
+        `dict`: The result for the file, with the keys ``'file'``, ``'valid'``, ``'errors'``, and
+            ``'time'``, ``'cached'`` if the file was already validated, and ``'timings'`` if the
+            validation is profiled
+    """
+    worker = _get_worker(validation, validation_engine)
+    start = time.perf_counter()
+    result = {'file': filename}
+    timings = ValidationTimings() if profile else None
+    lookups = {}
+    enable_reference_cache()
+    enable_orcid_cache()
+    if use_cache:
+        enable_validation_cache()
+    try:
+        with open(filename, 'r') as f:
+            properties = load_yaml(f)
+        use_cache = use_cache and timings is None
+        if use_cache and is_validated(properties, validation):
+            result.update(valid=True, errors={}, cached=True)
+            result['time'] = time.perf_counter() - start
+            return result
+        if _needs_lookups(validation):
+            prefetched = worker['prefetched']
+            if timings is None:
+                lookups = prefetch_metadata(properties, exclude=prefetched)
+            else:
+                with timings.timed('stages', 'prefetch'):
+                    lookups = prefetch_metadata(properties, exclude=prefetched)
+            prefetched.update(lookups)
+        if timings is None:
+            validator = worker['validator']
+        else:
+            # The config of a validator is fixed, so a profiled validation needs its own
+            validator = _validators[validation_engine](
+                profile_schema(validation), prefetched=worker['prefetched'], timings=timings)
+        result['valid'] = validator.validate(properties)
+        result['errors'] = validator.errors
+        if use_cache and result['valid']:
+            store_validated(properties, validation, worker['prefetched'])
+    except Exception as e:
+        result['valid'] = False
+        result['errors'] = '{}: {}'.format(type(e).__name__, e)
+    for lookup, value in lookups.items():
+        if not _is_reusable(value):
+            del worker['prefetched'][lookup]
+    result['time'] = time.perf_counter() - start
+    if timings is not None:
+        result['timings'] = timings.report()
+    return result
+
+
+def main(argv=None):
+    """Command-line entry point for validating ChemKED files.
+    """
+    parser = ArgumentParser(
+        description='Validate ChemKED files in parallel, writing the result for each file as a '
+                    'line of JSON.'
+        )
+    parser.add_argument('paths',
+                        nargs='+',
+                        help='ChemKED files, glob patterns, or directories that are searched for '
+                             'ChemKED files'
+                        )
+    parser.add_argument('-j', '--jobs',
+                        type=int,
+                        default=None,
+                        help='Number of worker processes (default: one per CPU)'
+                        )
+    parser.add_argument('--pattern',
+                        type=str,
+                        default='*.yaml',
+                        help='Pattern of the filenames in directories (default: "*.yaml")'
+                        )
+    parser.add_argument('--validation',
+                        choices=sorted(validation_profiles),
+                        default='full',
+                        help='Validation profile (default: "full")'
+                        )
+    parser.add_argument('--engine',
+                        choices=sorted(_validators),
+                        default='cerberus',
+                        help='Validation engine (default: "cerberus")'
+                        )
+    parser.add_argument('--profile',
+                        action='store_true',
+                        help='Include the time taken by each stage and rule of the validation'
+                        )
+
+    parser.add_argument('--no-cache',
+                        dest='no_cache',
+                        action='store_true',
+                        help='Validate every file, even if its contents were already validated'
+                        )
+
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    filenames = find_files(args.paths, args.pattern)
+    options = [args.validation, args.engine, args.profile, not args.no_cache]
+
+    n_invalid = 0
+    executor = None
+    if args.jobs == 1 or len(filenames) < 2:
+        results = (_validate_file(f, *options) for f in filenames)
+    else:
+        executor = ProcessPoolExecutor(max_workers=args.jobs)
+        # Send the files in chunks, but not so large that the results stop streaming
+        n_workers = args.jobs or os.cpu_count() or 1
+        chunksize = max(1, min(16, len(filenames) // (4 * n_workers)))
+        results = executor.map(_validate_file, filenames,
+                               *[[option] * len(filenames) for option in options],
+                               chunksize=chunksize)
+
+    try:
+        for result in results:
+            if not result['valid']:
+                n_invalid += 1
+            print(json.dumps(result, default=str), flush=True)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    print('Validated {} files in {:.1f} s: {} valid, {} invalid'.format(
+        len(filenames), time.perf_counter() - start, len(filenames) - n_invalid, n_invalid),
+        file=sys.stderr)
+    if n_invalid:
+        sys.exit(1)
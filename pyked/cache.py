@@ -0,0 +1,411 @@
+"""Module for on-disk caches used by PyKED.
+"""
+# Standard libraries
+import os
+import json
+import pickle
+import sqlite3
+import threading
+import time
+from tempfile import NamedTemporaryFile
+
+
+def get_cache_dir():
+    """Return the directory used to store PyKED cache files.
+
+    The directory can be set by the ``PYKED_CACHE_DIR`` environment variable. Otherwise, the
+    user's cache directory is used (``XDG_CACHE_HOME``, ``LOCALAPPDATA`` on Windows, or
+    ``~/.cache``). The directory is not created by this function.
+
+    Returns:
+        `str`: Path to the PyKED cache directory
+    """
+    cache_dir = os.environ.get('PYKED_CACHE_DIR')
+    if cache_dir:
+        return cache_dir
+
+    base_dir = os.environ.get('XDG_CACHE_HOME') or os.environ.get('LOCALAPPDATA')
+    if not base_dir:
+        base_dir = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base_dir, 'pyked')
+
+
+def read_pickle(filename):
+    """Read an object from a pickle file in the cache.
+
+    Args:
+        filename (`str`): Name of the cache file
+
+    Returns:
+        The unpickled object, or `None` if the file is missing or cannot be read, for example
+        because it was written with a newer pickle protocol.
+    """
+    try:
+        with open(filename, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+
+
+def write_pickle(obj, filename):
+    """Atomically write an object to a pickle file in the cache.
+
+    The object is written to a temporary file that is then renamed, so concurrent readers never
+    see a partially-written file. Errors writing the file (e.g., a read-only file system) are
+    ignored, since the cache is only an optimization.
+
+    Args:
+        obj: Object to be pickled
+        filename (`str`): Name of the cache file
+
+    Returns:
+        `bool`: `True` if the file was written, `False` otherwise.
+    """
+    dirname = os.path.dirname(filename)
+    try:
+        os.makedirs(dirname, exist_ok=True)
+        with NamedTemporaryFile('wb', dir=dirname, delete=False) as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        return False
+
+    try:
+        os.replace(f.name, filename)
+    except OSError:
+        os.remove(f.name)
+        return False
+    return True
+
+
+_missing = object()
+
+
+class MetadataCache(object):
+    """Persistent cache of metadata from web APIs, stored in an SQLite database.
+
+    Values must be serializable to JSON. Entries expire ``ttl`` seconds after they were stored,
+    and when there are more than ``max_entries`` entries, or the keys and JSON values take more
+    than ``max_bytes``, the least recently used entries are evicted. SQLite reuses the space of
+    evicted entries, so the database file stays close to ``max_bytes``. The cache can be shared
+    between threads and processes. Errors reading or writing the database are ignored and
+    treated as cache misses, since the cache is only an optimization. The numbers of hits and
+    misses of `get` in the current process are counted in ``hits`` and ``misses``.
+
+    Arguments:
+        filename (`str`): Name of the SQLite database file. The directory is created if
+            necessary.
+        ttl (`float`, optional): Time in seconds after which entries expire. `None` means the
+            entries never expire. Must be supplied as a keyword-argument.
+        max_entries (`int`, optional): Maximum number of entries in the cache. Must be supplied
+            as a keyword-argument.
+        max_bytes (`int`, optional): Maximum total size of the keys and values in the cache.
+            `None` means the size is only limited by ``max_entries``. Must be supplied as a
+            keyword-argument.
+
+    Examples:
+        >>> cache = MetadataCache(os.path.join(get_cache_dir(), 'crossref.sqlite'))
+        >>> cache.set('10.1016/j.combustflame.2017.10.017', {'volume': '188'})
+        >>> cache.get('10.1016/j.combustflame.2017.10.017')
+        {'volume': '188'}
+    """
+    def __init__(self, filename, *, ttl=30 * 24 * 3600, max_entries=10000,
+                 max_bytes=64 * 1024**2):
+        self.filename = filename
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._connection = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        """Return the connection to the database, creating the database if necessary."""
+        # SQLite connections must not be used after a fork, so forked processes reconnect
+        if self._connection is None or self._pid != os.getpid():
+            dirname = os.path.dirname(self.filename)
+            if dirname:
+                os.makedirs(dirname, exist_ok=True)
+            connection = sqlite3.connect(self.filename, timeout=10, check_same_thread=False)
+            with connection:
+                connection.execute('CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, '
+                                   'value TEXT, created REAL, accessed REAL)')
+                connection.execute('CREATE INDEX IF NOT EXISTS accessed_index '
+                                   'ON metadata (accessed)')
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def get(self, key, default=None):
+        """Return the cached value for a key.
+
+        Args:
+            key (`str`): The key to look up
+            default (optional): The value to return if the key is not in the cache or has expired
+
+        Returns:
+            The cached value, or ``default``
+        """
+        now = time.time()
+        with self._lock:
+            try:
+                connection = self._connect()
+                row = connection.execute('SELECT value, created FROM metadata WHERE key = ?',
+                                         (key,)).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return default
+                value, created = row
+                with connection:
+                    if self.ttl is not None and now - created > self.ttl:
+                        connection.execute('DELETE FROM metadata WHERE key = ?', (key,))
+                        self.misses += 1
+                        return default
+                    connection.execute('UPDATE metadata SET accessed = ? WHERE key = ?',
+                                       (now, key))
+            except (sqlite3.Error, OSError):
+                self.misses += 1
+                return default
+            self.hits += 1
+        return json.loads(value)
+
+    def set(self, key, value):
+        """Store a value in the cache, evicting the least recently used entries if necessary.
+
+        Args:
+            key (`str`): The key to store the value under
+            value: The value to be stored, which must be serializable to JSON
+        """
+        now = time.time()
+        value = json.dumps(value)
+        with self._lock:
+            try:
+                connection = self._connect()
+                with connection:
+                    connection.execute('INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?)',
+                                       (key, value, now, now))
+                    connection.execute('DELETE FROM metadata WHERE key NOT IN (SELECT key FROM '
+                                       'metadata ORDER BY accessed DESC LIMIT ?)',
+                                       (self.max_entries,))
+                    if self.max_bytes is not None:
+                        self._evict_bytes(connection)
+            except (sqlite3.Error, OSError):
+                pass
+
+    def _evict_bytes(self, connection):
+        """Remove the least recently used entries until the total size is below ``max_bytes``."""
+        size = 'LENGTH(CAST(key AS BLOB)) + LENGTH(CAST(value AS BLOB))'
+        total = connection.execute('SELECT TOTAL({}) FROM metadata'.format(size)).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        rows = connection.execute('SELECT key, {} FROM metadata ORDER BY accessed'.format(size))
+        for key, entry_size in rows.fetchall():
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= entry_size
+        connection.executemany('DELETE FROM metadata WHERE key = ?', evicted)
+
+    def delete(self, key):
+        """Remove a key from the cache, if it is present.
+
+        Args:
+            key (`str`): The key to remove
+        """
+        with self._lock:
+            try:
+                connection = self._connect()
+                with connection:
+                    connection.execute('DELETE FROM metadata WHERE key = ?', (key,))
+            except (sqlite3.Error, OSError):
+                pass
+
+    def clear(self):
+        """Remove all of the entries from the cache."""
+        with self._lock:
+            try:
+                connection = self._connect()
+                with connection:
+                    connection.execute('DELETE FROM metadata')
+            except (sqlite3.Error, OSError):
+                pass
+
+    def stats(self):
+        """Return the statistics of the cache.
+
+        Returns:
+            `dict`: The number of ``'hits'`` and ``'misses'`` in the current process, and the
+                number of ``'entries'`` in the cache
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self)}
+
+    def __len__(self):
+        with self._lock:
+            try:
+                return self._connect().execute('SELECT COUNT(*) FROM metadata').fetchone()[0]
+            except (sqlite3.Error, OSError):
+                return 0
+
+    def __contains__(self, key):
+        return self.get(key, _missing) is not _missing
+
+    def close(self):
+        """Close the connection to the database. It is reopened by the next access."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def __getstate__(self):
+        # Connections and locks cannot be pickled, so worker processes open their own
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+class FileCache(object):
+    """Persistent cache of binary data, stored as one file per key in a directory.
+
+    When the files take more than ``max_bytes``, the least recently used files are evicted. The
+    cache can be shared between threads and processes, since files are written atomically (see
+    `write_pickle`). Errors reading or writing the files are ignored and treated as cache misses,
+    since the cache is only an optimization. The numbers of hits and misses of `get` in the
+    current process are counted in ``hits`` and ``misses``.
+
+    Arguments:
+        directory (`str`): The directory that stores the files. It is created if necessary.
+        max_bytes (`int`, optional): Maximum total size of the files. Must be supplied as a
+            keyword-argument.
+
+    Examples:
+        >>> cache = FileCache(os.path.join(get_cache_dir(), 'snapshots'))
+        >>> cache.set('0123abcd', b'data')
+        >>> cache.get('0123abcd')
+        b'data'
+    """
+    suffix = '.bin'
+    """`str`: The extension of the files in the cache"""
+
+    def __init__(self, directory, *, max_bytes=512 * 1024**2):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _filename(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def _entries(self):
+        """Return the filename, size, and time of last use of each file in the cache."""
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return entries
+        for name in names:
+            if not name.endswith(self.suffix):
+                continue
+            filename = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            entries.append((filename, stat.st_size, stat.st_mtime))
+        return entries
+
+    def get(self, key):
+        """Return the cached data for a key.
+
+        Args:
+            key (`str`): The key to look up, which must be usable as a filename
+
+        Returns:
+            `bytes`: The cached data, or `None` if the key is not in the cache
+        """
+        filename = self._filename(key)
+        try:
+            with open(filename, 'rb') as f:
+                data = f.read()
+            # The modification time records the last use, for the eviction
+            os.utime(filename)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def set(self, key, data):
+        """Store data in the cache, evicting the least recently used files if necessary.
+
+        Args:
+            key (`str`): The key to store the data under, which must be usable as a filename
+            data (`bytes`): The data to be stored
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with NamedTemporaryFile('wb', dir=self.directory, delete=False) as f:
+                f.write(data)
+        except OSError:
+            return
+        try:
+            os.replace(f.name, self._filename(key))
+        except OSError:
+            os.remove(f.name)
+            return
+        self._evict()
+
+    def _evict(self):
+        """Remove the least recently used files until the total size is below ``max_bytes``."""
+        entries = self._entries()
+        total = sum(size for filename, size, mtime in entries)
+        for filename, size, mtime in sorted(entries, key=lambda entry: entry[2]):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(filename)
+            except OSError:
+                continue
+            total -= size
+
+    def delete(self, key):
+        """Remove a key from the cache, if it is present.
+
+        Args:
+            key (`str`): The key to remove
+        """
+        try:
+            os.remove(self._filename(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        """Remove all of the files from the cache."""
+        for filename, size, mtime in self._entries():
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+
+    def stats(self):
+        """Return the statistics of the cache.
+
+        Returns:
+            `dict`: The number of ``'hits'`` and ``'misses'`` in the current process, and the
+                number of ``'entries'`` and total ``'bytes'`` of the files in the cache
+        """
+        entries = self._entries()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(entries),
+                'bytes': sum(size for filename, size, mtime in entries)}
+
+    def __len__(self):
+        return len(self._entries())
+
+    def __contains__(self, key):
+        return os.path.exists(self._filename(key))
@@ -2,26 +2,39 @@
 Main ChemKED module
 """
 # Standard libraries
+import os
+import io
+import fnmatch
+import pickle
+import weakref
 from os.path import exists
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
 from warnings import warn
 from copy import deepcopy
 import xml.etree.ElementTree as etree
-import xml.dom.minidom as minidom
+from xml.sax.saxutils import escape
 from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 
 # Local imports
-from .validation import schema, OurValidator, yaml, Q_
+from .validation import (schema, OurValidator, Q_, parse_quantity, load_yaml, dump_yaml,
+                         property_units, prefetch_metadata, prepare_schema, validation_profiles,
+                         profile_schema, _needs_lookups, ValidationTimings, is_validated,
+                         store_validated)
+from .compiled import CompiledValidator
 from .converters import datagroup_properties, ReSpecTh_to_ChemKED
+from .snapshot import (snapshot_key, load_snapshot, store_snapshot, encode_quantities,
+                       decode_quantities)
 
 VolumeHistory = namedtuple('VolumeHistory', ['time', 'volume'])
 VolumeHistory.__doc__ = 'Time history of the volume in an RCM experiment. Deprecated, to be removed after PyKED 0.4'  # noqa: E501
 VolumeHistory.time.__doc__ = '(`~numpy.ndarray`): the time during the experiment'
 VolumeHistory.volume.__doc__ = '(`~numpy.ndarray`): the volume during the experiment'
 
-TimeHistory = namedtuple('TimeHistory', ['time', 'quantity', 'type'])
+TimeHistory = namedtuple('TimeHistory', ['time', 'quantity', 'type', 'uncertainty'])
+TimeHistory.__new__.__defaults__ = (None,)
 TimeHistory.__doc__ = 'Time history of the quantity in an RCM experiment'
 TimeHistory.time.__doc__ = '(`~numpy.ndarray`): the time during the experiment'
 TimeHistory.quantity.__doc__ = '(`~numpy.ndarray`): the quantity of interest during the experiment'
@@ -36,6 +49,12 @@ TimeHistory.type.__doc__ = """\
 * OH emission
 * absorption
 """
+TimeHistory.uncertainty.__doc__ = """\
+(`~numpy.ndarray`): the absolute uncertainty of each value of the quantity, in the units of the
+quantity, or `None` if the time history has no uncertainty. Relative uncertainties are multiplied
+by the magnitude of the quantity. A single uncertainty ``value`` is a read-only broadcast view
+rather than a copy for each value.
+"""
 
 RCMData = namedtuple(
     'RCMData',
@@ -78,6 +97,246 @@ Composition.atomic_composition.__doc__ = '(`dict`) The atomic composition of the
 Composition.amount.__doc__ = '(`~pint.Quantity`) The amount of this species'
 
 
+def _to_si_arrays(values, si_units):
+    """Convert a list of quantities into arrays of nominal values and uncertainties in SI units.
+
+    Arguments:
+        values (`list`): The values to be converted. Each value may be a `~pint.Quantity` (with or
+            without uncertainty), a number, or `None` for a missing value.
+        si_units (`str`): The SI units to convert to
+
+    Returns:
+        `tuple`: Arrays of the nominal values and standard deviations. Missing values and
+            uncertainties are `~numpy.nan`.
+    """
+    nominal = np.full(len(values), np.nan)
+    std = np.full(len(values), np.nan)
+
+    # Group the values by units so each group is converted with a single call to pint
+    groups = {}
+    for i, value in enumerate(values):
+        if value is None:
+            continue
+        if isinstance(value, Q_):
+            magnitude, unit = value.magnitude, value.units
+        else:
+            magnitude, unit = value, None
+        groups.setdefault(unit, []).append((
+            i, getattr(magnitude, 'nominal_value', magnitude),
+            getattr(magnitude, 'std_dev', np.nan),
+        ))
+
+    for unit, group in groups.items():
+        indices, group_nominal, group_std = (np.array(a, dtype=float) for a in zip(*group))
+        indices = indices.astype(int)
+        if unit is not None:
+            # Uncertainties are differences, so only the scale of the conversion applies
+            zero, one = Q_(np.array([0.0, 1.0]), unit).to(si_units).magnitude
+            group_nominal = Q_(group_nominal, unit).to(si_units).magnitude
+            group_std = group_std * (one - zero)
+        nominal[indices] = group_nominal
+        std[indices] = group_std
+
+    return nominal, std
+
+
+_history_values = weakref.WeakValueDictionary()
+"""Arrays of the time history values read from files, shared by the datapoints that use them"""
+
+
+def _history_filename(filename, base_dir=None):
+    """Return the absolute filename of the file of time history values.
+
+    Relative filenames are relative to ``base_dir``, or to the current working directory if
+    ``base_dir`` is `None`. Files that are only found relative to the current working directory
+    are still used, with a `DeprecationWarning`.
+    """
+    if base_dir is not None and not os.path.isabs(filename):
+        path = os.path.join(base_dir, filename)
+        if exists(path) or not exists(filename):
+            return os.path.abspath(path)
+        warn('The time history file {} should be relative to the directory of the ChemKED file. '
+             'Files relative to the working directory will not be found after PyKED '
+             '0.5'.format(filename), DeprecationWarning)
+    return os.path.abspath(filename)
+
+
+def _history_array(values, dtype=None):
+    """Return the inline values of a time history as a column-major array.
+
+    Each column of the array is contiguous, so the time and quantity of the time history are
+    contiguous views of one buffer.
+    """
+    return np.array(values, dtype=np.float64 if dtype is None else dtype, order='F')
+
+
+def _read_history_values(filename, array=None, dtype=None):
+    """Read the values of a time history from a CSV file or a NumPy sidecar file.
+
+    ``.npy`` files are memory-mapped, so the time histories are views of the file and only the
+    parts that are used are read. ``.npz`` files cannot be memory-mapped and are read with
+    `numpy.load`, using the array named ``array``, or the first array if ``array`` is `None`.
+    Other files are read as comma-separated values.
+
+    The values are stored in column-major order with the data type ``dtype`` (64-bit floats by
+    default), except that memory-mapped files with that data type are used as they are. The
+    array is shared by all of the time histories with values in the same version of the file,
+    so it is read-only.
+    """
+    dtype = np.dtype(np.float64 if dtype is None else dtype)
+    stat = os.stat(filename)
+    key = (filename, array, dtype.str, stat.st_mtime_ns, stat.st_size)
+    values = _history_values.get(key)
+    if values is None:
+        extension = os.path.splitext(filename)[1].lower()
+        if extension == '.npy':
+            values = np.load(filename, mmap_mode='r')
+            if values.dtype != dtype:
+                values = np.asfortranarray(values, dtype=dtype)
+        elif extension == '.npz':
+            with np.load(filename) as arrays:
+                values = np.asfortranarray(arrays[arrays.files[0] if array is None else array],
+                                           dtype=dtype)
+        else:
+            values = np.asfortranarray(np.loadtxt(filename, delimiter=',', ndmin=2, dtype=dtype))
+        if values.ndim != 2:
+            raise ValueError('The time history values in {} must be a 2-D array, not '
+                             '{}-D'.format(filename, values.ndim))
+        values.flags.writeable = False
+        _history_values[key] = values
+    return values
+
+
+def _check_history_dtype(history_dtype):
+    """Return the data type of the time history values, or raise a `ValueError`."""
+    if history_dtype is None:
+        return None
+    dtype = np.dtype(history_dtype)
+    if dtype.kind != 'f':
+        raise ValueError('history_dtype must be a floating point type, not {}'.format(dtype))
+    return dtype
+
+
+def _history_uncertainty(values, quantity, uncertainty):
+    """Return the absolute uncertainty of the quantity of a time history as an array.
+
+    Arguments:
+        values (`~numpy.ndarray`): The values of the time history
+        quantity (`~pint.Quantity`): The quantity of the time history
+        uncertainty (`dict`): The ``uncertainty`` of the ``time-histories`` entry
+
+    Returns:
+        `~pint.Quantity`: The uncertainty of each value, in the units of ``quantity``
+    """
+    magnitude = quantity.magnitude
+    if 'value' in uncertainty:
+        unc = parse_quantity(uncertainty['value'])
+    else:
+        unc = Q_(values[:, uncertainty['column']], uncertainty['units'])
+
+    if uncertainty['type'] == 'relative':
+        unc = unc.to('dimensionless').magnitude * np.abs(magnitude)
+    else:
+        # Uncertainties are differences, so only the scale of the conversion applies. Equivalent
+        # units, such as cm**3 and cm3, keep the column as a view of the values
+        zero, one = Q_(np.array([0.0, 1.0]), unc.units).to(quantity.units).magnitude
+        scale = one - zero
+        unc = unc.magnitude if scale == 1 else unc.magnitude * scale
+    return Q_(np.broadcast_to(np.asarray(unc, dtype=magnitude.dtype), magnitude.shape),
+              quantity.units)
+
+
+def _time_history(values, hist):
+    """Return the `TimeHistory` of the columns of ``values`` given by a ``time-histories`` entry."""
+    quantity = Q_(values[:, hist['quantity']['column']], hist['quantity']['units'])
+    uncertainty = None
+    if hist.get('uncertainty') is not None:
+        uncertainty = _history_uncertainty(values, quantity, hist['uncertainty'])
+    return TimeHistory(
+        time=Q_(values[:, hist['time']['column']], hist['time']['units']),
+        quantity=quantity,
+        type=hist['type'],
+        uncertainty=uncertainty,
+    )
+
+
+def _write_xml(element, write, history_points, level=0):
+    """Write an element and its children as XML indented by four spaces per level.
+
+    Arguments:
+        element (`~xml.etree.ElementTree.Element`): The element to write
+        write (`callable`): Function that writes a `str`, such as the ``write`` method of a file
+        history_points (`dict`): Time histories to write as the last dataPoints of dataGroup
+            elements, as tuples of the time id, quantity id, and `TimeHistory`, by element
+        level (`int`, optional): The indentation level of the element
+    """
+    indent = '    ' * level
+    start = indent + '<' + element.tag + ''.join(
+        ' {}="{}"'.format(key, escape(value, {'"': '&quot;', '\n': '&#10;'}))
+        for key, value in element.attrib.items())
+    text = escape(element.text) if element.text else ''
+    if len(element) == 0 and element not in history_points:
+        if text:
+            write('{}>{}</{}>\n'.format(start, text, element.tag))
+        else:
+            write(start + '/>\n')
+        return
+
+    write('{}>{}\n'.format(start, text))
+    for child in element:
+        _write_xml(child, write, history_points, level + 1)
+    if element in history_points:
+        _write_history_points(write, *history_points[element], level=level + 1)
+    write('{}</{}>\n'.format(indent, element.tag))
+
+
+def _write_history_points(write, time_idx, quant_idx, hist, level):
+    """Write the values of a time history as ReSpecTh dataPoints, in chunks of the arrays."""
+    indent = '    ' * level
+    point = ('{0}<dataPoint>\n{0}    <{1}>{{}}</{1}>\n{0}    <{2}>{{}}</{2}>\n'
+             '{0}</dataPoint>\n').format(indent, time_idx, quant_idx)
+    times = hist.time.magnitude
+    quantities = hist.quantity.magnitude
+    chunk = 10000
+    for start in range(0, len(times), chunk):
+        write(''.join(point.format(time, quantity) for time, quantity in zip(
+            times[start:start + chunk].tolist(), quantities[start:start + chunk].tolist())))
+
+
+def _cerberus_validator(validation_schema, **config):
+    """Return an `OurValidator` using the schema prepared once per process."""
+    return OurValidator(prepare_schema(validation_schema), **config)
+
+
+_validators = {'cerberus': _cerberus_validator, 'compiled': CompiledValidator}
+
+
+def _check_validation_options(validation, validation_engine):
+    """Raise a `ValueError` if the validation profile or engine is not known."""
+    if validation not in validation_profiles:
+        raise ValueError('validation must be one of {}'.format(sorted(validation_profiles)))
+    if validation_engine not in _validators:
+        raise ValueError('validation_engine must be one of {}'.format(sorted(_validators)))
+
+
+def _get_validator(properties, validation, validation_engine, timings=None):
+    """Return a validator for the properties of a ChemKED file, and the results of the lookups.
+
+    The DOIs and ORCIDs are looked up before validation if the validation profile needs them.
+    If ``timings`` is given, the time taken by the lookups is recorded as the ``prefetch`` stage.
+    """
+    prefetched = None
+    if _needs_lookups(validation):
+        if timings is None:
+            prefetched = prefetch_metadata(properties)
+        else:
+            with timings.timed('stages', 'prefetch'):
+                prefetched = prefetch_metadata(properties)
+    validator = _validators[validation_engine](profile_schema(validation), prefetched=prefetched,
+                                               timings=timings)
+    return validator, prefetched
+
+
 class ChemKED(object):
     """Main ChemKED class.
 
@@ -91,6 +350,31 @@ class ChemKED(object):
             format.
         skip_validation (`bool`, optional): Whether validation of the ChemKED should be done. Must
             be supplied as a keyword-argument.
+        validation (`str`, optional): The validation profile. ``'full'`` runs all of the
+            validation rules, ``'units'`` skips the DOI and ORCID lookups, and ``'structural'``
+            only checks the structure and types of the fields (see
+            `~pyked.validation.validation_profiles`). Must be supplied as a keyword-argument.
+        validation_engine (`str`, optional): ``'cerberus'`` (the default) to validate with
+            `~pyked.validation.OurValidator`, or ``'compiled'`` to validate with the faster checks
+            compiled from the schema (see `~pyked.compiled.CompiledValidator`). Must be supplied
+            as a keyword-argument.
+        profile_validation (`bool`, optional): Whether to record the time taken by each stage
+            and rule of the validation in ``validation_report``. Must be supplied as a
+            keyword-argument.
+        use_snapshot (`bool`, optional): Whether to load the object from a snapshot of a file with
+            the same contents, and store a snapshot of the object otherwise (see
+            `pyked.snapshot`). Only used with ``yaml_file``. Must be supplied as a
+            keyword-argument.
+        base_dir (`str`, optional): The directory that the filenames of time history values are
+            relative to. The default is the directory of ``yaml_file``, or the current working
+            directory with ``dict_input``. Must be supplied as a keyword-argument.
+        history_dtype (`str` or `~numpy.dtype`, optional): The floating point type used to store
+            the time history values, see `DataPoint`. Must be supplied as a keyword-argument.
+
+    If the validation cache is enabled, files whose contents were already validated with the
+    same profile are not validated again. The cache is disabled by default, see
+    `~pyked.validation.get_validation_cache`. Time history values in other files are read
+    when the time history is first used, see `DataPoint`.
 
     Attributes:
         datapoints (`list`): List of `DataPoint` objects storing each datapoint in the database.
@@ -106,22 +390,50 @@ class ChemKED(object):
         file_version (`str`): Version of the ChemKED database file.
         _properties (`dict`): Original dictionary read from ChemKED database file, meant for
             internal use.
+        validation_report (`dict`): The timings of the validation from `validate_yaml`, if
+            ``profile_validation`` was `True`, otherwise `None`
     """
-    def __init__(self, yaml_file=None, dict_input=None, *, skip_validation=False):
-        if yaml_file is not None:
+    def __init__(self, yaml_file=None, dict_input=None, *, skip_validation=False,
+                 validation='full', validation_engine='cerberus', profile_validation=False,
+                 use_snapshot=False, base_dir=None, history_dtype=None):
+        _check_validation_options(validation, validation_engine)
+        history_dtype = _check_history_dtype(history_dtype)
+        self._validation = validation
+        self._validation_engine = validation_engine
+        if base_dir is None and yaml_file is not None:
+            base_dir = os.path.dirname(os.path.abspath(yaml_file))
+
+        key = None
+        if yaml_file is not None and use_snapshot and not profile_validation:
+            with open(yaml_file, 'rb') as f:
+                content = f.read()
+            key = snapshot_key(content, validation=None if skip_validation else validation,
+                               base_dir=base_dir, history_dtype=str(history_dtype))
+            state = load_snapshot(key)
+            if state is not None:
+                self.__dict__.update(state)
+                self._validation = validation
+                self._validation_engine = validation_engine
+                return
+            self._properties = load_yaml(content)
+        elif yaml_file is not None:
             with open(yaml_file, 'r') as f:
-                self._properties = yaml.safe_load(f)
+                self._properties = load_yaml(f)
         elif dict_input is not None:
             self._properties = dict_input
         else:
             raise NameError("ChemKED needs either a YAML filename or dictionary as input.")
 
-        if not skip_validation:
-            self.validate_yaml(self._properties)
+        self._validation_report = None
+        if not skip_validation and (profile_validation or
+                                    not is_validated(self._properties, validation)):
+            self._validation_report = self.validate_yaml(self._properties,
+                                                         profile=profile_validation)
 
         self.datapoints = []
         for point in self._properties['datapoints']:
-            self.datapoints.append(DataPoint(point))
+            self.datapoints.append(DataPoint(point, base_dir=base_dir,
+                                             history_dtype=history_dtype))
 
         self.reference = Reference(
             volume=self._properties['reference'].get('volume'),
@@ -142,6 +454,17 @@ class ChemKED(object):
         for prop in ['chemked-version', 'experiment-type', 'file-authors', 'file-version']:
             setattr(self, prop.replace('-', '_'), self._properties[prop])
 
+        if key is not None:
+            history_files = [filename for point in self.datapoints
+                             for filename, hist in point._lazy_histories.values()]
+            store_snapshot(key, self.__dict__, history_files)
+
+    @property
+    def validation_report(self):
+        """`dict`: The timings of the validation from `validate_yaml`, if ``profile_validation``
+        was `True`, otherwise `None`"""
+        return self._validation_report
+
     @classmethod
     def from_respecth(cls, filename_xml, file_author='', file_author_orcid=''):
         """Construct a ChemKED instance directly from a ReSpecTh file.
@@ -166,17 +489,28 @@ class ChemKED(object):
                                          validate=False)
         return cls(dict_input=properties)
 
-    def validate_yaml(self, properties):
+    def validate_yaml(self, properties, *, profile=False):
         """Validate the parsed YAML file for adherance to the ChemKED format.
 
+        Valid properties are stored in the validation cache, if it is enabled (see
+        `~pyked.validation.get_validation_cache`).
+
         Arguments:
             properties (`dict`): Dictionary created from the parsed YAML file
+            profile (`bool`, optional): Whether to record the time taken by each stage and rule
+                of the validation. Must be supplied as a keyword-argument.
+
+        Returns:
+            `dict`: If ``profile`` is `True`, the call counts and times of the stages and rules
+                (see `~pyked.validation.ValidationTimings.report`), otherwise `None`
 
         Raises:
             `ValueError`: If the YAML file cannot be validated, a `ValueError` is raised whose
                 string contains the errors that are present.
         """
-        validator = OurValidator(schema)
+        timings = ValidationTimings() if profile else None
+        validator, prefetched = _get_validator(properties, self._validation,
+                                               self._validation_engine, timings)
         if not validator.validate(properties):
             for key, value in validator.errors.items():
                 if any(['unallowed value' in v for v in value]):
@@ -185,7 +519,50 @@ class ChemKED(object):
 
             raise ValueError(validator.errors)
 
-    def get_dataframe(self, output_columns=None):
+        store_validated(properties, self._validation, prefetched)
+        if timings is not None:
+            return timings.report()
+
+    array_fields = [
+        'temperature', 'pressure', 'ignition_delay', 'first_stage_ignition_delay', 'pressure_rise',
+        'equivalence_ratio',
+    ] + list(RCMData._fields)
+    """`list`: Fields of the datapoints included in the output of `to_arrays`"""
+
+    def to_arrays(self):
+        """Get the values of the datapoints as NumPy arrays in SI units.
+
+        Each field of the datapoints is returned as a contiguous `~numpy.ndarray` of floats, with
+        one element per datapoint, so that the data can be filtered and fitted without looping
+        over the `DataPoint` objects. The fields are listed in `ChemKED.array_fields`, and include
+        the fields of the `RCMData`.
+
+        Returns:
+            `dict`: Mapping of the field name to an array of the nominal values, and of the field
+                name with ``_std`` appended to an array of the standard deviation of the values.
+                Missing values, and the standard deviation of values without uncertainty, are
+                `~numpy.nan`.
+
+        Examples:
+            >>> arrays = ChemKED(yaml_file).to_arrays()
+            >>> arrays['temperature']
+            array([1164.48, 1164.97, 1264.2 , 1332.57, 1519.18])
+            >>> has_rise = ~np.isnan(arrays['pressure_rise'])
+        """
+        arrays = {}
+        for field in self.array_fields:
+            if field in RCMData._fields:
+                values = [getattr(dp.rcm_data, field) if dp.rcm_data is not None else None
+                          for dp in self.datapoints]
+            else:
+                values = [getattr(dp, field) for dp in self.datapoints]
+
+            si_units = property_units.get(field.replace('_', '-'), 'dimensionless')
+            arrays[field], arrays[field + '_std'] = _to_si_arrays(values, si_units)
+
+        return arrays
+
+    def get_dataframe(self, output_columns=None, *, si_units=False):
         """Get a Pandas DataFrame of the datapoints in this instance.
 
         Arguments:
@@ -221,6 +598,13 @@ class ChemKED(object):
 
                 Only the first author is printed when ``Reference`` or ``Reference:Authors`` is
                 selected because the whole author list may be quite long.
+            si_units (`bool`, optional, keyword-only): If `True`, the ``Temperature``,
+                ``Pressure``, and ``Ignition Delay`` columns are converted to SI units and stored as
+                floats, with the units appended to the column name (e.g., ``Temperature [K]``).
+                The species amounts are also stored as floats, and columns of strings are stored
+                as categoricals. Uncertainties are dropped, leaving the nominal values. The
+                default is `False`, where these columns contain `~pint.Quantity` objects in the
+                units given in the file.
 
         Note:
             If the Composition is selected as an output type, the composition specified in the
@@ -234,6 +618,8 @@ class ChemKED(object):
         Examples:
             >>> df = ChemKED(yaml_file).get_dataframe()
             >>> df = ChemKED(yaml_file).get_dataframe(['Temperature', 'Ignition Delay'])
+            >>> df = ChemKED(yaml_file).get_dataframe(['Temperature'], si_units=True)
+            >>> df['Temperature [K]'].mean()
 
         Returns:
             `~pandas.DataFrame`: Contains the information regarding each point in the ``datapoints``
@@ -252,7 +638,11 @@ class ChemKED(object):
         valid_labels[ref_index:ref_index + 1] = ['reference:' + a for a in Reference._fields]
         app_index = valid_labels.index('apparatus')
         valid_labels[app_index:app_index + 1] = ['apparatus:' + a for a in Apparatus._fields]
-        species_list = list(set(chain(*[list(d.composition.keys()) for d in self.datapoints])))
+        # Keep the species in the order they first appear in the datapoints
+        species_list = list(OrderedDict.fromkeys(
+            chain.from_iterable(d.composition.keys() for d in self.datapoints)
+        ))
+        species_set = set(species_list)
 
         if output_columns is None or len(output_columns) == 0:
             col_labels = valid_labels
@@ -277,35 +667,77 @@ class ChemKED(object):
                 app_index = col_labels.index('apparatus')
                 col_labels[app_index:app_index + 1] = ['apparatus:' + a for a in Apparatus._fields]
 
+        n_points = len(self.datapoints)
+        if si_units:
+            arrays = self.to_arrays()
+
+        # Build all of the species columns in a single pass over the datapoints. Missing species
+        # share one zero Quantity, since pint does not modify Quantities with scalar magnitudes
+        # in place.
+        species_columns = {}
+        if species_set.intersection(col_labels):
+            if si_units:
+                for species in species_list:
+                    species_columns[species] = np.zeros(n_points)
+                for i, d in enumerate(self.datapoints):
+                    for species, comp in d.composition.items():
+                        magnitude = comp.amount.magnitude
+                        species_columns[species][i] = getattr(magnitude, 'nominal_value',
+                                                              magnitude)
+            else:
+                zero = Q_(0.0, 'dimensionless')
+                for species in species_list:
+                    species_columns[species] = [zero] * n_points
+                for i, d in enumerate(self.datapoints):
+                    for species, comp in d.composition.items():
+                        species_columns[species][i] = comp.amount
+
         data = []
-        for d in self.datapoints:
-            row = []
-            d_species = list(d.composition.keys())
-            for col in col_labels:
-                if col in species_list:
-                    if col in d_species:
-                        row.append(d.composition[col].amount)
-                    else:
-                        row.append(Q_(0.0, 'dimensionless'))
-                elif 'reference' in col or 'apparatus' in col:
-                    split_col = col.split(':')
-                    if split_col[1] == 'authors':
-                        row.append(getattr(getattr(self, split_col[0]), split_col[1])[0]['name'])
-                    else:
-                        row.append(getattr(getattr(self, split_col[0]), split_col[1]))
-                elif col in ['temperature', 'pressure', 'ignition delay', 'equivalence ratio']:
-                    row.append(getattr(d, col.replace(' ', '_')))
-                elif col == 'file authors':
-                    row.append(getattr(self, col.replace(' ', '_'))[0]['name'])
-                elif col == 'Composition:Kind':
-                    row.append(d.composition_type)
+        labels = []
+        for col in col_labels:
+            label = col.title()
+            if col in species_set:
+                values = species_columns[col]
+            elif 'reference' in col or 'apparatus' in col:
+                split_col = col.split(':')
+                value = getattr(getattr(self, split_col[0]), split_col[1])
+                if split_col[1] == 'authors':
+                    value = value[0]['name']
+                values = [value] * n_points
+            elif col in ['temperature', 'pressure', 'ignition delay', 'equivalence ratio']:
+                attribute = col.replace(' ', '_')
+                if si_units:
+                    values = arrays[attribute]
+                    si_unit = property_units.get(col.replace(' ', '-'))
+                    if si_unit is not None:
+                        label += ' [{:~}]'.format(Q_(1.0, si_unit).units)
                 else:
-                    row.append(getattr(self, col.replace(' ', '_')))
-            data.append(row)
+                    values = [getattr(d, attribute) for d in self.datapoints]
+            elif col == 'file authors':
+                values = [self.file_authors[0]['name']] * n_points
+            elif col == 'Composition:Kind':
+                values = [d.composition_type for d in self.datapoints]
+            else:
+                values = [getattr(self, col.replace(' ', '_'))] * n_points
+
+            if isinstance(values, list):
+                # Fill an object array element-wise so that pandas does not try to
+                # iterate over the Quantities
+                column = np.empty(n_points, dtype=object)
+                for i, value in enumerate(values):
+                    column[i] = value
+                if si_units and all(isinstance(v, str) for v in values):
+                    column = pd.Categorical(column)
+                else:
+                    column = pd.Series(column).infer_objects()
+                values = column
+
+            data.append(values)
+            labels.append(label)
 
-        col_labels = [a.title() for a in col_labels]
-        columns = pd.Index(col_labels)
-        return pd.DataFrame(data=data, columns=columns)
+        df = pd.DataFrame({i: column for i, column in enumerate(data)}, columns=range(len(data)))
+        df.columns = pd.Index(labels)
+        return df
 
     def write_file(self, filename, *, overwrite=False):
         """Write new ChemKED YAML file based on object.
@@ -329,21 +761,29 @@ class ChemKED(object):
                           )
 
         with open(filename, 'w') as yaml_file:
-            yaml.dump(self._properties, yaml_file)
+            dump_yaml(self._properties, yaml_file)
 
-    def convert_to_ReSpecTh(self, filename):
+    def convert_to_ReSpecTh(self, filename=None):
         """Convert ChemKED record to ReSpecTh XML file.
 
         This converter uses common information in a ChemKED file to generate a
         ReSpecTh XML file. Note that some information may be lost, as ChemKED stores
         some additional attributes.
 
+        The indented XML is written in a single pass, and the dataPoints of the time histories are
+        written straight from their arrays, without creating an element for each value.
+
         Arguments:
-            filename (`str`): Filename for output ReSpecTh XML file.
+            filename (`str`, optional): Filename for output ReSpecTh XML file. If `None`, the XML
+                is returned instead.
+
+        Returns:
+            `bytes`: The UTF-8 encoded XML if ``filename`` is `None`, otherwise `None`
 
         Example:
             >>> dataset = ChemKED(yaml_file)
             >>> dataset.convert_to_ReSpecTh(xml_file)
+            >>> xml = dataset.convert_to_ReSpecTh()
         """
         root = etree.Element('experiment')
 
@@ -512,6 +952,8 @@ class ChemKED(object):
                          'OH_emission_history', 'absorption_history']
         time_histories = [getattr(dp, p) for dp in self.datapoints for p in history_types]
         time_histories = list(filter(None.__ne__, time_histories))
+        # The time histories of the dataGroups, written by _write_xml
+        history_points = {}
 
         if len(self.datapoints) > 1 and len(time_histories) > 1:
             raise NotImplementedError('Error: ReSpecTh files do not support multiple datapoints '
@@ -548,12 +990,7 @@ class ChemKED(object):
                 prop.set('id', quant_idx)
                 prop.set('label', 'V')
 
-                for time, quantity in zip(hist.time, hist.quantity):
-                    datapoint = etree.SubElement(datagroup, 'dataPoint')
-                    value = etree.SubElement(datapoint, time_idx)
-                    value.text = str(time.magnitude)
-                    value = etree.SubElement(datapoint, quant_idx)
-                    value.text = str(quantity.magnitude)
+                history_points[datagroup] = (time_idx, quant_idx, hist)
 
         ign_types = [getattr(dp, 'ignition_type', False) for dp in self.datapoints]
         # All datapoints must have the same ignition target and type
@@ -573,14 +1010,15 @@ class ChemKED(object):
             raise NotImplementedError('Different ignition targets or types for multiple datapoints '
                                       'are not supported in ReSpecTh.')
 
-        et = etree.ElementTree(root)
-        et.write(filename, encoding='utf-8', xml_declaration=True)
+        if filename is None:
+            f = io.StringIO()
+            f.write('<?xml version="1.0" encoding="utf-8"?>\n')
+            _write_xml(root, f.write, history_points)
+            return f.getvalue().encode('utf-8')
 
-        # now do a "pretty" rewrite
-        xml = minidom.parse(filename)
-        xml_string = xml.toprettyxml(indent='    ')
-        with open(filename, 'w') as f:
-            f.write(xml_string)
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write('<?xml version="1.0" encoding="utf-8"?>\n')
+            _write_xml(root, f.write, history_points)
 
         print('Converted to ' + filename)
 
@@ -593,6 +1031,23 @@ class DataPoint(object):
 
     Arguments:
         properties (`dict`): Dictionary adhering to the ChemKED format for ``datapoints``
+        base_dir (`str`, optional): The directory that the filenames of time history values are
+            relative to. The default is the current working directory.
+        history_dtype (`str` or `~numpy.dtype`, optional): The floating point type used to store
+            the time history values, such as ``'float32'`` to halve the memory used by long
+            histories. The default is 64-bit floats.
+
+    The values of each time history are stored in one column-major array, so the ``time`` and
+    ``quantity`` of the time history are contiguous views of the array rather than copies.
+    Time histories with values in files are read when they are first used, so datapoints whose
+    time histories are not needed are created without reading the files. A missing file raises
+    a `FileNotFoundError` when the datapoint is created, but a file that cannot be read, such as
+    a CSV file with blank fields or a header row, only raises an error when the time history is
+    first used. The values of a file are read once and shared by all of the time histories that
+    use the file, so they are read-only.
+    Values in NumPy ``.npy`` files are memory-mapped, so the ``time`` and ``quantity`` of the time
+    histories are views of the file; their columns are only contiguous if the file is stored in
+    column-major order, as written by `~pyked.converters.histories_to_sidecars`.
 
     Attributes:
         composition (`list`): List of dictionaries representing the species and their quantities
@@ -635,7 +1090,7 @@ class DataPoint(object):
         'compression-ratio'
     ]
 
-    def __init__(self, properties):
+    def __init__(self, properties, base_dir=None, history_dtype=None):
         for prop in self.value_unit_props:
             if prop in properties:
                 quant = self.process_quantity(properties[prop])
@@ -676,28 +1131,24 @@ class DataPoint(object):
         if 'time-histories' in properties and 'volume-history' in properties:
             raise TypeError('time-histories and volume-history are mutually exclusive')
 
+        # Time histories with values in files, by attribute name, that have not been read yet
+        self._lazy_histories = {}
+        self._history_dtype = _check_history_dtype(history_dtype)
         if 'time-histories' in properties:
             for hist in properties['time-histories']:
-                if hasattr(self, '{}_history'.format(hist['type'].replace(' ', '_'))):
+                name = '{}_history'.format(hist['type'].replace(' ', '_'))
+                if name in self.__dict__ or name in self._lazy_histories:
                     raise ValueError('Each history type may only be specified once. {} was '
                                      'specified multiple times'.format(hist['type']))
-                time_col = hist['time']['column']
-                time_units = hist['time']['units']
-                quant_col = hist['quantity']['column']
-                quant_units = hist['quantity']['units']
                 if isinstance(hist['values'], list):
-                    values = np.array(hist['values'])
+                    values = _history_array(hist['values'], self._history_dtype)
+                    setattr(self, name, _time_history(values, hist))
                 else:
-                    # Load the values from a file
-                    values = np.genfromtxt(hist['values']['filename'], delimiter=',')
-
-                time_history = TimeHistory(
-                    time=Q_(values[:, time_col], time_units),
-                    quantity=Q_(values[:, quant_col], quant_units),
-                    type=hist['type'],
-                )
-
-                setattr(self, '{}_history'.format(hist['type'].replace(' ', '_')), time_history)
+                    filename = _history_filename(hist['values']['filename'], base_dir)
+                    if not exists(filename):
+                        raise FileNotFoundError('The time history file {} was not found'.format(
+                            filename))
+                    self._lazy_histories[name] = (filename, hist)
 
         if 'volume-history' in properties:
             warn('The volume-history field should be replaced by time-histories. '
@@ -707,7 +1158,7 @@ class DataPoint(object):
             time_units = properties['volume-history']['time']['units']
             volume_col = properties['volume-history']['volume']['column']
             volume_units = properties['volume-history']['volume']['units']
-            values = np.array(properties['volume-history']['values'])
+            values = _history_array(properties['volume-history']['values'], self._history_dtype)
             self.volume_history = VolumeHistory(
                 time=Q_(values[:, time_col], time_units),
                 volume=Q_(values[:, volume_col], volume_units),
@@ -716,13 +1167,35 @@ class DataPoint(object):
         history_types = ['volume', 'temperature', 'pressure', 'piston_position', 'light_emission',
                          'OH_emission', 'absorption']
         for h in history_types:
-            if not hasattr(self, '{}_history'.format(h)):
-                setattr(self, '{}_history'.format(h), None)
+            name = '{}_history'.format(h)
+            if name not in self.__dict__ and name not in self._lazy_histories:
+                setattr(self, name, None)
+
+    def __getattr__(self, name):
+        # Only called for missing attributes, such as the time histories that were not read yet
+        lazy_histories = self.__dict__.get('_lazy_histories', {})
+        if name not in lazy_histories:
+            raise AttributeError("'{}' object has no attribute '{}'".format(
+                type(self).__name__, name))
+        filename, hist = lazy_histories[name]
+        values = _read_history_values(filename, hist['values'].get('array'),
+                                      self.__dict__.get('_history_dtype'))
+        time_history = _time_history(values, hist)
+        setattr(self, name, time_history)
+        del lazy_histories[name]
+        return time_history
+
+    def __getstate__(self):
+        # Pint rebuilds pickled quantities with its application registry, not the PyKED one
+        return encode_quantities(self.__dict__)
+
+    def __setstate__(self, state):
+        self.__dict__.update(decode_quantities(state))
 
     def process_quantity(self, properties):
         """Process the uncertainty information from a given quantity and return it
         """
-        quant = Q_(properties[0])
+        quant = parse_quantity(properties[0])
         if len(properties) > 1:
             unc = properties[1]
             uncertainty = unc.get('uncertainty', False)
@@ -743,13 +1216,14 @@ class DataPoint(object):
                                      '"lower-uncertainty" need to be specified.')
             elif uncertainty_type == 'absolute':
                 if uncertainty:
-                    uncertainty = Q_(uncertainty)
+                    uncertainty = parse_quantity(uncertainty)
                     quant = quant.plus_minus(uncertainty.to(quant.units).magnitude)
                 elif upper_uncertainty and lower_uncertainty:
                     warn('Asymmetric uncertainties are not supported. The '
                          'maximum of lower-uncertainty and upper-uncertainty '
                          'has been used as the symmetric uncertainty.')
-                    uncertainty = max(Q_(upper_uncertainty), Q_(lower_uncertainty))
+                    uncertainty = max(parse_quantity(upper_uncertainty),
+                                      parse_quantity(lower_uncertainty))
                     quant = quant.plus_minus(uncertainty.to(quant.units).magnitude)
                 else:
                     raise ValueError('Either "uncertainty" or "upper-uncertainty" and '
@@ -887,3 +1361,182 @@ class DataPoint(object):
                              )
         else:
             return self.get_cantera_composition_string(species_conversion)
+
+
+def _load_chemked(filename, skip_validation, validation='full', validation_engine='cerberus',
+                  history_dtype=None):
+    """Load, validate, and build a ChemKED file in a worker process.
+
+    Arguments:
+        filename (`str`): The filename of the YAML database in ChemKED format
+        skip_validation (`bool`): Whether validation of the properties should be skipped
+        validation (`str`, optional): The validation profile, see `ChemKED`
+        validation_engine (`str`, optional): ``'cerberus'`` or ``'compiled'``, see `ChemKED`
+        history_dtype (`str` or `~numpy.dtype`, optional): The type of the time history values,
+            see `ChemKED`
+
+    Returns:
+        `tuple`: The `ChemKED` instance and `None` if the file was loaded, or `None` and the
+            exception that was raised otherwise. Exceptions that cannot be sent back to the
+            parent process are replaced by a `ValueError` with the same message.
+    """
+    try:
+        chemked = ChemKED(filename, skip_validation=skip_validation, validation=validation,
+                          validation_engine=validation_engine,
+                          base_dir=os.path.dirname(os.path.abspath(filename)),
+                          history_dtype=history_dtype)
+    except Exception as e:
+        try:
+            pickle.loads(pickle.dumps(e))
+        except Exception:
+            e = ValueError('{}: {}'.format(type(e).__name__, e))
+        return None, e
+
+    return chemked, None
+
+
+class ChemKEDCollection(object):
+    """Collection of the ChemKED files in a directory tree.
+
+    The files are found by walking the directory tree under ``root`` and are loaded, validated,
+    and built into `ChemKED` instances in parallel in a pool of processes. Files that cannot be
+    loaded or that fail validation do not stop the other files from being loaded; their errors
+    are stored in the ``errors`` attribute.
+
+    Arguments:
+        root (`str`): The directory to search for ChemKED files
+        pattern (`str`, optional): Shell-style pattern that the filenames must match. Must be
+            supplied as a keyword-argument.
+        max_workers (`int`, optional): Number of processes used to load the files. The default is
+            `None`, which uses one process per CPU. With ``max_workers=1`` the files are loaded in
+            the current process. Must be supplied as a keyword-argument.
+        skip_validation (`bool`, optional): Whether validation of the ChemKED files should be done.
+            Must be supplied as a keyword-argument.
+        validation (`str`, optional): The validation profile, see `ChemKED`. Must be supplied as a
+            keyword-argument.
+        validation_engine (`str`, optional): ``'cerberus'`` or ``'compiled'``, see `ChemKED`. Must
+            be supplied as a keyword-argument.
+        history_dtype (`str` or `~numpy.dtype`, optional): The type of the time history values,
+            see `ChemKED`. Must be supplied as a keyword-argument.
+
+    Attributes:
+        root (`str`): The directory that was searched for ChemKED files
+        filenames (`list`): The filenames of the loaded ChemKED files, sorted by path
+        chemked (`list`): The `ChemKED` instances of the loaded files, in the same order as
+            ``filenames``
+        errors (`dict`): Mapping of the filenames that could not be loaded to the exception that
+            was raised for each file
+
+    Examples:
+        >>> collection = ChemKEDCollection('ChemKED-database', max_workers=4)
+        >>> len(collection)
+        >>> collection.errors
+        >>> df = collection.get_dataframe(['Temperature', 'Ignition Delay'], si_units=True)
+    """
+    def __init__(self, root, *, pattern='*.yaml', max_workers=None, skip_validation=False,
+                 validation='full', validation_engine='cerberus', history_dtype=None):
+        _check_validation_options(validation, validation_engine)
+        history_dtype = _check_history_dtype(history_dtype)
+        self.root = root
+        self.filenames = []
+        self.chemked = []
+        self.errors = {}
+
+        filenames = []
+        for dirpath, dirnames, files in os.walk(root):
+            filenames.extend(os.path.join(dirpath, f) for f in fnmatch.filter(files, pattern))
+        filenames.sort()
+
+        if max_workers == 1 or len(filenames) < 2:
+            results = [_load_chemked(f, skip_validation, validation, validation_engine,
+                                     history_dtype)
+                       for f in filenames]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(_load_chemked, filenames,
+                                            [skip_validation] * len(filenames),
+                                            [validation] * len(filenames),
+                                            [validation_engine] * len(filenames),
+                                            [history_dtype] * len(filenames)))
+
+        for filename, (chemked, error) in zip(filenames, results):
+            if error is not None:
+                self.errors[filename] = error
+            else:
+                self.filenames.append(filename)
+                self.chemked.append(chemked)
+
+    def __len__(self):
+        return len(self.chemked)
+
+    def __iter__(self):
+        return iter(self.chemked)
+
+    def __getitem__(self, index):
+        return self.chemked[index]
+
+    @property
+    def datapoints(self):
+        """`list`: The `DataPoint` objects of all of the files in the collection"""
+        return list(chain.from_iterable(c.datapoints for c in self.chemked))
+
+    def to_arrays(self):
+        """Get the values of the datapoints of all of the files as NumPy arrays in SI units.
+
+        The arrays of each file from `ChemKED.to_arrays` are concatenated in the order of
+        ``filenames``.
+
+        Returns:
+            `dict`: Mapping of the field name to an array of the nominal values, and of the field
+                name with ``_std`` appended to an array of the standard deviation of the values.
+                The ``file_index`` array gives the index in ``filenames`` of the file that each
+                datapoint came from.
+        """
+        file_arrays = [c.to_arrays() for c in self.chemked]
+        arrays = {}
+        for field in ChemKED.array_fields:
+            for key in [field, field + '_std']:
+                arrays[key] = np.concatenate([a[key] for a in file_arrays] + [np.empty(0)])
+
+        arrays['file_index'] = np.repeat(np.arange(len(self.chemked)),
+                                         [len(c.datapoints) for c in self.chemked])
+        return arrays
+
+    def get_dataframe(self, output_columns=None, *, si_units=False):
+        """Get a Pandas DataFrame of the datapoints of all of the files in the collection.
+
+        The DataFrames from `ChemKED.get_dataframe` for each file are concatenated, and a
+        ``File`` column with the filename of each datapoint is added as the first column.
+        Columns that are only present in some of the files, such as the amounts of species, are
+        missing (``NaN``) for the datapoints of the other files.
+
+        Arguments:
+            output_columns (`list`, optional): List of strings specifying the columns to include
+                in the output DataFrame. See `ChemKED.get_dataframe` for the options.
+            si_units (`bool`, optional, keyword-only): Whether to convert the values to floats in
+                SI units. See `ChemKED.get_dataframe`.
+
+        Returns:
+            `~pandas.DataFrame`: Contains the information regarding each datapoint in the
+                collection
+        """
+        import pandas as pd
+
+        frames = []
+        for filename, chemked in zip(self.filenames, self.chemked):
+            df = chemked.get_dataframe(output_columns, si_units=si_units)
+            df.insert(0, 'File', filename)
+            frames.append(df)
+
+        if not frames:
+            return pd.DataFrame()
+
+        # Keep the columns in the order they first appear, since concat may sort them
+        columns = list(OrderedDict.fromkeys(chain.from_iterable(df.columns for df in frames)))
+        df = pd.concat(frames, ignore_index=True)
+        df = df[columns]
+        if si_units:
+            for col in df.columns:
+                if df[col].dtype == object and all(isinstance(v, str) for v in df[col]):
+                    df[col] = df[col].astype('category')
+        return df
@@ -0,0 +1,483 @@
+"""
+Compiled validation engine for ChemKED files
+
+Cerberus interprets the schema while it validates a document: it creates a child validator for
+every nested mapping, list, and ``oneof`` branch, resolves the rules of each field, and builds
+error objects for every failed branch. The `CompiledValidator` instead turns the schema into
+nested check functions once, and runs those to decide whether a document is valid. The checks
+reimplement the Cerberus rules used by the ChemKED schema, including which rules are skipped
+after a failed ``type`` check, so the custom ``isvalid_*`` rules are run with the same
+arguments. They are tested against Cerberus, but they depend on its internals and may differ
+for documents that are not tested, so the engine is only used when it is asked for with
+``validation_engine='compiled'``.
+
+When the document is not valid, it is validated again by Cerberus to report the errors, so the
+errors are identical to those of `~pyked.validation.OurValidator`. Documents or schemas that use
+rules the engine does not support are always validated by Cerberus.
+"""
+# Standard libraries
+from collections.abc import Mapping, Sequence, Iterable, Hashable
+import threading
+import warnings
+
+from cerberus import Validator
+
+# Local imports
+from .validation import OurValidator, prepare_schema
+
+_normalization_rules = {'coerce', 'default', 'default_setter', 'purge_unknown', 'rename',
+                        'rename_handler'}
+_ignored_rules = {'allow_unknown', 'nullable', 'required', 'type', 'meta'}
+
+
+class _Uncompilable(Exception):
+    """Raised when part of a schema uses rules that are not supported by the compiler.
+    """
+    pass
+
+
+class _Compiler(object):
+    """Compiles the rules of a Cerberus schema into check functions.
+
+    Mapping checks have the signature ``check(document, update, runner)`` and field checks
+    ``check(document, field, update, runner, unrequired)``. Both return `True` if the value is
+    valid. ``runner`` is the instance of the validator class that runs the custom rules, and
+    ``unrequired`` is the set of required fields of ``document`` that are not required because of
+    an ``excludes`` rule.
+    """
+    def __init__(self, validator_class):
+        self.validator_class = validator_class
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def _memoized(self, key, objects, build):
+        """Return the check for ``key``, building it on first use.
+
+        ``objects`` are kept alive with the check, because the key uses their ``id``.
+        """
+        try:
+            return self._memo[key][0]
+        except KeyError:
+            pass
+        check = build()
+        with self._lock:
+            self._memo.setdefault(key, (check, objects))
+        return self._memo[key][0]
+
+    def mapping(self, schema, allow_unknown):
+        """Compile a check of a mapping against a schema of field definitions."""
+        if not isinstance(schema, Mapping) or not isinstance(allow_unknown, bool):
+            raise _Uncompilable(schema)
+        return self._memoized(('mapping', id(schema), allow_unknown), schema,
+                              lambda: self._build_mapping(schema, allow_unknown))
+
+    def _build_mapping(self, schema, allow_unknown):
+        field_checks = {}
+        for field, definitions in schema.items():
+            if not isinstance(definitions, Mapping):
+                raise _Uncompilable(definitions)
+            field_checks[field] = self.definitions(definitions, field, schema, allow_unknown)
+        required = frozenset(f for f, d in schema.items() if d.get('required') is True)
+
+        def check_mapping(document, update, runner):
+            valid = True
+            unrequired = set()
+            for field in document:
+                field_check = field_checks.get(field)
+                if field_check is not None:
+                    if not field_check(document, field, update, runner, unrequired):
+                        valid = False
+                elif not allow_unknown:
+                    valid = False
+
+            if not update:
+                if not (required - unrequired).issubset(document):
+                    valid = False
+                if unrequired and unrequired.isdisjoint(
+                        f for f in document if document[f] is not None):
+                    valid = False
+            return valid
+
+        return check_mapping
+
+    def definitions(self, definitions, field, schema, allow_unknown):
+        """Compile a check of a field against its rules.
+
+        Arguments:
+            definitions (`dict`): The rules of the field
+            field: The name of the field
+            schema (`dict`): The schema containing the field
+            allow_unknown (`bool`): Whether the validator that checks the field allows unknown
+                fields
+        """
+        key = ('definitions', id(definitions), field, id(schema), allow_unknown)
+        return self._memoized(key, (definitions, schema), lambda: self._build_definitions(
+            definitions, field, schema, allow_unknown))
+
+    def _build_definitions(self, definitions, field, schema, allow_unknown):
+        if 'readonly' in definitions or _normalization_rules.intersection(definitions):
+            raise _Uncompilable(definitions)
+
+        nullable = bool(definitions.get('nullable'))
+        type_check = None
+        if 'type' in definitions:
+            type_check = self._type_check(definitions['type'])
+
+        rule_checks = []
+        for rule in definitions:
+            if rule in _ignored_rules:
+                continue
+            build = getattr(self, '_rule_' + rule, None)
+            if build is not None:
+                rule_checks.append(build(definitions[rule], definitions, field, schema,
+                                         allow_unknown))
+            elif hasattr(Validator, '_validate_' + rule):
+                raise _Uncompilable(rule)
+            elif hasattr(self.validator_class, '_validate_' + rule):
+                rule_checks.append(self._custom_rule(rule, definitions[rule]))
+            # Cerberus ignores rules without a handler
+
+        def check_definitions(document, field, update, runner, unrequired):
+            value = document[field]
+            if value is None:
+                return nullable
+            if type_check is not None and not type_check(runner, value):
+                return False
+            valid = True
+            for rule_check in rule_checks:
+                if not rule_check(document, field, value, update, runner, unrequired):
+                    valid = False
+            return valid
+
+        return check_definitions
+
+    def _type_check(self, data_type):
+        types = [data_type] if isinstance(data_type, str) else data_type
+        type_methods = []
+        for t in types:
+            method = getattr(self.validator_class, '_validate_type_' + t, None)
+            if method is None:
+                raise _Uncompilable(data_type)
+            type_methods.append(method)
+
+        def check_type(runner, value):
+            return any(method(runner, value) for method in type_methods)
+
+        return check_type
+
+    def _custom_rule(self, rule, constraint):
+        method = getattr(self.validator_class, '_validate_' + rule)
+
+        def check_custom_rule(document, field, value, update, runner, unrequired):
+            n_errors = runner._n_errors
+            method(runner, constraint, field, value)
+            return runner._n_errors == n_errors
+
+        return check_custom_rule
+
+    def _rule_allowed(self, allowed_values, definitions, field, schema, allow_unknown):
+        allowed_set = set(allowed_values)
+
+        def check_allowed(document, field, value, update, runner, unrequired):
+            if isinstance(value, Iterable) and not isinstance(value, str):
+                return not set(value) - allowed_set
+            else:
+                return value in allowed_values
+
+        return check_allowed
+
+    def _rule_dependencies(self, dependencies, definitions, field, schema, allow_unknown):
+        if isinstance(dependencies, str):
+            dependencies = [dependencies]
+        if not isinstance(dependencies, Sequence) or any(d.startswith('^') for d in dependencies):
+            raise _Uncompilable(dependencies)
+        paths = [d.split('.') for d in dependencies]
+
+        def check_dependencies(document, field, value, update, runner, unrequired):
+            valid = True
+            for parts in paths:
+                context = document
+                for part in parts:
+                    context = context.get(part)
+                    if context is None:
+                        valid = False
+                        break
+            return valid
+
+        return check_dependencies
+
+    def _rule_excludes(self, excludes, definitions, field, schema, allow_unknown):
+        if schema is None:
+            # The items of a sequence are validated against a schema with one field per item
+            raise _Uncompilable(excludes)
+        if isinstance(excludes, Hashable):
+            excludes = [excludes]
+        unrequired_fields = set()
+        if definitions.get('required'):
+            unrequired_fields.add(field)
+        for exclude in excludes:
+            if exclude in schema and schema[exclude].get('required'):
+                unrequired_fields.add(exclude)
+
+        def check_excludes(document, field, value, update, runner, unrequired):
+            unrequired.update(unrequired_fields)
+            return not any(key in document for key in excludes)
+
+        return check_excludes
+
+    def _rule_items(self, items, definitions, field, schema, allow_unknown):
+        check_items = self.mapping(dict(enumerate(items)), allow_unknown)
+        n_items = len(items)
+
+        def check_items_length(document, field, value, update, runner, unrequired):
+            if len(value) != n_items:
+                return False
+            return check_items(dict(enumerate(value)), update, runner)
+
+        return check_items_length
+
+    def _logical(self, operator, definitions_list, definitions, field, schema, allow_unknown):
+        branch_checks = []
+        for branch in definitions_list:
+            branch = dict(branch)
+            for rule in ('allow_unknown', 'type'):
+                if rule not in branch and rule in definitions:
+                    branch[rule] = definitions[rule]
+            if 'allow_unknown' not in branch:
+                branch['allow_unknown'] = allow_unknown
+            # Each branch is validated by a child validator that allows unknown fields
+            branch_schema = {field: branch}
+            branch_checks.append(self.definitions(branch, field, branch_schema, True))
+        n_branches = len(branch_checks)
+
+        def check_logical(document, field, value, update, runner, unrequired):
+            n_valid = 0
+            for branch_check in branch_checks:
+                branch_unrequired = set()
+                valid = branch_check(document, field, update, runner, branch_unrequired)
+                if (not update and branch_unrequired and
+                        branch_unrequired.isdisjoint(
+                            f for f in document if document[f] is not None)):
+                    valid = False
+                if valid:
+                    n_valid += 1
+            if operator == 'oneof':
+                return n_valid == 1
+            elif operator == 'anyof':
+                return n_valid >= 1
+            elif operator == 'allof':
+                return n_valid == n_branches
+            else:
+                return n_valid == 0
+
+        return check_logical
+
+    def _rule_oneof(self, *args):
+        return self._logical('oneof', *args)
+
+    def _rule_anyof(self, *args):
+        return self._logical('anyof', *args)
+
+    def _rule_allof(self, *args):
+        return self._logical('allof', *args)
+
+    def _rule_noneof(self, *args):
+        return self._logical('noneof', *args)
+
+    def _rule_min(self, min_value, definitions, field, schema, allow_unknown):
+        def check_min(document, field, value, update, runner, unrequired):
+            try:
+                return not value < min_value
+            except TypeError:
+                return True
+
+        return check_min
+
+    def _rule_max(self, max_value, definitions, field, schema, allow_unknown):
+        def check_max(document, field, value, update, runner, unrequired):
+            try:
+                return not value > max_value
+            except TypeError:
+                return True
+
+        return check_max
+
+    def _rule_minlength(self, min_length, definitions, field, schema, allow_unknown):
+        def check_minlength(document, field, value, update, runner, unrequired):
+            return not (isinstance(value, Iterable) and len(value) < min_length)
+
+        return check_minlength
+
+    def _rule_maxlength(self, max_length, definitions, field, schema, allow_unknown):
+        def check_maxlength(document, field, value, update, runner, unrequired):
+            return not (isinstance(value, Iterable) and len(value) > max_length)
+
+        return check_maxlength
+
+    def _rule_schema(self, subschema, definitions, field, schema, allow_unknown):
+        if subschema is None:
+            return lambda *args: True
+        if not isinstance(subschema, Mapping):
+            raise _Uncompilable(subschema)
+
+        # The same rule is the definition of the items of a sequence, or the schema of the fields
+        # of a mapping. A value that cannot be checked with the compiled rules is validated by
+        # Cerberus.
+        try:
+            item_check = self.definitions(subschema, None, None, allow_unknown)
+        except _Uncompilable:
+            item_check = None
+        try:
+            mapping_check = self.mapping(subschema, definitions.get('allow_unknown',
+                                                                    allow_unknown))
+        except _Uncompilable:
+            mapping_check = None
+
+        def check_schema(document, field, value, update, runner, unrequired):
+            if isinstance(value, Sequence) and not isinstance(value, str):
+                if item_check is None:
+                    raise _Fallback
+                items = dict(enumerate(value))
+                item_unrequired = set()
+                valid = True
+                for i in items:
+                    if not item_check(items, i, update, runner, item_unrequired):
+                        valid = False
+                return valid
+            elif isinstance(value, Mapping):
+                if mapping_check is None:
+                    raise _Fallback
+                return mapping_check(value, update, runner)
+            return True
+
+        return check_schema
+
+
+class _Fallback(Exception):
+    """Raised while checking a document that must be validated by Cerberus instead.
+    """
+    pass
+
+
+_compilers = {}
+_compilers_lock = threading.Lock()
+
+
+def _get_compiled(schema, validator_class, allow_unknown):
+    """Return the compiled check of a schema, compiling it on first use."""
+    key = (id(schema), validator_class, allow_unknown)
+    with _compilers_lock:
+        entry = _compilers.get(key)
+        if entry is None or entry[0] is not schema:
+            # The schema is normalized and expanded by Cerberus, as for validation
+            prepared = prepare_schema(schema, validator_class=validator_class)
+            compiler = _Compiler(validator_class)
+            try:
+                check = compiler.mapping(prepared, allow_unknown)
+            except _Uncompilable:
+                check = None
+            entry = (schema, check)
+            _compilers[key] = entry
+    return entry[1]
+
+
+class CompiledValidator(object):
+    """Validator for ChemKED documents using checks compiled from the schema.
+
+    The schema is compiled once per process, the first time a `CompiledValidator` is created
+    for it, so creating more validators for the same schema is cheap. The schema must not be
+    changed after it is compiled. The interface follows `~pyked.validation.OurValidator`, and the
+    errors are identical.
+
+    Arguments:
+        schema (`dict`): The validation schema
+        validator_class (`type`, optional): The Cerberus validator class with the custom rules.
+            Must be supplied as a keyword-argument.
+        **config: Keyword arguments passed to the validator, such as ``prefetched`` or
+            ``timings``
+
+    Examples:
+        >>> validator = CompiledValidator(schema)
+        >>> validator.validate(properties)
+        True
+    """
+    def __init__(self, schema, *, validator_class=OurValidator, **config):
+        self.schema = schema
+        self.validator_class = validator_class
+        self.config = config
+        self._validator = None
+        allow_unknown = config.get('allow_unknown', False)
+        self._check = _get_compiled(schema, validator_class, allow_unknown)
+
+    @property
+    def errors(self):
+        """`dict`: The errors of the last validation, in the format of Cerberus. Empty if the
+        document was valid."""
+        if self._validator is None:
+            return {}
+        return self._validator.errors
+
+    @property
+    def document_error_tree(self):
+        """`cerberus.errors.DocumentErrorTree`: The errors of the last validation, indexed by
+        the path in the document. `None` if the document was valid."""
+        if self._validator is None:
+            return None
+        return self._validator.document_error_tree
+
+    @property
+    def is_compiled(self):
+        """`bool`: Whether the schema could be compiled. If not, Cerberus is always used."""
+        return self._check is not None
+
+    def _runner(self):
+        """Return an instance of the validator class that runs the custom rules."""
+        runner = self.validator_class.__new__(self.validator_class)
+        runner._config = self.config
+        runner._n_errors = 0
+
+        def count_error(*args, **kwargs):
+            runner._n_errors += 1
+
+        runner._error = count_error
+        return runner
+
+    def validate(self, document, update=False):
+        """Validate a document against the schema.
+
+        Arguments:
+            document (`dict`): The document to be validated
+            update (`bool`, optional): If `True`, required fields are not checked
+
+        Returns:
+            `bool`: `True` if the document is valid, otherwise `False`. The errors are stored in
+                the ``errors`` attribute.
+        """
+        self._validator = None
+        if self._check is not None and isinstance(document, Mapping):
+            try:
+                if self._run_check(document, update):
+                    return True
+            except _Fallback:
+                return self._validate_cerberus(document, update)
+            except Exception:
+                # Cerberus decides how to handle documents that the rules cannot process
+                return self._validate_cerberus(document, update)
+            # The custom rules already gave their warnings during the compiled check
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                return self._validate_cerberus(document, update)
+        return self._validate_cerberus(document, update)
+
+    def _run_check(self, document, update):
+        """Run the compiled check, recording the time taken if ``timings`` was given."""
+        timings = self.config.get('timings')
+        if timings is None:
+            return self._check(document, update, self._runner())
+        with timings.timed('stages', 'compiled'):
+            return self._check(document, update, self._runner())
+
+    def _validate_cerberus(self, document, update):
+        prepared = prepare_schema(self.schema, validator_class=self.validator_class)
+        self._validator = self.validator_class(prepared, **self.config)
+        return self._validator.validate(document, update=update)
@@ -7,12 +7,14 @@ from argparse import ArgumentParser
 from warnings import warn
 import xml.etree.ElementTree as etree
 
-from requests.exceptions import HTTPError, ConnectionError
-import habanero
+import numpy as np
 import pint
 
 # Local imports
-from .validation import yaml, property_units, crossref_api
+from .validation import property_units, dump_yaml, load_yaml, format_timings
+from .crossref import search_doi, enable_reference_cache
+from .orcid import enable_orcid_cache
+from .offline import MissingMetadataError
 from .validation import units as unit_registry
 from ._version import __version__
 from . import chemked
@@ -102,9 +104,12 @@ def get_reference(root):
     ref_key = elem.get('preferredKey', None)
 
     if ref_doi is not None:
+        from requests.exceptions import HTTPError, ConnectionError
+        import habanero
+
         try:
-            ref = crossref_api.works(ids=ref_doi)['message']
-        except (HTTPError, habanero.RequestError, ConnectionError):
+            ref = search_doi(ref_doi)
+        except (HTTPError, habanero.RequestError, ConnectionError, MissingMetadataError):
             if ref_key is None:
                 raise KeywordError('DOI not found and preferredKey attribute not set')
             else:
@@ -315,6 +320,88 @@ def get_ignition_type(root):
     return properties
 
 
+class _HistoryValues(object):
+    """The values of a time-history dataGroup, collected into a NumPy array.
+
+    The array has a column for the time and for each quantity, and grows geometrically as the
+    dataPoints are added, so each value is stored once as a float rather than in a list.
+
+    Args:
+        dataGroup (`~xml.etree.ElementTree.Element`): The dataGroup, with at least its
+            ``property`` elements
+    """
+    def __init__(self, dataGroup):
+        self.time_tag = None
+        quant_tags = []
+        self.quant_dicts = []
+        self.quant_types = []
+        for prop in dataGroup.findall('property'):
+            if prop.attrib['name'] == 'time':
+                self.time_dict = {'units': prop.attrib['units'], 'column': 0}
+                self.time_tag = prop.attrib['id']
+            elif prop.attrib['name'] in ['volume', 'temperature', 'pressure']:
+                self.quant_types.append(prop.attrib['name'])
+                self.quant_dicts.append({'units': prop.attrib['units'], 'column': 1})
+                quant_tags.append(prop.attrib['id'])
+            else:
+                raise KeywordError('Only volume, temperature, pressure, and time are allowed '
+                                   'in a time-history dataGroup.')
+
+        if self.time_tag is None or len(quant_tags) == 0:
+            raise KeywordError('Both time and quantity properties required for time-history.')
+
+        self.quant_tags = quant_tags
+        self.columns = {tag: i for i, tag in enumerate([self.time_tag] + quant_tags)}
+        self.values = np.empty((1024, len(self.columns)))
+        self.n_points = 0
+
+    def add(self, dp):
+        """Add the values of a dataPoint element."""
+        if self.n_points == len(self.values):
+            values = np.empty((2 * len(self.values), len(self.columns)))
+            values[:self.n_points] = self.values
+            self.values = values
+        row = self.values[self.n_points]
+        found = set()
+        for val in dp:
+            column = self.columns.get(val.tag)
+            if column is None:
+                raise KeywordError('Value tag {} not found in dataGroup tags: '
+                                   '{}'.format(val.tag, self.quant_tags))
+            row[column] = float(val.text)
+            found.add(column)
+        if len(found) != len(self.columns):
+            raise KeywordError('Both time and quantity values required in each '
+                               'time-history dataPoint.')
+        self.n_points += 1
+
+    def time_histories(self, sidecar=None):
+        """Return the ``time-histories`` entries of the dataGroup.
+
+        Args:
+            sidecar (`str`, optional): Filename of a NumPy ``.npy`` file to write the values to,
+                in column-major order. The entries refer to the file by its basename. By default,
+                the values are included in the entries as lists of time and quantity pairs.
+
+        Returns:
+            `list`: The time histories, one for each quantity in the dataGroup
+        """
+        values = self.values[:self.n_points]
+        if sidecar is not None:
+            np.save(sidecar, np.asfortranarray(values))
+
+        time_histories = []
+        for i, (quant_dict, quant_type) in enumerate(zip(self.quant_dicts, self.quant_types)):
+            if sidecar is None:
+                hist_values = values[:, [0, i + 1]].tolist()
+            else:
+                quant_dict = dict(quant_dict, column=i + 1)
+                hist_values = {'filename': os.path.basename(sidecar)}
+            time_histories.append({'time': self.time_dict, 'quantity': quant_dict,
+                                   'type': quant_type, 'values': hist_values})
+        return time_histories
+
+
 def get_datapoints(root):
     """Parse datapoints with ignition delay from file.
 
@@ -422,58 +509,81 @@ def get_datapoints(root):
     if len(dataGroups) > 1:
         datapoints[0]['time-histories'] = []
         for dataGroup in dataGroups[1:]:
-            time_tag = None
-            quant_tags = []
-            quant_dicts = []
-            quant_types = []
-            for prop in dataGroup.findall('property'):
-                if prop.attrib['name'] == 'time':
-                    time_dict = {'units': prop.attrib['units'], 'column': 0}
-                    time_tag = prop.attrib['id']
-                elif prop.attrib['name'] in ['volume', 'temperature', 'pressure']:
-                    quant_types.append(prop.attrib['name'])
-                    quant_dicts.append({'units': prop.attrib['units'], 'column': 1})
-                    quant_tags.append(prop.attrib['id'])
-                else:
-                    raise KeywordError('Only volume, temperature, pressure, and time are allowed '
-                                       'in a time-history dataGroup.')
-
-            if time_tag is None or len(quant_tags) == 0:
-                raise KeywordError('Both time and quantity properties required for time-history.')
-
-            time_histories = [
-                {'time': time_dict, 'quantity': q, 'type': t, 'values': []}
-                for (q, t) in zip(quant_dicts, quant_types)
-            ]
-            # collect volume-time history
+            history_values = _HistoryValues(dataGroup)
             for dp in dataGroup.findall('dataPoint'):
-                time = None
-                quants = {}
-                for val in dp:
-                    if val.tag == time_tag:
-                        time = float(val.text)
-                    elif val.tag in quant_tags:
-                        quant = float(val.text)
-                        tag_idx = quant_tags.index(val.tag)
-                        quant_type = quant_types[tag_idx]
-                        quants[quant_type] = quant
-                    else:
-                        raise KeywordError('Value tag {} not found in dataGroup tags: '
-                                           '{}'.format(val.tag, quant_tags))
-                if time is None or len(quants) == 0:
-                    raise KeywordError('Both time and quantity values required in each '
-                                       'time-history dataPoint.')
-                for t in time_histories:
-                    t['values'].append([time, quants[t['type']]])
-
-            datapoints[0]['time-histories'].extend(time_histories)
+                history_values.add(dp)
+            datapoints[0]['time-histories'].extend(history_values.time_histories())
 
     return datapoints
 
 
-def ReSpecTh_to_ChemKED(filename_xml, file_author='', file_author_orcid='', *, validate=False):
+def _parse_ReSpecTh(filename_xml, sidecar_prefix=None):
+    """Parse a ReSpecTh XML file, streaming the values of the time-history dataGroups.
+
+    The file is read with `~xml.etree.ElementTree.iterparse`. The dataPoints of the time-history
+    dataGroups (every dataGroup after the first) are added to a `_HistoryValues` and removed from
+    the tree as soon as they are read, so only their values are kept in memory.
+
+    Args:
+        filename_xml (`str`): Name of the ReSpecTh XML file
+        sidecar_prefix (`str`, optional): Path prefix of the NumPy files that the time history
+            values are written to, see `ReSpecTh_to_ChemKED`
+
+    Returns:
+        `tuple`: The root of the tree without the time-history dataGroups, and the list of time
+            histories, or `None` if there are no time-history dataGroups
+    """
+    root = None
+    time_histories = None
+    n_groups = 0
+    group = None
+    history_values = None
+    depth = 0
+    for event, elem in etree.iterparse(filename_xml, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if depth == 1:
+                root = elem
+            elif depth == 2 and elem.tag == 'dataGroup':
+                n_groups += 1
+                if n_groups > 1:
+                    group = elem
+            continue
+
+        depth -= 1
+        if group is None:
+            continue
+        if depth == 2 and elem.tag == 'dataPoint':
+            # The property elements come before the dataPoints
+            if history_values is None:
+                history_values = _HistoryValues(group)
+            history_values.add(elem)
+            # iterparse reads ahead, so later dataPoints may already be in the dataGroup
+            group.remove(elem)
+        elif depth == 1:
+            if history_values is None:
+                history_values = _HistoryValues(group)
+            sidecar = None
+            if sidecar_prefix is not None:
+                sidecar = '{}_history_{}.npy'.format(sidecar_prefix, n_groups - 1)
+            if time_histories is None:
+                time_histories = []
+            time_histories.extend(history_values.time_histories(sidecar))
+            root.remove(group)
+            group = None
+            history_values = None
+
+    return root, time_histories
+
+
+def ReSpecTh_to_ChemKED(filename_xml, file_author='', file_author_orcid='', *, validate=False,
+                        sidecar_prefix=None):
     """Convert ReSpecTh XML file to ChemKED-compliant dictionary.
 
+    The file is parsed incrementally, and the values of the time-history dataGroups are
+    collected into NumPy arrays as they are read, so files with very long time histories can be
+    converted without holding the whole XML tree in memory.
+
     Args:
         filename_xml (`str`): Name of ReSpecTh XML file to be converted.
         file_author (`str`, optional): Name to override original file author
@@ -481,10 +591,14 @@ def ReSpecTh_to_ChemKED(filename_xml, file_author='', file_author_orcid='', *, v
         validate (`bool`, optional, keyword-only): Set to `True` to validate the resulting
             property dictionary with `ChemKED`. Set to `False` if the file is being loaded and will
             be validated at some other point before use.
+        sidecar_prefix (`str`, optional, keyword-only): Path prefix of NumPy ``.npy`` files to
+            write the time history values to, instead of including them in the dictionary. The
+            values of the n-th time-history dataGroup are written to
+            ``<sidecar_prefix>_history_<n>.npy``, and the time histories refer to the file by its
+            basename, so the ChemKED file must be written to the same directory.
     """
-    # get all information from XML file
-    tree = etree.parse(filename_xml)
-    root = tree.getroot()
+    # get all information from XML file, except the values of the time histories
+    root, time_histories = _parse_ReSpecTh(filename_xml, sidecar_prefix)
 
     # get file metadata
     properties = get_file_metadata(root)
@@ -508,6 +622,8 @@ def ReSpecTh_to_ChemKED(filename_xml, file_author='', file_author_orcid='', *, v
 
     # Now parse ignition delay datapoints
     properties['datapoints'] = get_datapoints(root)
+    if time_histories is not None:
+        properties['datapoints'][0]['time-histories'] = time_histories
 
     # Ensure inclusion of pressure rise or volume history matches apparatus.
     has_pres_rise = ('pressure-rise' in properties['common-properties'] or
@@ -539,11 +655,126 @@ def ReSpecTh_to_ChemKED(filename_xml, file_author='', file_author_orcid='', *, v
             properties['datapoints'][idx][prop] = properties['common-properties'][prop]
 
     if validate:
-        chemked.ChemKED(dict_input=properties)
+        base_dir = None
+        if sidecar_prefix is not None:
+            base_dir = os.path.dirname(os.path.abspath(sidecar_prefix))
+        chemked.ChemKED(dict_input=properties, base_dir=base_dir)
 
     return properties
 
 
+def _enable_lookup_caches(refresh=False):
+    """Enable the on-disk caches of the web API lookups for a command-line tool.
+
+    If ``refresh`` is `True`, the cached results are not used, and the results of the new
+    lookups replace them.
+    """
+    enable_reference_cache(refresh=refresh)
+    enable_orcid_cache(refresh=refresh)
+
+
+def _load_chemked(filename, profile):
+    """Load a ChemKED file, printing the timings of the validation if ``profile`` is `True`.
+    """
+    c = chemked.ChemKED(yaml_file=filename, profile_validation=profile)
+    if profile:
+        print(format_timings(c.validation_report))
+    return c
+
+
+def histories_to_sidecars(filename_yaml, output='', *, min_rows=0):
+    """Rewrite the time history values of a ChemKED file into NumPy sidecar files.
+
+    The values of each time history, given inline or in a CSV file, are written to a ``.npy``
+    file next to the output file, and the time history refers to the new file. The arrays are
+    stored in column-major order, so each column of the memory-mapped file is contiguous. Time
+    histories that already use ``.npy`` or ``.npz`` files are not changed, except that relative
+    filenames are made relative to the output file. Time histories with values in the same CSV
+    file share one sidecar file.
+
+    Arguments:
+        filename_yaml (`str`): Filename of the ChemKED file
+        output (`str`, optional): Filename of the rewritten ChemKED file. The default is to
+            overwrite ``filename_yaml``.
+        min_rows (`int`, optional): Time histories with fewer rows than this are left unchanged.
+            Must be supplied as a keyword-argument.
+
+    Returns:
+        `list`: The filenames of the sidecar files that were written
+    """
+    if not output:
+        output = filename_yaml
+    base_dir = os.path.dirname(os.path.abspath(filename_yaml))
+    out_dir = os.path.dirname(os.path.abspath(output))
+    out_name = os.path.splitext(os.path.basename(output))[0]
+
+    with open(filename_yaml, 'r') as f:
+        properties = load_yaml(f)
+
+    sidecars = []
+    csv_sidecars = {}
+    for i, point in enumerate(properties['datapoints']):
+        for hist in point.get('time-histories', []):
+            filename = None
+            if isinstance(hist['values'], list):
+                values = np.array(hist['values'], dtype=float)
+            else:
+                filename = chemked._history_filename(hist['values']['filename'], base_dir)
+                if os.path.splitext(filename)[1].lower() in ['.npy', '.npz']:
+                    if not os.path.isabs(hist['values']['filename']):
+                        hist['values']['filename'] = os.path.relpath(filename, out_dir)
+                    continue
+                elif filename in csv_sidecars:
+                    hist['values'] = {'filename': csv_sidecars[filename]}
+                    continue
+                values = np.loadtxt(filename, delimiter=',', ndmin=2)
+            if len(values) < min_rows:
+                if filename is not None and not os.path.isabs(hist['values']['filename']):
+                    hist['values']['filename'] = os.path.relpath(filename, out_dir)
+                continue
+
+            sidecar = '{}_{}_{}.npy'.format(out_name, i, hist['type'].replace(' ', '_'))
+            np.save(os.path.join(out_dir, sidecar), np.asfortranarray(values))
+            hist['values'] = {'filename': sidecar}
+            sidecars.append(os.path.join(out_dir, sidecar))
+            if filename is not None:
+                csv_sidecars[filename] = sidecar
+
+    with open(output, 'w') as f:
+        dump_yaml(properties, f, default_flow_style=False)
+    return sidecars
+
+
+def ck_sidecars(argv=None):
+    """Command-line entry point for moving the time history values of ChemKED files to sidecars.
+    """
+    parser = ArgumentParser(
+        description='Rewrite the time history values of a ChemKED file into NumPy .npy files.'
+        )
+    parser.add_argument('-i', '--input',
+                        type=str,
+                        required=True,
+                        help='Input filename (e.g., "file1.yaml")'
+                        )
+    parser.add_argument('-o', '--output',
+                        type=str,
+                        required=False,
+                        default='',
+                        help='Output filename (default: overwrite the input file)'
+                        )
+    parser.add_argument('--min-rows',
+                        dest='min_rows',
+                        type=int,
+                        default=0,
+                        help='Leave time histories with fewer rows than this unchanged'
+                        )
+
+    args = parser.parse_args(argv)
+
+    sidecars = histories_to_sidecars(args.input, args.output, min_rows=args.min_rows)
+    print('Wrote {} sidecar files for {}'.format(len(sidecars), args.output or args.input))
+
+
 def respth2ck(argv=None):
     """Command-line entry point for converting a ReSpecTh XML file to a ChemKED YAML file.
     """
@@ -575,23 +806,37 @@ def respth2ck(argv=None):
                         default='',
                         help='File author ORCID'
                         )
+    parser.add_argument('--refresh-cache',
+                        dest='refresh_cache',
+                        action='store_true',
+                        help='Query the web APIs again instead of using the cached DOI and ORCID '
+                             'lookups, and cache the new results'
+                        )
+    parser.add_argument('--sidecars',
+                        action='store_true',
+                        help='Write the time history values to NumPy .npy files next to the output '
+                             'file instead of including them in it'
+                        )
 
     args = parser.parse_args(argv)
 
+    _enable_lookup_caches(refresh=args.refresh_cache)
+
     filename_ck = args.output
     filename_xml = args.input
 
-    properties = ReSpecTh_to_ChemKED(filename_xml, args.file_author, args.file_author_orcid,
-                                     validate=True)
-
     # set output filename and path
     if not filename_ck:
         filename_ck = os.path.join(os.path.dirname(filename_xml),
                                    os.path.splitext(os.path.basename(filename_xml))[0] + '.yaml'
                                    )
 
+    sidecar_prefix = os.path.splitext(filename_ck)[0] if args.sidecars else None
+    properties = ReSpecTh_to_ChemKED(filename_xml, args.file_author, args.file_author_orcid,
+                                     validate=True, sidecar_prefix=sidecar_prefix)
+
     with open(filename_ck, 'w') as outfile:
-        yaml.dump(properties, outfile, default_flow_style=False)
+        dump_yaml(properties, outfile, default_flow_style=False)
     print('Converted to ' + filename_ck)
 
 
@@ -612,10 +857,22 @@ def ck2respth(argv=None):
                         default='',
                         help='Output filename (e.g., "file1.yaml")'
                         )
+    parser.add_argument('--refresh-cache',
+                        dest='refresh_cache',
+                        action='store_true',
+                        help='Query the web APIs again instead of using the cached DOI and ORCID '
+                             'lookups, and cache the new results'
+                        )
+    parser.add_argument('--profile',
+                        action='store_true',
+                        help='Print the time taken by each stage and rule of the validation'
+                        )
 
     args = parser.parse_args(argv)
 
-    c = chemked.ChemKED(yaml_file=args.input)
+    _enable_lookup_caches(refresh=args.refresh_cache)
+
+    c = _load_chemked(args.input, args.profile)
     c.convert_to_ReSpecTh(args.output)
 
 
@@ -651,15 +908,27 @@ def main(argv=None):
                         default='',
                         help='File author ORCID'
                         )
+    parser.add_argument('--refresh-cache',
+                        dest='refresh_cache',
+                        action='store_true',
+                        help='Query the web APIs again instead of using the cached DOI and ORCID '
+                             'lookups, and cache the new results'
+                        )
+    parser.add_argument('--profile',
+                        action='store_true',
+                        help='Print the time taken by each stage and rule of the validation'
+                        )
 
     args = parser.parse_args(argv)
 
+    _enable_lookup_caches(refresh=args.refresh_cache)
+
     if os.path.splitext(args.input)[1] == '.xml' and os.path.splitext(args.output)[1] == '.yaml':
         respth2ck(['-i', args.input, '-o', args.output, '-fa', args.file_author,
                    '-fo', args.file_author_orcid])
 
     elif os.path.splitext(args.input)[1] == '.yaml' and os.path.splitext(args.output)[1] == '.xml':
-        c = chemked.ChemKED(yaml_file=args.input)
+        c = _load_chemked(args.input, args.profile)
         c.convert_to_ReSpecTh(args.output)
 
     elif os.path.splitext(args.input)[1] == '.xml' and os.path.splitext(args.output)[1] == '.xml':
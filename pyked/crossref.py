@@ -0,0 +1,146 @@
+"""
+Module for Crossref interaction
+"""
+import os
+
+from .cache import get_cache_dir, MetadataCache
+from .offline import get_offline_bundle
+
+_crossref_api = None
+
+_reference_cache = None
+_use_default_cache = True
+_refreshed_dois = None
+
+
+def get_crossref_api():
+    """Return the Crossref API instance used for DOI lookups.
+
+    Habanero (and the rest of the network stack) is only imported when the first lookup is
+    made, so that loading PyKED stays fast for uses that never touch the network.
+
+    Returns:
+        `~habanero.Crossref`: The Crossref API instance
+    """
+    global _crossref_api
+    if _crossref_api is None:
+        import habanero
+        _crossref_api = habanero.Crossref(mailto='prometheus@pr.omethe.us')
+    return _crossref_api
+
+
+def get_reference_cache():
+    """Return the cache of DOI lookups.
+
+    The lookups are only cached on disk if the cache is enabled, so that validating ChemKED files
+    does not write to the user's cache directory unless asked to. The cache is enabled by calling
+    `enable_reference_cache`, by setting the ``PYKED_REFERENCE_CACHE`` environment variable to
+    ``1``, or by setting a cache with `set_reference_cache`. The converter command-line tools and
+    ``ck_validate`` enable it.
+
+    Returns:
+        `~pyked.cache.MetadataCache`: The cache of DOI lookups, or `None` if caching is disabled
+    """
+    enabled = os.environ.get('PYKED_REFERENCE_CACHE', '0') not in ['', '0']
+    if _reference_cache is None and enabled:
+        return enable_reference_cache()
+    return _reference_cache
+
+
+def enable_reference_cache(refresh=False):
+    """Cache the DOI lookups in ``crossref.sqlite`` in the PyKED cache directory.
+
+    The PyKED cache directory is given by `~pyked.cache.get_cache_dir`. A cache set with
+    `set_reference_cache`, including `None` to disable caching, is not replaced.
+
+    Args:
+        refresh (`bool`, optional): If `True`, the cached lookups are not used for the rest of
+            this run. Each DOI is looked up again the first time it is searched, and the result
+            replaces the cached one.
+
+    Returns:
+        `~pyked.cache.MetadataCache`: The cache of DOI lookups, or `None` if caching was
+            disabled with `set_reference_cache`
+    """
+    global _reference_cache, _refreshed_dois
+    if _reference_cache is None and _use_default_cache:
+        _reference_cache = MetadataCache(os.path.join(get_cache_dir(), 'crossref.sqlite'))
+    if refresh:
+        _refreshed_dois = set()
+    return _reference_cache
+
+
+def set_reference_cache(cache):
+    """Set the cache used for DOI lookups.
+
+    Args:
+        cache: The cache to use, or `None` to disable caching. Any object with ``get(key)`` and
+            ``set(key, value)`` methods like `~pyked.cache.MetadataCache` can be used.
+    """
+    global _reference_cache, _use_default_cache
+    _reference_cache = cache
+    _use_default_cache = False
+
+
+def search_doi(doi):
+    """
+    Search the Crossref API for the metadata of a DOI
+
+    Successful lookups and DOIs that are not found are stored in the reference cache, if it is
+    enabled (see `get_reference_cache`), so each DOI only needs to be looked up once. In offline
+    mode, the DOI is looked up in the offline bundle instead (see `pyked.offline`).
+
+    Args:
+        doi (`str`): The DOI to be searched
+
+    Returns:
+        `dict`: Dictionary with the ``message`` of the JSON response from the API
+
+    Raises:
+        `~requests.HTTPError`: If the given DOI cannot be found, an `~requests.HTTPError` is
+            raised with status code 404
+        `~habanero.RequestError`: If the API returns any other error
+        `~pyked.offline.MissingMetadataError`: If the DOI is not in the offline bundle
+    """
+    bundle = get_offline_bundle()
+    if bundle is not None:
+        return bundle.search_doi(doi)
+
+    from requests import Response
+    from requests.exceptions import HTTPError
+    import habanero
+
+    cache = get_reference_cache()
+    # DOIs are case insensitive
+    key = doi.lower()
+    if cache is not None and (_refreshed_dois is None or key in _refreshed_dois):
+        cached = cache.get(key)
+        if cached is not None:
+            if cached.get('status') == 404:
+                response = Response()
+                response.status_code = 404
+                raise HTTPError('404 Client Error: DOI {} not found (cached)'.format(doi),
+                                response=response)
+            return cached['message']
+
+    try:
+        ref = get_crossref_api().works(ids=doi)['message']
+    except (HTTPError, habanero.RequestError) as e:
+        if isinstance(e, HTTPError):
+            status_code = getattr(e.response, 'status_code', None)
+        else:
+            status_code = e.status_code
+        if cache is not None and status_code == 404:
+            _store_lookup(cache, key, {'status': 404})
+        raise
+
+    if cache is not None:
+        _store_lookup(cache, key, {'status': 200, 'message': ref})
+    return ref
+
+
+def _store_lookup(cache, key, result):
+    """Store the result of a DOI lookup, which is used again even if the cache is refreshed."""
+    cache.set(key, result)
+    if _refreshed_dois is not None:
+        _refreshed_dois.add(key)
@@ -0,0 +1,243 @@
+"""
+Module for validating ChemKED files without a network connection
+
+The DOI and ORCID metadata needed for validation are stored in a bundle file that is exported on
+a machine with a network connection, with the ``ck_export_bundle`` command. When an offline
+bundle is set, with `set_offline_bundle` or the ``PYKED_OFFLINE_BUNDLE`` environment variable,
+the DOIs and ORCIDs are looked up in the bundle and no network connections are made.
+"""
+# Standard libraries
+import os
+import json
+from argparse import ArgumentParser
+from warnings import warn
+
+_offline_bundle = None
+_bundle_loaded = False
+
+
+class MissingMetadataError(LookupError):
+    """Raised in offline mode when a DOI or ORCID is not in the offline bundle.
+    """
+    pass
+
+
+class MetadataBundle(object):
+    """Snapshot of the DOI and ORCID metadata used to validate ChemKED files.
+
+    Arguments:
+        dois (`dict`, optional): Mapping of DOIs to their Crossref metadata, or to `None` if the
+            DOI was not found
+        orcids (`dict`, optional): Mapping of ORCIDs to the personal details from the ORCID API,
+            or to `None` if the ORCID was not found
+
+    Examples:
+        >>> bundle = MetadataBundle.load('chemked-metadata.json')
+        >>> bundle.search_doi('10.1016/j.ijhydene.2007.04.008')['container-title']
+        ['International Journal of Hydrogen Energy']
+    """
+    format_version = 1
+    """`int`: Version of the bundle file format"""
+
+    def __init__(self, dois=None, orcids=None):
+        self.dois = {}
+        self.orcids = dict(orcids or {})
+        for doi, metadata in (dois or {}).items():
+            self.add_doi(doi, metadata)
+
+    @classmethod
+    def load(cls, filename):
+        """Read a bundle from a JSON file.
+
+        Args:
+            filename (`str`): Filename of the bundle
+
+        Returns:
+            `MetadataBundle`: The bundle stored in the file
+
+        Raises:
+            `ValueError`: If the file is not a metadata bundle
+        """
+        with open(filename, 'r') as f:
+            data = json.load(f)
+        if not isinstance(data, dict) or data.get('pyked-metadata-bundle') != cls.format_version:
+            raise ValueError('{} is not a PyKED metadata bundle'.format(filename))
+        return cls(dois=data.get('doi'), orcids=data.get('orcid'))
+
+    def save(self, filename):
+        """Write the bundle to a JSON file.
+
+        Args:
+            filename (`str`): Filename of the bundle
+        """
+        data = {'pyked-metadata-bundle': self.format_version, 'doi': self.dois,
+                'orcid': self.orcids}
+        with open(filename, 'w') as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+
+    def add_doi(self, doi, metadata):
+        """Add the metadata of a DOI to the bundle.
+
+        Args:
+            doi (`str`): The DOI
+            metadata (`dict`): The Crossref metadata of the DOI, or `None` if it was not found
+        """
+        # DOIs are case insensitive
+        self.dois[doi.lower()] = metadata
+
+    def add_orcid(self, orcid, person):
+        """Add the personal details associated with an ORCID to the bundle.
+
+        Args:
+            orcid (`str`): The ORCID
+            person (`dict`): The response of the ORCID API, or `None` if it was not found
+        """
+        self.orcids[orcid] = person
+
+    def __len__(self):
+        return len(self.dois) + len(self.orcids)
+
+    def _lookup(self, kind, entries, key):
+        """Return an entry of the bundle, raising the same errors as the web APIs."""
+        try:
+            result = entries[key]
+        except KeyError:
+            raise MissingMetadataError('{} {} is not in the offline metadata bundle'.format(
+                kind, key))
+        if result is None:
+            from requests import Response
+            from requests.exceptions import HTTPError
+            response = Response()
+            response.status_code = 404
+            raise HTTPError('404 Client Error: {} {} not found (offline bundle)'.format(kind, key),
+                            response=response)
+        return result
+
+    def search_doi(self, doi):
+        """Look up the metadata of a DOI in the bundle.
+
+        Args:
+            doi (`str`): The DOI to be searched
+
+        Returns:
+            `dict`: The Crossref metadata of the DOI
+
+        Raises:
+            `~requests.HTTPError`: If the DOI was not found when the bundle was exported
+            `MissingMetadataError`: If the DOI is not in the bundle
+        """
+        return self._lookup('DOI', self.dois, doi.lower())
+
+    def search_orcid(self, orcid):
+        """Look up the personal details associated with an ORCID in the bundle.
+
+        Args:
+            orcid (`str`): The ORCID to be searched
+
+        Returns:
+            `dict`: The response of the ORCID API
+
+        Raises:
+            `~requests.HTTPError`: If the ORCID was not found when the bundle was exported
+            `MissingMetadataError`: If the ORCID is not in the bundle
+        """
+        return self._lookup('ORCID', self.orcids, orcid)
+
+
+def get_offline_bundle():
+    """Return the bundle used in offline mode.
+
+    On the first call, the bundle is loaded from the file given by the ``PYKED_OFFLINE_BUNDLE``
+    environment variable, if it is set.
+
+    Returns:
+        `MetadataBundle`: The offline bundle, or `None` if offline mode is not enabled
+    """
+    global _offline_bundle, _bundle_loaded
+    if not _bundle_loaded:
+        filename = os.environ.get('PYKED_OFFLINE_BUNDLE')
+        if filename:
+            _offline_bundle = MetadataBundle.load(filename)
+        _bundle_loaded = True
+    return _offline_bundle
+
+
+def set_offline_bundle(bundle):
+    """Enable or disable offline mode.
+
+    Args:
+        bundle (`MetadataBundle` or `str`): The bundle, or the filename of a bundle, to look up
+            DOIs and ORCIDs in. `None` disables offline mode.
+    """
+    global _offline_bundle, _bundle_loaded
+    if isinstance(bundle, str):
+        bundle = MetadataBundle.load(bundle)
+    _offline_bundle = bundle
+    _bundle_loaded = True
+
+
+def export_bundle(argv=None):
+    """Command-line entry point for exporting the DOI and ORCID metadata of ChemKED files.
+    """
+    parser = ArgumentParser(
+        description='Look up the DOIs and ORCIDs in ChemKED files and store their metadata in '
+                    'a bundle for offline validation.'
+        )
+    parser.add_argument('paths',
+                        nargs='+',
+                        help='ChemKED files, or directories that are searched for ChemKED files'
+                        )
+    parser.add_argument('-o', '--output',
+                        type=str,
+                        required=True,
+                        help='Output filename (e.g., "chemked-metadata.json")'
+                        )
+    parser.add_argument('-u', '--update',
+                        action='store_true',
+                        help='Add the metadata to the existing bundle in the output file'
+                        )
+    parser.add_argument('-j', '--jobs',
+                        type=int,
+                        default=8,
+                        help='Number of concurrent lookups'
+                        )
+
+    args = parser.parse_args(argv)
+
+    from requests.exceptions import HTTPError
+    from .validation import load_yaml, prefetch_metadata
+
+    filenames = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, files in os.walk(path):
+                filenames.extend(os.path.join(dirpath, f) for f in files if f.endswith('.yaml'))
+        else:
+            filenames.append(path)
+
+    properties = []
+    for filename in sorted(filenames):
+        with open(filename, 'r') as f:
+            properties.append(load_yaml(f))
+
+    if args.update and os.path.exists(args.output):
+        bundle = MetadataBundle.load(args.output)
+    else:
+        bundle = MetadataBundle()
+
+    # The metadata must come from the web APIs, even if offline mode is enabled
+    set_offline_bundle(None)
+    for (kind, key), result in prefetch_metadata(properties, max_workers=args.jobs).items():
+        if isinstance(result, HTTPError) and getattr(result.response, 'status_code', None) == 404:
+            result = None
+        elif isinstance(result, Exception):
+            warn('{} {} could not be looked up: {}'.format(kind.upper(), key, result))
+            continue
+        if kind == 'doi':
+            bundle.add_doi(key, result)
+        else:
+            bundle.add_orcid(key, result)
+
+    bundle.save(args.output)
+    print('Exported {} DOIs and {} ORCIDs from {} files to {}'.format(
+        len(bundle.dois), len(bundle.orcids), len(properties), args.output))
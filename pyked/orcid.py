@@ -1,16 +1,233 @@
 """
 Module for ORCID interaction
 """
-import requests
+import os
+import threading
+from collections import OrderedDict
+
+from .cache import get_cache_dir, MetadataCache
+from .offline import get_offline_bundle
+
 headers = {'Accept': 'application/json'}
 
+_orcid_client = None
+_use_default_cache = True
+
+
+class OrcidClient(object):
+    """Client for the ORCID public API.
+
+    The client keeps a pool of connections open to the API, so consecutive searches do not
+    need a new connection. Requests time out instead of waiting indefinitely, and failed requests
+    are retried with exponential backoff. Results, including ORCIDs that are not found, are
+    cached in memory and optionally in a persistent cache.
+
+    Arguments:
+        base_url (`str`, optional): URL of the ORCID public API
+        timeout (`float` or `tuple`, optional): The connect and read timeouts of each request in
+            seconds. A single number is used for both.
+        retries (`int`, optional): Number of times a request is retried after read errors or
+            server errors (status codes 429, 500, 502, 503, and 504). Failures to connect are not
+            retried.
+        backoff_factor (`float`, optional): Factor for the delay between retries, which is
+            ``backoff_factor * 2 ** (retry - 1)`` seconds
+        cache (optional): Persistent cache of the results, such as a
+            `~pyked.cache.MetadataCache`, or `None` to only cache the results in memory
+        memory_cache_size (`int`, optional): Maximum number of results cached in memory. The
+            least recently used results are evicted first.
+
+    Examples:
+        >>> client = OrcidClient(timeout=(3, 10), retries=2)
+        >>> client.search('0000-0003-4425-7097')['name']['family-name']['value']
+        'Niemeyer'
+    """
+    retry_status_codes = (429, 500, 502, 503, 504)
+    """`tuple`: HTTP status codes of responses that are retried"""
+
+    def __init__(self, *, base_url='https://pub.orcid.org/v2.1', timeout=(3.05, 15), retries=3,
+                 backoff_factor=0.5, cache=None, memory_cache_size=1024):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.cache = cache
+        self.memory_cache_size = memory_cache_size
+        self._memory_cache = OrderedDict()
+        self._refreshed = None
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """`~requests.Session`: The session used for the requests, created on first use"""
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            # Failures to connect are not retried, since they usually mean that the network
+            # is not available
+            retry = Retry(total=self.retries, connect=0, backoff_factor=self.backoff_factor,
+                          status_forcelist=self.retry_status_codes, raise_on_status=False)
+            adapter = HTTPAdapter(max_retries=retry, pool_maxsize=16)
+            session = requests.Session()
+            session.headers.update(headers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._session = session
+        return self._session
+
+    def _get_cached(self, orcid):
+        """Return the cached result for an ORCID, or `None` if it is not cached."""
+        with self._lock:
+            result = self._memory_cache.get(orcid)
+            if result is not None:
+                self._memory_cache.move_to_end(orcid)
+                return result
+
+        if self.cache is not None and (self._refreshed is None or orcid in self._refreshed):
+            result = self.cache.get(orcid)
+            if result is not None:
+                self._set_memory_cached(orcid, result)
+        return result
+
+    def _set_memory_cached(self, orcid, result):
+        """Store a result in the memory cache, evicting the least recently used results."""
+        with self._lock:
+            self._memory_cache[orcid] = result
+            self._memory_cache.move_to_end(orcid)
+            while len(self._memory_cache) > self.memory_cache_size:
+                self._memory_cache.popitem(last=False)
+
+    def _set_cached(self, orcid, result):
+        """Store a result in the memory cache and the persistent cache."""
+        self._set_memory_cached(orcid, result)
+        if self.cache is not None:
+            self.cache.set(orcid, result)
+            if self._refreshed is not None:
+                self._refreshed.add(orcid)
+
+    def clear_cache(self):
+        """Discard the cached results, in memory and in the persistent cache."""
+        with self._lock:
+            self._memory_cache.clear()
+        if self.cache is not None:
+            self.cache.clear()
+
+    def refresh_cache(self):
+        """Stop using the results in the persistent cache. Each ORCID is searched again the first
+        time it is needed, and the new result replaces the cached one."""
+        with self._lock:
+            self._memory_cache.clear()
+            self._refreshed = set()
+
+    def search(self, orcid):
+        """
+        Search the ORCID public API
+
+        Specifically, return a dictionary with the personal details (name, etc.) of the person
+        associated with the given ORCID
+
+        Args:
+            orcid (`str`): The ORCID to be searched
+
+        Returns:
+            `dict`: Dictionary with the JSON response from the API
+
+        Raises:
+            `~requests.HTTPError`: If the given ORCID cannot be found, an `~requests.HTTPError`
+                is raised with status code 404
+            `~requests.ConnectionError`: If the API cannot be reached
+            `~requests.Timeout`: If the API does not respond within the timeout
+        """
+        from requests import Response
+        from requests.exceptions import HTTPError
+
+        url = '{base_url}/{orcid}/person'.format(base_url=self.base_url, orcid=orcid)
+        cached = self._get_cached(orcid)
+        if cached is not None:
+            if cached.get('status') == 404:
+                response = Response()
+                response.status_code = 404
+                response.url = url
+                raise HTTPError('404 Client Error: ORCID {} not found (cached)'.format(orcid),
+                                response=response)
+            return cached['person']
+
+        r = self.session.get(url, timeout=self.timeout)
+        if r.status_code == 404:
+            self._set_cached(orcid, {'status': 404})
+        if r.status_code != 200:
+            r.raise_for_status()
+        person = r.json()
+        self._set_cached(orcid, {'status': 200, 'person': person})
+        return person
+
+
+def get_orcid_client():
+    """Return the client used for ORCID searches.
+
+    The client caches the results in memory. They are only cached on disk if the cache is
+    enabled, so that validating ChemKED files does not write to the user's cache directory unless
+    asked to. The cache is enabled by calling `enable_orcid_cache` or by setting the
+    ``PYKED_ORCID_CACHE`` environment variable to ``1``. The converter command-line tools and
+    ``ck_validate`` enable it.
+
+    Returns:
+        `OrcidClient`: The client used by `search_orcid`
+    """
+    global _orcid_client
+    if _orcid_client is None:
+        _orcid_client = OrcidClient()
+    if os.environ.get('PYKED_ORCID_CACHE', '0') not in ['', '0']:
+        _set_default_cache(_orcid_client)
+    return _orcid_client
+
+
+def enable_orcid_cache(refresh=False):
+    """Cache the ORCID searches in ``orcid.sqlite`` in the PyKED cache directory.
+
+    The PyKED cache directory is given by `~pyked.cache.get_cache_dir`. The cache of a client set
+    with `set_orcid_client` is not replaced.
+
+    Args:
+        refresh (`bool`, optional): If `True`, the cached results are not used for the rest of
+            this run, see `OrcidClient.refresh_cache`
+
+    Returns:
+        `~pyked.cache.MetadataCache`: The persistent cache of the client, or `None` if it has none
+    """
+    client = get_orcid_client()
+    _set_default_cache(client)
+    if refresh:
+        client.refresh_cache()
+    return client.cache
+
+
+def _set_default_cache(client):
+    """Give the client the default persistent cache, unless it has one or was set by the user."""
+    if client.cache is None and _use_default_cache:
+        client.cache = MetadataCache(os.path.join(get_cache_dir(), 'orcid.sqlite'))
+
+
+def set_orcid_client(client):
+    """Set the client used for ORCID searches.
+
+    Args:
+        client (`OrcidClient`): The client to be used by `search_orcid`
+    """
+    global _orcid_client, _use_default_cache
+    _orcid_client = client
+    _use_default_cache = False
+
 
 def search_orcid(orcid):
     """
     Search the ORCID public API
 
     Specfically, return a dictionary with the personal details
-    (name, etc.) of the person associated with the given ORCID
+    (name, etc.) of the person associated with the given ORCID. In offline mode, the ORCID
+    is looked up in the offline bundle instead (see `pyked.offline`).
 
     Args:
         orcid (`str`): The ORCID to be searched
@@ -21,9 +238,9 @@ def search_orcid(orcid):
     Raises:
         `~requests.HTTPError`: If the given ORCID cannot be found, an `~requests.HTTPError`
             is raised with status code 404
+        `~pyked.offline.MissingMetadataError`: If the ORCID is not in the offline bundle
     """
-    url = 'https://pub.orcid.org/v2.1/{orcid}/person'.format(orcid=orcid)
-    r = requests.get(url, headers=headers)
-    if r.status_code != 200:
-        r.raise_for_status()
-    return r.json()
+    bundle = get_offline_bundle()
+    if bundle is not None:
+        return bundle.search_orcid(orcid)
+    return get_orcid_client().search(orcid)
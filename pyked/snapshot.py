@@ -0,0 +1,285 @@
+"""
+Snapshots of ChemKED objects
+
+Loading a ChemKED file parses the YAML, validates it, and builds every `~pyked.chemked.DataPoint`
+with its Pint quantities and time history arrays, which takes much longer than reading back the
+finished object. With ``ChemKED(yaml_file, use_snapshot=True)``, the state of the object is
+stored in the snapshot cache after it is built, and later loads of a file with the same contents
+read the snapshot instead.
+
+Snapshots are pickles in which every Pint quantity is stored as its magnitude and unit string,
+and the NumPy arrays are stored as buffers. Quantities are rebuilt with the PyKED unit registry
+`pyked.validation.units`. Quantities pickled by Pint itself are rebuilt with Pint's application
+registry instead, which does not know the units defined by PyKED, and cannot be combined with
+quantities from the PyKED registry.
+
+Snapshots are keyed by a hash of the contents of the file, the options used to load it, and the
+PyKED version, so they are never used for a file that changed. Time history values in other
+files are not stored, since they are read when they are first used, but snapshots of files with
+time history values in other files are not used once those files change either. By default, the
+snapshots are stored in the ``snapshots`` directory of the PyKED cache directory (see
+`~pyked.cache.get_cache_dir`), and the least recently used snapshots are evicted when the
+snapshots take more than 512 MB.
+"""
+# Standard libraries
+import io
+import os
+import pickle
+import hashlib
+
+import numpy as np
+
+# Local imports
+from .cache import get_cache_dir, FileCache
+from .validation import units, Q_
+from ._version import __version__
+
+SNAPSHOT_FORMAT = 6
+"""`int`: Version of the snapshot format, changed whenever the stored objects change"""
+
+_snapshot_cache = None
+_use_default_cache = True
+
+
+class _BroadcastArray(object):
+    """An array that repeats one value, pickled as the value and the shape of the array.
+
+    The uncertainty of a time history given by a single value is such an array, so pickling it
+    does not store a copy of the value for every point. It is unpickled as a read-only view with
+    `numpy.broadcast_to`.
+    """
+    __slots__ = ('value', 'shape')
+
+    def __init__(self, value, shape):
+        self.value = value
+        self.shape = shape
+
+    def __reduce__(self):
+        return np.broadcast_to, (self.value, self.shape)
+
+
+def _pickled_magnitude(magnitude):
+    """Return the magnitude of a quantity to be pickled, as a `_BroadcastArray` if it repeats
+    one value."""
+    if isinstance(magnitude, np.ndarray) and magnitude.size > 1 and not any(magnitude.strides):
+        return _BroadcastArray(magnitude[(0,) * magnitude.ndim], magnitude.shape)
+    return magnitude
+
+
+class QuantityPickler(pickle.Pickler):
+    """Pickler that stores Pint quantities of the PyKED registry as magnitude and unit string.
+
+    Quantities with uncertainties (`~pint.Measurement`) are stored as the nominal value, the
+    standard deviation, and the unit string. Use `QuantityUnpickler` to load the data.
+    """
+    def persistent_id(self, obj):
+        if isinstance(obj, units.Measurement):
+            return ('measurement', obj.value.magnitude, obj.error.magnitude, str(obj.units))
+        elif isinstance(obj, units.Quantity):
+            return ('quantity', _pickled_magnitude(obj.magnitude), str(obj.units))
+        return None
+
+
+class QuantityUnpickler(pickle.Unpickler):
+    """Unpickler that rebuilds the quantities stored by `QuantityPickler` with the PyKED registry.
+    """
+    def persistent_load(self, pid):
+        kind = pid[0]
+        if kind == 'measurement':
+            return Q_(pid[1], pid[3]).plus_minus(pid[2])
+        elif kind == 'quantity':
+            return Q_(pid[1], pid[2])
+        raise pickle.UnpicklingError('unknown persistent id {!r}'.format(kind))
+
+
+class _SerializedQuantity(object):
+    """A Pint quantity stored as its magnitude, uncertainty, and unit string.
+
+    Used by `encode_quantities` in the state of objects that are pickled by other picklers,
+    such as the one used by `multiprocessing`.
+    """
+    __slots__ = ('magnitude', 'error', 'units')
+
+    def __init__(self, magnitude, error, units):
+        self.magnitude = magnitude
+        self.error = error
+        self.units = units
+
+    def __reduce__(self):
+        return _SerializedQuantity, (_pickled_magnitude(self.magnitude), self.error, self.units)
+
+    def to_quantity(self):
+        """Return the quantity, in the PyKED unit registry."""
+        quantity = Q_(self.magnitude, self.units)
+        if self.error is not None:
+            quantity = quantity.plus_minus(self.error)
+        return quantity
+
+
+def encode_quantities(obj):
+    """Replace the Pint quantities in nested containers by their magnitudes and unit strings.
+
+    Dictionaries, lists, tuples, and named tuples are searched for quantities. Use
+    `decode_quantities` to rebuild the quantities with the PyKED unit registry.
+
+    Args:
+        obj: The object, such as the ``__dict__`` of an object to be pickled
+
+    Returns:
+        A copy of the object, with the quantities replaced
+    """
+    if isinstance(obj, units.Measurement):
+        return _SerializedQuantity(obj.value.magnitude, obj.error.magnitude, str(obj.units))
+    elif isinstance(obj, units.Quantity):
+        return _SerializedQuantity(obj.magnitude, None, str(obj.units))
+    elif isinstance(obj, dict):
+        return {key: encode_quantities(value) for key, value in obj.items()}
+    elif isinstance(obj, list):
+        return [encode_quantities(value) for value in obj]
+    elif isinstance(obj, tuple):
+        values = [encode_quantities(value) for value in obj]
+        return type(obj)(*values) if hasattr(obj, '_fields') else tuple(values)
+    return obj
+
+
+def decode_quantities(obj):
+    """Rebuild the quantities replaced by `encode_quantities`.
+
+    Args:
+        obj: The object returned by `encode_quantities`
+
+    Returns:
+        A copy of the object, with the quantities in the PyKED unit registry
+    """
+    if isinstance(obj, _SerializedQuantity):
+        return obj.to_quantity()
+    elif isinstance(obj, dict):
+        return {key: decode_quantities(value) for key, value in obj.items()}
+    elif isinstance(obj, list):
+        return [decode_quantities(value) for value in obj]
+    elif isinstance(obj, tuple):
+        values = [decode_quantities(value) for value in obj]
+        return type(obj)(*values) if hasattr(obj, '_fields') else tuple(values)
+    return obj
+
+
+def dumps(obj):
+    """Serialize an object that may contain Pint quantities, see `QuantityPickler`.
+
+    Args:
+        obj: The object to be serialized
+
+    Returns:
+        `bytes`: The serialized object
+    """
+    f = io.BytesIO()
+    QuantityPickler(f, protocol=pickle.HIGHEST_PROTOCOL).dump(obj)
+    return f.getvalue()
+
+
+def loads(data):
+    """Load an object serialized by `dumps`.
+
+    Args:
+        data (`bytes`): The serialized object
+
+    Returns:
+        The object, with its quantities in the PyKED unit registry
+    """
+    return QuantityUnpickler(io.BytesIO(data)).load()
+
+
+def get_snapshot_cache():
+    """Return the cache of snapshots.
+
+    Returns:
+        `~pyked.cache.FileCache`: The cache of snapshots, or `None` if caching is disabled
+    """
+    global _snapshot_cache
+    if _snapshot_cache is None and _use_default_cache:
+        _snapshot_cache = FileCache(os.path.join(get_cache_dir(), 'snapshots'))
+    return _snapshot_cache
+
+
+def set_snapshot_cache(cache):
+    """Set the cache used for snapshots.
+
+    Args:
+        cache: The cache to use, or `None` to disable snapshots. Any object with ``get(key)`` and
+            ``set(key, data)`` methods like `~pyked.cache.FileCache` can be used.
+    """
+    global _snapshot_cache, _use_default_cache
+    _snapshot_cache = cache
+    _use_default_cache = False
+
+
+def snapshot_key(content, **options):
+    """Return the key of the snapshot of a ChemKED file.
+
+    Args:
+        content (`bytes`): The contents of the file
+        options: The options used to build the object, which must have a unique `repr`
+
+    Returns:
+        `str`: The key
+    """
+    h = hashlib.sha256(content)
+    h.update(repr(sorted(options.items())).encode('utf-8'))
+    h.update('{} {}'.format(__version__, SNAPSHOT_FORMAT).encode('utf-8'))
+    return h.hexdigest()
+
+
+def _file_stats(filenames):
+    """Return the absolute path, modification time, and size of each file.
+
+    Missing files have a modification time and size of `None`.
+    """
+    stats = {}
+    for filename in filenames:
+        try:
+            stat = os.stat(filename)
+            stats[filename] = (os.path.abspath(filename), stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            stats[filename] = (os.path.abspath(filename), None, None)
+    return stats
+
+
+def load_snapshot(key):
+    """Return the state of an object stored with `store_snapshot`.
+
+    Args:
+        key (`str`): The key of the snapshot, from `snapshot_key`
+
+    Returns:
+        `dict`: The state of the object, or `None` if there is no snapshot, it cannot be read, or
+            any of the files it depends on changed
+    """
+    cache = get_snapshot_cache()
+    if cache is None:
+        return None
+    data = cache.get(key)
+    if data is None:
+        return None
+    try:
+        snapshot = loads(data)
+    except Exception:
+        # A damaged snapshot is only a cache miss, and is replaced by the next store
+        return None
+    if _file_stats(snapshot['files']) != snapshot['files']:
+        return None
+    return snapshot['state']
+
+
+def store_snapshot(key, state, files=()):
+    """Store the state of an object in the snapshot cache.
+
+    Args:
+        key (`str`): The key of the snapshot, from `snapshot_key`
+        state (`dict`): The state of the object
+        files (`list`, optional): Other files that the object was built from, such as the files
+            of time history values. The snapshot is not used after any of them change.
+    """
+    cache = get_snapshot_cache()
+    if cache is not None:
+        files = _file_stats(files)
+        cache.set(key, dumps({'state': state, 'files': files}))
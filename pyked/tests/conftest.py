@@ -0,0 +1,109 @@
+"""
+Shared fixtures for the tests
+"""
+
+# Standard libraries
+import json
+import threading
+import time
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+
+import pytest
+
+# Local imports
+from .. import crossref, orcid, offline, validation, snapshot
+
+
+@pytest.fixture(autouse=True)
+def no_metadata_cache(monkeypatch):
+    """Disable the caches of web API lookups, validation results, and snapshots, and offline
+    mode, so the tests do not depend on each other.
+    """
+    monkeypatch.setattr(crossref, '_reference_cache', None)
+    monkeypatch.setattr(crossref, '_use_default_cache', False)
+    monkeypatch.setattr(crossref, '_refreshed_dois', None)
+    monkeypatch.setattr(validation, '_validation_cache', None)
+    monkeypatch.setattr(validation, '_use_default_validation_cache', False)
+    monkeypatch.setattr(snapshot, '_snapshot_cache', None)
+    monkeypatch.setattr(snapshot, '_use_default_cache', False)
+    monkeypatch.setattr(orcid, '_orcid_client', orcid.OrcidClient(memory_cache_size=0))
+    monkeypatch.setattr(orcid, '_use_default_cache', False)
+    monkeypatch.setattr(offline, '_offline_bundle', None)
+    monkeypatch.setattr(offline, '_bundle_loaded', True)
+
+
+class FakeWebAPI(object):
+    """Local HTTP server standing in for a web API.
+
+    Responses are set by path in ``responses``, as a tuple of the status code and the object to
+    be returned as JSON. A list of tuples gives the responses to consecutive requests, with the
+    last one repeated. Paths without a response return a 404 error. The path of each request
+    is appended to ``requests``, and each response is delayed by ``delay`` seconds.
+    """
+    def __init__(self):
+        self.responses = {}
+        self.requests = []
+        self.delay = 0
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                api.requests.append(path)
+                response = api.responses.get(path, (404, None))
+                if isinstance(response, list):
+                    response = response.pop(0) if len(response) > 1 else response[0]
+                status, content = response
+                time.sleep(api.delay)
+                if content is None:
+                    body = b'Resource not found.'
+                    content_type = 'text/plain'
+                else:
+                    body = json.dumps(content).encode('utf-8')
+                    content_type = 'application/json'
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingMixIn, HTTPServer):
+            daemon_threads = True
+
+            def handle_error(self, request, client_address):
+                # Clients that time out close the connection before the response is sent
+                pass
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_port)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def web_api():
+    """Local HTTP server standing in for a web API.
+    """
+    api = FakeWebAPI()
+    yield api
+    api.close()
+
+
+@pytest.fixture
+def fake_crossref(web_api, monkeypatch, tmpdir):
+    """Local stand-in for the Crossref API, with the DOI lookups cached in a temporary directory.
+    """
+    import habanero
+    from ..cache import MetadataCache
+
+    monkeypatch.setattr(crossref, '_crossref_api', habanero.Crossref(base_url=web_api.url))
+    crossref.set_reference_cache(MetadataCache(str(tmpdir.join('crossref.sqlite'))))
+    return web_api
@@ -0,0 +1,186 @@
+"""
+Tests for batch validation
+"""
+
+# Standard libraries
+import os
+import json
+import pkg_resources
+from shutil import copy
+
+import pytest
+import yaml
+
+# Local imports
+from .. import batch, validation
+from ..batch import find_files, main
+from .test_validation import CROSSREF_REFERENCE
+from .test_offline import PERSON
+
+
+@pytest.fixture(autouse=True)
+def new_worker(monkeypatch):
+    """Start each test without the validator and lookups of the previous tests."""
+    monkeypatch.setattr(batch, '_worker', {})
+
+
+@pytest.fixture
+def database(tmpdir):
+    for name in ['testfile_st.yaml', 'testfile_st2.yaml', 'testfile_rcm.yaml']:
+        copy(pkg_resources.resource_filename(__name__, name), str(tmpdir.mkdir(name[:-5])))
+    tmpdir.join('notes.txt').write('not a ChemKED file')
+    return tmpdir
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    """Record the DOI and ORCID lookups, returning the metadata of the test files."""
+    lookups = []
+
+    def search(kind, key):
+        lookups.append((kind, key))
+        return CROSSREF_REFERENCE if kind == 'doi' else PERSON
+
+    monkeypatch.setattr(validation, '_search', search)
+    return lookups
+
+
+def read_results(capsys):
+    captured = capsys.readouterr()
+    return [json.loads(line) for line in captured.out.splitlines()], captured.err
+
+
+class TestFindFiles(object):
+    """
+    """
+    def test_directory(self, database):
+        filenames = find_files([str(database)])
+        assert [os.path.basename(f) for f in filenames] == [
+            'testfile_rcm.yaml', 'testfile_st.yaml', 'testfile_st2.yaml']
+
+    def test_pattern(self, database):
+        filenames = find_files([str(database)], pattern='*_st*.yaml')
+        assert len(filenames) == 2
+
+    def test_glob_and_files(self, database):
+        filename = str(database.join('testfile_st', 'testfile_st.yaml'))
+        filenames = find_files([str(database.join('*', 'testfile_st*.yaml')), filename])
+        assert filenames == sorted([filename, str(database.join('testfile_st2',
+                                                                 'testfile_st2.yaml'))])
+
+    def test_bracket_pattern(self, database):
+        filenames = find_files([str(database.join('testfile_st[2]', '*.yaml'))])
+        assert filenames == [str(database.join('testfile_st2', 'testfile_st2.yaml'))]
+
+    def test_missing_file(self, database):
+        """Missing files are reported by the validation, not dropped"""
+        assert find_files(['missing.yaml']) == ['missing.yaml']
+
+
+class TestValidateCLI(object):
+    """
+    """
+    def test_valid(self, database, capsys):
+        main(['-j', '1', '--validation', 'units', str(database)])
+        results, summary = read_results(capsys)
+        assert [r['valid'] for r in results] == [True] * 3
+        assert all(r['errors'] == {} for r in results)
+        assert results[0]['file'].endswith('testfile_rcm.yaml')
+        assert 'Validated 3 files' in summary and '3 valid, 0 invalid' in summary
+
+    def test_invalid(self, database, capsys):
+        filename = database.join('testfile_st', 'testfile_st.yaml')
+        properties = yaml.safe_load(filename.read())
+        properties['file-version'] = 'one'
+        filename.write(yaml.safe_dump(properties))
+        database.join('broken.yaml').write('datapoints: [')
+
+        with pytest.raises(SystemExit) as excinfo:
+            main(['-j', '1', '--validation', 'structural', str(database)])
+        assert excinfo.value.code == 1
+
+        results, summary = read_results(capsys)
+        results = {os.path.basename(r['file']): r for r in results}
+        assert results['testfile_st.yaml']['errors'] == {
+            'file-version': ['must be of integer type']}
+        assert results['broken.yaml']['errors'].startswith('ParserError')
+        assert not results['broken.yaml']['valid']
+        assert results['testfile_rcm.yaml']['valid']
+        assert '2 valid, 2 invalid' in summary
+
+    @pytest.mark.parametrize('engine', ['compiled', 'cerberus'])
+    def test_shared_lookups(self, database, capsys, lookups, engine):
+        main(['-j', '1', '--engine', engine, str(database.join('testfile_st*', '*.yaml'))])
+        results, summary = read_results(capsys)
+        assert [r['valid'] for r in results] == [True, True]
+        assert sorted(lookups) == [('doi', '10.1016/j.ijhydene.2007.04.008'),
+                                   ('orcid', '0000-0003-4425-7097')]
+
+    def test_failed_lookups_retried(self, database, capsys, monkeypatch):
+        """Lookups that failed because of the network are made again for the next file"""
+        from requests.exceptions import ConnectionError
+        lookups = []
+
+        def search(kind, key):
+            lookups.append((kind, key))
+            if len(lookups) <= 2:
+                raise ConnectionError('network not available')
+            return CROSSREF_REFERENCE if kind == 'doi' else PERSON
+
+        monkeypatch.setattr(validation, '_search', search)
+        main(['-j', '1', str(database.join('testfile_st*', '*.yaml'))])
+        results, summary = read_results(capsys)
+        assert [r['valid'] for r in results] == [True, True]
+        assert len(lookups) == 4
+
+    def test_not_found_reused(self, database, capsys, monkeypatch):
+        """DOIs and ORCIDs that were not found are not looked up again"""
+        from requests import Response
+        from requests.exceptions import HTTPError
+        lookups = []
+
+        def search(kind, key):
+            lookups.append((kind, key))
+            response = Response()
+            response.status_code = 404
+            raise HTTPError('404 Client Error', response=response)
+
+        monkeypatch.setattr(validation, '_search', search)
+        with pytest.raises(SystemExit):
+            main(['-j', '1', str(database.join('testfile_st*', '*.yaml'))])
+        results, summary = read_results(capsys)
+        assert [r['valid'] for r in results] == [False, False]
+        assert len(lookups) == 2
+
+    def test_validator_reused(self):
+        worker = batch._get_worker('units', 'compiled')
+        validator = worker['validator']
+        assert batch._get_worker('units', 'compiled')['validator'] is validator
+        assert batch._get_worker('structural', 'compiled')['validator'] is not validator
+
+    def test_profile(self, database, capsys):
+        main(['-j', '1', '--validation', 'units', '--profile',
+              str(database.join('testfile_st'))])
+        results, summary = read_results(capsys)
+        assert results[0]['timings']['rules']['isvalid_quantity']['calls'] > 0
+        assert 'cerberus' in results[0]['timings']['stages']
+
+    def test_processes(self, database, capsys):
+        main(['-j', '2', '--validation', 'units', str(database)])
+        results, summary = read_results(capsys)
+        assert [os.path.basename(r['file']) for r in results] == [
+            'testfile_rcm.yaml', 'testfile_st.yaml', 'testfile_st2.yaml']
+        assert all(r['valid'] for r in results)
+
+    def test_cache(self, database, capsys, tmpdir):
+        from ..cache import MetadataCache
+        validation.set_validation_cache(MetadataCache(str(tmpdir.join('validation.sqlite'))))
+        main(['-j', '1', '--validation', 'units', str(database)])
+        main(['-j', '1', '--validation', 'units', str(database)])
+        results, summary = read_results(capsys)
+        assert [r.get('cached', False) for r in results] == [False] * 3 + [True] * 3
+        assert all(r['valid'] for r in results)
+
+        main(['-j', '1', '--validation', 'units', '--no-cache', str(database)])
+        results, summary = read_results(capsys)
+        assert not any(r.get('cached', False) for r in results)
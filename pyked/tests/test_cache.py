@@ -0,0 +1,170 @@
+"""
+Tests for the caches
+"""
+
+# Standard libraries
+import os
+import pickle
+import itertools
+
+import pytest
+
+# Local imports
+from .. import cache
+from ..cache import MetadataCache, FileCache
+
+
+class TestMetadataCache(object):
+    """
+    """
+    @pytest.fixture
+    def clock(self, monkeypatch):
+        """Make the cache timestamps increase by one second on each access."""
+        counter = itertools.count(1000.0)
+        monkeypatch.setattr(cache.time, 'time', lambda: next(counter))
+
+    def test_get_set(self, tmpdir):
+        c = MetadataCache(str(tmpdir.join('subdir', 'metadata.sqlite')))
+        assert c.get('missing') is None
+        assert c.get('missing', 'default') == 'default'
+        c.set('key', {'a': [1, 2.5, 'b']})
+        assert c.get('key') == {'a': [1, 2.5, 'b']}
+        assert 'key' in c
+        assert 'missing' not in c
+        assert len(c) == 1
+
+        c.set('key', {'a': 2})
+        assert c.get('key') == {'a': 2}
+        assert len(c) == 1
+
+    def test_stats(self, tmpdir, clock):
+        c = MetadataCache(str(tmpdir.join('metadata.sqlite')), ttl=10)
+        c.get('missing')
+        c.set('key', 1)
+        c.get('key')
+        c.get('key')
+        assert c.stats() == {'hits': 2, 'misses': 1, 'entries': 1}
+
+        # Expired entries are misses
+        for i in range(10):
+            c.get('other')
+        c.get('key')
+        assert c.stats() == {'hits': 2, 'misses': 12, 'entries': 0}
+
+    def test_persistent(self, tmpdir):
+        filename = str(tmpdir.join('metadata.sqlite'))
+        MetadataCache(filename).set('key', 'value')
+        assert MetadataCache(filename).get('key') == 'value'
+
+    def test_delete_clear(self, tmpdir):
+        c = MetadataCache(str(tmpdir.join('metadata.sqlite')))
+        c.set('a', 1)
+        c.set('b', 2)
+        c.delete('a')
+        c.delete('missing')
+        assert 'a' not in c
+        assert c.get('b') == 2
+        c.clear()
+        assert len(c) == 0
+
+    def test_ttl(self, tmpdir, clock):
+        c = MetadataCache(str(tmpdir.join('metadata.sqlite')), ttl=10)
+        c.set('key', 'value')
+        assert c.get('key') == 'value'
+        # Access does not extend the lifetime of an entry
+        for _ in range(10):
+            c.get('key')
+        assert c.get('key') is None
+        assert len(c) == 0
+
+    def test_no_ttl(self, tmpdir, clock):
+        c = MetadataCache(str(tmpdir.join('metadata.sqlite')), ttl=None)
+        c.set('key', 'value')
+        for _ in range(100):
+            assert c.get('key') == 'value'
+
+    def test_lru_eviction(self, tmpdir, clock):
+        c = MetadataCache(str(tmpdir.join('metadata.sqlite')), max_entries=2)
+        c.set('a', 1)
+        c.set('b', 2)
+        assert c.get('a') == 1
+        c.set('c', 3)
+        assert len(c) == 2
+        assert 'b' not in c
+        assert c.get('a') == 1
+        assert c.get('c') == 3
+
+    def test_size_eviction(self, tmpdir, clock):
+        # Each entry takes 1 byte of key and 102 bytes of JSON
+        c = MetadataCache(str(tmpdir.join('metadata.sqlite')), max_bytes=250)
+        c.set('a', 'x' * 100)
+        c.set('b', 'y' * 100)
+        assert c.get('a') == 'x' * 100
+        c.set('c', 'z' * 100)
+        assert len(c) == 2
+        assert 'b' not in c
+        assert c.get('a') == 'x' * 100
+
+        c.set('d', 'w' * 300)
+        assert len(c) == 0
+
+    def test_unusable_file(self, tmpdir):
+        """Ensure that errors using the database are treated as cache misses."""
+        tmpdir.join('file').write('')
+        c = MetadataCache(str(tmpdir.join('file', 'metadata.sqlite')))
+        c.set('key', 'value')
+        assert c.get('key') is None
+        assert len(c) == 0
+        c.clear()
+
+    def test_pickle(self, tmpdir):
+        c = MetadataCache(str(tmpdir.join('metadata.sqlite')), ttl=5, max_entries=3,
+                          max_bytes=1000)
+        c.set('key', 'value')
+        c2 = pickle.loads(pickle.dumps(c))
+        assert (c2.filename, c2.ttl, c2.max_entries, c2.max_bytes) == (c.filename, 5, 3, 1000)
+        assert c2.get('key') == 'value'
+
+
+class TestFileCache(object):
+    """
+    """
+    def test_get_set(self, tmpdir):
+        c = FileCache(str(tmpdir.join('files')))
+        assert c.get('missing') is None
+        c.set('key', b'data')
+        assert c.get('key') == b'data'
+        assert 'key' in c
+        assert 'missing' not in c
+        assert len(c) == 1
+        assert c.stats() == {'hits': 1, 'misses': 1, 'entries': 1, 'bytes': 4}
+
+        assert FileCache(str(tmpdir.join('files'))).get('key') == b'data'
+
+    def test_delete_clear(self, tmpdir):
+        c = FileCache(str(tmpdir))
+        c.set('a', b'1')
+        c.set('b', b'2')
+        c.delete('a')
+        c.delete('missing')
+        assert 'a' not in c and 'b' in c
+        c.clear()
+        assert len(c) == 0
+
+    def test_eviction(self, tmpdir):
+        c = FileCache(str(tmpdir), max_bytes=35)
+        for i, key in enumerate(['a', 'b', 'c']):
+            c.set(key, b'0123456789')
+            os.utime(str(tmpdir.join(key + c.suffix)), (1000 + i, 1000 + i))
+
+        # Using an entry makes it the most recently used
+        assert c.get('a') == b'0123456789'
+        c.set('d', b'0123456789')
+        assert sorted(f.basename for f in tmpdir.listdir()) == ['a.bin', 'c.bin', 'd.bin']
+
+    def test_unwritable(self, tmpdir):
+        """Errors writing the cache are ignored"""
+        tmpdir.join('file').write('')
+        c = FileCache(str(tmpdir.join('file', 'cache')))
+        c.set('key', b'data')
+        assert c.get('key') is None
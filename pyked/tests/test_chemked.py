@@ -3,6 +3,7 @@ Test module for chemked.py
 """
 # Standard libraries
 import os
+import pickle
 import pkg_resources
 import warnings
 from tempfile import TemporaryDirectory
@@ -15,7 +16,7 @@ import pytest
 
 # Local imports
 from ..validation import schema, OurValidator, yaml, Q_
-from ..chemked import ChemKED, DataPoint, Composition
+from ..chemked import ChemKED, ChemKEDCollection, DataPoint, Composition
 from ..converters import get_datapoints, get_common_properties
 from .._version import __version__
 
@@ -32,6 +33,16 @@ class TestChemKED(object):
         filename = pkg_resources.resource_filename(__name__, file_path)
         ChemKED(filename)
 
+    def test_validation_without_caches(self):
+        """Files are validated when the validation cache and snapshots are not used"""
+        from .. import validation
+        assert validation.get_validation_cache() is None
+        file_path = os.path.join('testfile_st.yaml')
+        filename = pkg_resources.resource_filename(__name__, file_path)
+        c = ChemKED(filename, use_snapshot=False)
+        assert len(c.datapoints) == 5
+        c.validate_yaml(c._properties)
+
     def test_skip_validation(self):
         file_path = os.path.join('testfile_bad.yaml')
         filename = pkg_resources.resource_filename(__name__, file_path)
@@ -182,6 +193,347 @@ class TestDataFrameOutput(object):
         assert c.iloc[1]['H2'] == Q_(0.0, 'dimensionless')
         assert c.iloc[1]['O2'] == Q_(0.0, 'dimensionless')
 
+    def test_si_units_dataframe(self, pd):
+        yaml_file = os.path.join('testfile_st.yaml')
+        yaml_filename = pkg_resources.resource_filename(__name__, yaml_file)
+        c = ChemKED(yaml_filename).get_dataframe(si_units=True)
+        for col in ['Temperature [K]', 'Pressure [Pa]', 'Ignition Delay [s]', 'Equivalence Ratio',
+                    'H2', 'O2', 'Ar']:
+            assert c[col].dtype == np.float64
+        np.testing.assert_allclose(c['Temperature [K]'],
+                                   [1164.48, 1164.97, 1264.2, 1332.57, 1519.18])
+        np.testing.assert_allclose(c['Pressure [Pa]'], 220.0e3)
+        np.testing.assert_allclose(c['Ignition Delay [s]'][0], 471.54e-6)
+        np.testing.assert_allclose(c['H2'], 0.00444)
+        for col in ['Composition:Kind', 'Reference:Journal', 'Apparatus:Kind', 'File Authors']:
+            assert str(c[col].dtype) == 'category'
+        assert list(c['Composition:Kind'].cat.categories) == ['mole fraction']
+        assert c['Reference:Year'].dtype == np.int64
+
+    def test_si_units_custom_columns(self, pd):
+        yaml_file = os.path.join('testfile_st.yaml')
+        yaml_filename = pkg_resources.resource_filename(__name__, yaml_file)
+        cols_to_get = ['temperature', 'ignition delay', 'Pressure']
+        c = ChemKED(yaml_filename).get_dataframe(cols_to_get, si_units=True)
+        assert list(c.columns) == ['Temperature [K]', 'Ignition Delay [s]', 'Pressure [Pa]']
+
+    def test_si_units_many_species(self, pd):
+        yaml_file = os.path.join('testfile_many_species.yaml')
+        yaml_filename = pkg_resources.resource_filename(__name__, yaml_file)
+        c = ChemKED(yaml_filename).get_dataframe(si_units=True)
+        assert c.iloc[0]['New-Species-1'] == 0.0
+        assert c.iloc[1]['H2'] == 0.0
+        assert c['New-Species-1'].dtype == np.float64
+
+    @pytest.mark.filterwarnings('ignore:Asymmetric uncertainties')
+    def test_si_units_uncertainty(self, pd):
+        yaml_file = os.path.join('testfile_uncertainty.yaml')
+        yaml_filename = pkg_resources.resource_filename(__name__, yaml_file)
+        c = ChemKED(yaml_filename).get_dataframe(si_units=True)
+        np.testing.assert_allclose(c['Temperature [K]'], 1164.48)
+        np.testing.assert_allclose(c['H2'], 0.444)
+
+
+class TestToArrays(object):
+    """
+    """
+    def load_chemked(self, filename):
+        filename = pkg_resources.resource_filename(__name__, filename)
+        return ChemKED(filename, skip_validation=True)
+
+    def test_fields(self):
+        c = self.load_chemked('testfile_st.yaml')
+        arrays = c.to_arrays()
+        expected = ChemKED.array_fields + [f + '_std' for f in ChemKED.array_fields]
+        assert sorted(arrays.keys()) == sorted(expected)
+        for array in arrays.values():
+            assert array.dtype == np.float64
+            assert array.shape == (5,)
+            assert array.flags['C_CONTIGUOUS']
+
+    def test_si_values(self):
+        c = self.load_chemked('testfile_st.yaml')
+        arrays = c.to_arrays()
+        np.testing.assert_allclose(arrays['temperature'],
+                                   [1164.48, 1164.97, 1264.2, 1332.57, 1519.18])
+        np.testing.assert_allclose(arrays['ignition_delay'],
+                                   [471.54e-6, 448.03e-6, 291.57e-6, 205.93e-6, 88.11e-6])
+        np.testing.assert_allclose(arrays['pressure'], 220.0e3)
+        np.testing.assert_allclose(arrays['equivalence_ratio'], 0.4)
+
+    def test_missing_values(self):
+        c = self.load_chemked('testfile_st.yaml')
+        arrays = c.to_arrays()
+        assert np.all(np.isnan(arrays['pressure_rise']))
+        assert np.all(np.isnan(arrays['compression_time']))
+        assert np.all(np.isnan(arrays['temperature_std']))
+
+    def test_rcm_data(self):
+        c = self.load_chemked('testfile_rcm.yaml')
+        arrays = c.to_arrays()
+        np.testing.assert_allclose(arrays['compression_time'], [38.0e-3])
+        assert np.isnan(arrays['compressed_pressure'][0])
+
+    @pytest.mark.filterwarnings('ignore:Asymmetric uncertainties')
+    def test_uncertainty(self):
+        c = self.load_chemked('testfile_uncertainty.yaml')
+        arrays = c.to_arrays()
+        np.testing.assert_allclose(arrays['temperature'], 1164.48)
+        np.testing.assert_allclose(arrays['temperature_std'][[0, 2, 3]], [10.0, 10.0, 116.448])
+        assert np.isnan(arrays['temperature_std'][1])
+        np.testing.assert_allclose(arrays['ignition_delay_std'][1], 47.154e-6)
+
+    def test_mixed_and_offset_units(self):
+        c = self.load_chemked('testfile_st.yaml')
+        c.datapoints[0].temperature = Q_(25.0, 'degC').plus_minus(2.0)
+        c.datapoints[1].pressure = Q_(1.0, 'atm')
+        arrays = c.to_arrays()
+        np.testing.assert_allclose(arrays['temperature'][:2], [298.15, 1164.97])
+        np.testing.assert_allclose(arrays['temperature_std'][0], 2.0)
+        np.testing.assert_allclose(arrays['pressure'][:2], [220.0e3, 101325.0])
+
+
+class TestChemKEDCollection(object):
+    """
+    """
+    @pytest.fixture
+    def database(self, tmpdir):
+        """Directory tree with two shock tube files, an RCM file, and two invalid files."""
+        for subdir, yaml_file in [('st', 'testfile_st.yaml'), ('st', 'testfile_st2.yaml'),
+                                  ('rcm', 'testfile_rcm.yaml')]:
+            filename = pkg_resources.resource_filename(__name__, yaml_file)
+            with open(filename, 'r') as f:
+                properties = yaml.safe_load(f)
+            # Remove the DOI and ORCIDs so that validation does not need the network
+            properties['reference'].pop('doi')
+            for author in properties['file-authors'] + properties['reference']['authors']:
+                author.pop('ORCID', None)
+            tmpdir.ensure_dir(subdir).join(yaml_file).write(yaml.safe_dump(properties))
+
+        properties['file-version'] = 'one'
+        tmpdir.join('rcm', 'testfile_invalid.yaml').write(yaml.safe_dump(properties))
+        tmpdir.join('testfile_broken.yaml').write('file-authors: [\n')
+        tmpdir.join('notes.txt').write('not a ChemKED file')
+        return tmpdir
+
+    @pytest.mark.parametrize('max_workers', [1, 2])
+    def test_load(self, database, max_workers):
+        c = ChemKEDCollection(str(database), max_workers=max_workers)
+        assert [os.path.relpath(f, str(database)) for f in c.filenames] == [
+            os.path.join('rcm', 'testfile_rcm.yaml'), os.path.join('st', 'testfile_st.yaml'),
+            os.path.join('st', 'testfile_st2.yaml'),
+        ]
+        assert len(c) == 3
+        assert all(isinstance(ck, ChemKED) for ck in c)
+        assert c[1].experiment_type == 'ignition delay'
+        assert c[0].apparatus.kind == 'rapid compression machine'
+
+        assert sorted(os.path.basename(f) for f in c.errors) == [
+            'testfile_broken.yaml', 'testfile_invalid.yaml',
+        ]
+        invalid = c.errors[str(database.join('rcm', 'testfile_invalid.yaml'))]
+        assert isinstance(invalid, ValueError)
+        assert 'file-version' in str(invalid)
+
+    def test_same_errors(self, database):
+        """Files fail with the same error as when they are loaded by ChemKED"""
+        filename = str(database.join('rcm', 'testfile_invalid.yaml'))
+        with pytest.raises(ValueError) as excinfo:
+            ChemKED(filename)
+        c = ChemKEDCollection(str(database), max_workers=2)
+        assert str(c.errors[filename]) == str(excinfo.value)
+
+    def test_history_dtype(self, database):
+        c = ChemKEDCollection(str(database), max_workers=2, history_dtype='float32')
+        assert c[0].datapoints[0].volume_history.time.magnitude.dtype == np.float32
+
+    def test_skip_validation(self, database):
+        c = ChemKEDCollection(str(database), max_workers=1, skip_validation=True)
+        assert len(c) == 4
+        assert list(c.errors) == [str(database.join('testfile_broken.yaml'))]
+
+    def test_pattern(self, database):
+        c = ChemKEDCollection(str(database), pattern='testfile_st*.yaml', max_workers=1)
+        assert [os.path.basename(f) for f in c.filenames] == [
+            'testfile_st.yaml', 'testfile_st2.yaml',
+        ]
+        assert c.errors == {}
+
+    def test_empty(self, tmpdir):
+        c = ChemKEDCollection(str(tmpdir))
+        assert len(c) == 0
+        assert c.datapoints == []
+        assert c.to_arrays()['temperature'].shape == (0,)
+
+    def test_datapoints(self, database):
+        c = ChemKEDCollection(str(database), max_workers=1)
+        assert len(c.datapoints) == 1 + 5 + 1
+        assert all(isinstance(d, DataPoint) for d in c.datapoints)
+        assert c.datapoints[1].temperature == Q_(1164.48, 'K')
+
+    def test_to_arrays(self, database):
+        c = ChemKEDCollection(str(database), max_workers=1)
+        arrays = c.to_arrays()
+        np.testing.assert_array_equal(arrays['file_index'], [0, 1, 1, 1, 1, 1, 2])
+        for field in ChemKED.array_fields:
+            assert arrays[field].shape == (7,)
+            assert arrays[field + '_std'].shape == (7,)
+        np.testing.assert_allclose(arrays['temperature'][1:6],
+                                   [1164.48, 1164.97, 1264.2, 1332.57, 1519.18])
+        assert np.isnan(arrays['compression_time'][1:]).all()
+        assert not np.isnan(arrays['compression_time'][0])
+
+    def test_get_dataframe(self, database):
+        pytest.importorskip('pandas')
+        c = ChemKEDCollection(str(database), max_workers=1)
+        df = c.get_dataframe(['Temperature', 'Composition'], si_units=True)
+        assert len(df) == 7
+        assert list(df.columns[:2]) == ['File', 'Temperature [K]']
+        assert df['Temperature [K]'].dtype == np.float64
+        assert str(df['File'].dtype) == 'category'
+        assert list(df['File']).count(c.filenames[1]) == 5
+        np.testing.assert_allclose(df['Temperature [K]'][1:6],
+                                   [1164.48, 1164.97, 1264.2, 1332.57, 1519.18])
+
+        df = c.get_dataframe(['Temperature'])
+        assert list(df.columns) == ['File', 'Temperature']
+        assert df['Temperature'][1] == Q_(1164.48, 'K')
+
+
+class TestValidationProfiles(object):
+    """
+    """
+    @pytest.fixture
+    def properties(self):
+        filename = pkg_resources.resource_filename(__name__, 'testfile_st.yaml')
+        with open(filename, 'r') as f:
+            return yaml.safe_load(f)
+
+    @pytest.mark.parametrize('engine', ['compiled', 'cerberus'])
+    def test_structural(self, properties, engine):
+        properties['datapoints'][0]['temperature'] = ['1000 meter']
+        c = ChemKED(dict_input=properties, validation='structural', validation_engine=engine)
+        assert len(c.datapoints) == 5
+
+        properties['file-version'] = 'one'
+        with pytest.raises(ValueError, match='must be of integer type'):
+            ChemKED(dict_input=properties, validation='structural', validation_engine=engine)
+
+    @pytest.mark.parametrize('validation', ['structural', 'units'])
+    def test_no_lookups(self, properties, validation, monkeypatch):
+        """The DOI and ORCIDs are not looked up"""
+        from .. import validation as validation_module
+
+        def fail(kind, key):
+            raise AssertionError('{} {} should not be looked up'.format(kind, key))
+
+        monkeypatch.setattr(validation_module, '_search', fail)
+        ChemKED(dict_input=properties, validation=validation)
+
+    def test_unknown_profile(self, properties):
+        with pytest.raises(ValueError, match='validation must be one of'):
+            ChemKED(dict_input=properties, validation='nightly')
+
+    def test_collection(self, properties, tmpdir):
+        properties['datapoints'][0]['temperature'] = ['1000 meter']
+        tmpdir.join('testfile_st.yaml').write(yaml.safe_dump(properties))
+        c = ChemKEDCollection(str(tmpdir), validation='structural', max_workers=1)
+        assert len(c) == 1 and not c.errors
+
+
+class TestValidationReport(object):
+    """
+    """
+    @pytest.mark.parametrize('engine', ['compiled', 'cerberus'])
+    def test_validate_yaml(self, engine):
+        file_path = os.path.join('testfile_st.yaml')
+        filename = pkg_resources.resource_filename(__name__, file_path)
+        c = ChemKED(filename, validation='units', validation_engine=engine)
+        assert c.validation_report is None
+
+        report = c.validate_yaml(c._properties, profile=True)
+        assert engine in report['stages']
+        assert 'prefetch' not in report['stages']
+        assert report['rules']['isvalid_quantity']['calls'] > 0
+        assert c.validate_yaml(c._properties) is None
+
+    def test_profile_validation(self):
+        file_path = os.path.join('testfile_st.yaml')
+        filename = pkg_resources.resource_filename(__name__, file_path)
+        c = ChemKED(filename, validation='structural', profile_validation=True)
+        assert list(c.validation_report['stages']) == ['cerberus']
+        assert c.validation_report['rules'] == {}
+
+    def test_not_in_dataframe(self):
+        pytest.importorskip('pandas')
+        file_path = os.path.join('testfile_st.yaml')
+        filename = pkg_resources.resource_filename(__name__, file_path)
+        c = ChemKED(filename, validation='structural', profile_validation=True)
+        assert 'Validation Report' not in c.get_dataframe().columns
+
+
+class TestValidationCache(object):
+    """
+    """
+    @pytest.fixture
+    def cache(self, tmpdir):
+        from ..cache import MetadataCache
+        from ..validation import set_validation_cache
+        cache = MetadataCache(str(tmpdir.join('validation.sqlite')))
+        set_validation_cache(cache)
+        return cache
+
+    @pytest.fixture
+    def count_validations(self, monkeypatch):
+        calls = []
+        validate_yaml = ChemKED.validate_yaml
+
+        def counted(self, properties, **kwargs):
+            calls.append(properties)
+            return validate_yaml(self, properties, **kwargs)
+
+        monkeypatch.setattr(ChemKED, 'validate_yaml', counted)
+        return calls
+
+    def test_skip_validated(self, cache, count_validations):
+        filename = pkg_resources.resource_filename(__name__, 'testfile_st.yaml')
+        ChemKED(filename, validation='units')
+        c = ChemKED(filename, validation='units')
+        assert len(count_validations) == 1
+        assert len(c.datapoints) == 5
+        assert cache.stats()['hits'] == 1
+
+        # Another profile is validated separately
+        ChemKED(filename, validation='structural')
+        assert len(count_validations) == 2
+
+    def test_invalid_not_stored(self, cache):
+        filename = pkg_resources.resource_filename(__name__, 'testfile_st.yaml')
+        with open(filename, 'r') as f:
+            properties = yaml.safe_load(f)
+        properties['file-version'] = 'one'
+        for i in range(2):
+            with pytest.raises(ValueError):
+                ChemKED(dict_input=properties, validation='units')
+        assert len(cache) == 0
+
+    def test_profile_validated(self, cache, count_validations):
+        """Profiled validations always run"""
+        filename = pkg_resources.resource_filename(__name__, 'testfile_st.yaml')
+        ChemKED(filename, validation='units')
+        c = ChemKED(filename, validation='units', profile_validation=True)
+        assert len(count_validations) == 2
+        assert c.validation_report is not None
+
+    def test_collection(self, cache, tmpdir):
+        filename = pkg_resources.resource_filename(__name__, 'testfile_st.yaml')
+        db = tmpdir.mkdir('db')
+        db.join('testfile_st.yaml').write(open(filename).read())
+        ChemKEDCollection(str(db), validation='units', max_workers=1)
+        assert len(cache) == 1
+        ChemKEDCollection(str(db), validation='units', max_workers=1)
+        assert cache.stats()['hits'] == 1
+
 
 class TestWriteFile(object):
     """
@@ -268,6 +620,40 @@ class TestConvertToReSpecTh(object):
         assert c.reference.doi == c_true.reference.doi
         assert len(c.datapoints) == len(c_true.datapoints)
 
+    def test_conversion_to_respecth_bytes(self):
+        """Test that the ReSpecTh XML is returned as bytes without a filename.
+        """
+        filename = pkg_resources.resource_filename(__name__, 'testfile_rcm.yaml')
+        c = ChemKED(filename)
+        xml = c.convert_to_ReSpecTh()
+        assert isinstance(xml, bytes)
+
+        root = etree.fromstring(xml)
+        datagroups = root.findall('dataGroup')
+        assert len(datagroups) == 2
+        assert len(datagroups[1].findall('dataPoint')) == len(c.datapoints[0].volume_history.time)
+        values = [float(v.text) for v in datagroups[1].find('dataPoint')]
+        assert values == [c.datapoints[0].volume_history.time[0].magnitude,
+                          c.datapoints[0].volume_history.quantity[0].magnitude]
+
+        with TemporaryDirectory() as temp_dir:
+            newfile = os.path.join(temp_dir, 'test.xml')
+            c.convert_to_ReSpecTh(newfile)
+            with open(newfile, 'rb') as f:
+                assert f.read() == xml
+
+    def test_conversion_to_respecth_indented(self):
+        """Test that the ReSpecTh XML is indented by four spaces per level.
+        """
+        filename = pkg_resources.resource_filename(__name__, 'testfile_rcm.yaml')
+        lines = ChemKED(filename).convert_to_ReSpecTh().decode('utf-8').splitlines()
+        assert lines[0] == '<?xml version="1.0" encoding="utf-8"?>'
+        assert lines[1] == '<experiment>'
+        assert lines[-1] == '</experiment>'
+        assert '    <fileAuthor>Kyle E Niemeyer</fileAuthor>' in lines
+        assert '        <dataPoint>' in lines
+        assert all((len(line) - len(line.lstrip(' '))) % 4 == 0 for line in lines)
+
     @pytest.mark.parametrize('history_type, unit',
                              [('volume', 'cm3'), ('temperature', 'K'), ('pressure', 'bar')])
     def test_time_history_conversion_to_respecth(self, history_type, unit):
@@ -1159,3 +1545,306 @@ class TestDataPoint(object):
         assert datapoints[0].ignition_type['target'] == 'temperature'
         for d in datapoints[1:]:
             assert d.ignition_type['target'] == 'pressure'
+
+
+class TestHistoryFiles(object):
+    """
+    """
+    @pytest.fixture
+    def history_dir(self, tmpdir):
+        """A directory with the RCM test file, with two datapoints whose volume histories are in
+        the same CSV file."""
+        from shutil import copy
+        copy(pkg_resources.resource_filename(__name__, 'rcm_history.csv'), str(tmpdir))
+        with open(pkg_resources.resource_filename(__name__, 'testfile_rcm.yaml')) as f:
+            properties = yaml.safe_load(f)
+        properties['datapoints'].append(deepcopy(properties['datapoints'][0]))
+        for point in properties['datapoints']:
+            point['time-histories'][0]['values'] = {'filename': 'rcm_history.csv'}
+        tmpdir.join('testfile_rcm.yaml').write(yaml.safe_dump(properties))
+        return tmpdir
+
+    def load_properties(self, history_dir):
+        """Load the properties of the RCM test file in ``history_dir``, or the original file."""
+        if history_dir is None:
+            filename = pkg_resources.resource_filename(__name__, 'testfile_rcm.yaml')
+        else:
+            filename = str(history_dir.join('testfile_rcm.yaml'))
+        with open(filename) as f:
+            return yaml.safe_load(f)
+
+    def test_read_on_first_use(self, history_dir, monkeypatch):
+        from .. import chemked
+        reads = []
+
+        def read_history_values(filename, array=None, dtype=None):
+            reads.append(filename)
+            return np.loadtxt(filename, delimiter=',', ndmin=2)
+
+        monkeypatch.setattr(chemked, '_read_history_values', read_history_values)
+        c = ChemKED(str(history_dir.join('testfile_rcm.yaml')), skip_validation=True)
+        assert reads == []
+        assert c.datapoints[0].pressure_history is None
+        assert len(c.datapoints[0].volume_history.time) == 97
+        assert len(c.datapoints[0].volume_history.quantity) == 97
+        assert reads == [str(history_dir.join('rcm_history.csv'))]
+
+    def test_shared(self, history_dir):
+        c = ChemKED(str(history_dir.join('testfile_rcm.yaml')), skip_validation=True)
+        first, second = [d.volume_history for d in c.datapoints[:2]]
+        assert np.shares_memory(first.time.magnitude, second.time.magnitude)
+        assert not first.quantity.magnitude.flags.writeable
+        np.testing.assert_array_equal(first.quantity.magnitude, second.quantity.magnitude)
+
+    def test_relative_to_yaml_file(self, history_dir, tmpdir_factory, monkeypatch):
+        monkeypatch.chdir(str(tmpdir_factory.mktemp('cwd')))
+        c = ChemKED(str(history_dir.join('testfile_rcm.yaml')), skip_validation=True)
+        np.testing.assert_allclose(c.datapoints[0].volume_history.time,
+                                   Q_(np.arange(0, 9.7e-2, 1.e-3), 's'))
+
+    def test_collection(self, history_dir, monkeypatch):
+        monkeypatch.chdir(str(history_dir.dirpath()))
+        c = ChemKEDCollection(str(history_dir), max_workers=1, skip_validation=True)
+        assert c.errors == {}
+        assert len(c.datapoints[0].volume_history.time) == 97
+
+    def test_relative_to_working_directory(self, history_dir, monkeypatch):
+        properties = yaml.safe_load(history_dir.join('testfile_rcm.yaml').read())
+        monkeypatch.chdir(str(history_dir))
+        with pytest.warns(DeprecationWarning):
+            d = DataPoint(properties['datapoints'][0], base_dir=str(history_dir.dirpath()))
+        assert len(d.volume_history.time) == 97
+
+    def test_missing_file(self, history_dir):
+        """Missing files are found when the datapoints are created"""
+        history_dir.join('rcm_history.csv').remove()
+        with pytest.raises(FileNotFoundError):
+            ChemKED(str(history_dir.join('testfile_rcm.yaml')), skip_validation=True)
+
+    def test_malformed_file(self, history_dir):
+        """Files that cannot be read raise an error when the time history is first used"""
+        csv_file = history_dir.join('rcm_history.csv')
+        csv_file.write('time,volume\n' + csv_file.read())
+        c = ChemKED(str(history_dir.join('testfile_rcm.yaml')), skip_validation=True)
+        with pytest.raises(ValueError):
+            c.datapoints[0].volume_history
+
+    @pytest.mark.parametrize('fortran_order', [False, True])
+    def test_npy(self, history_dir, fortran_order):
+        values = np.loadtxt(str(history_dir.join('rcm_history.csv')), delimiter=',')
+        np.save(str(history_dir.join('rcm_history.npy')),
+                np.asfortranarray(values) if fortran_order else values)
+        properties = yaml.safe_load(history_dir.join('testfile_rcm.yaml').read())
+        properties['datapoints'][0]['time-histories'][0]['values'] = {
+            'filename': 'rcm_history.npy'}
+        d = DataPoint(properties['datapoints'][0], base_dir=str(history_dir))
+        quantity = d.volume_history.quantity.magnitude
+        assert isinstance(quantity.base, np.memmap)
+        assert quantity.flags.c_contiguous == fortran_order
+        np.testing.assert_array_equal(quantity, values[:, 1])
+        np.testing.assert_array_equal(d.volume_history.time.magnitude, values[:, 0])
+
+    def test_npz(self, history_dir):
+        values = np.loadtxt(str(history_dir.join('rcm_history.csv')), delimiter=',')
+        np.savez(str(history_dir.join('rcm_history.npz')), other=values[:2], volume=values)
+        properties = yaml.safe_load(history_dir.join('testfile_rcm.yaml').read())
+        properties['datapoints'][0]['time-histories'][0]['values'] = {
+            'filename': 'rcm_history.npz', 'array': 'volume'}
+        d = DataPoint(properties['datapoints'][0], base_dir=str(history_dir))
+        np.testing.assert_array_equal(d.volume_history.quantity.magnitude, values[:, 1])
+
+    def test_not_2d(self, history_dir):
+        np.save(str(history_dir.join('rcm_history.npy')), np.arange(10.0))
+        properties = yaml.safe_load(history_dir.join('testfile_rcm.yaml').read())
+        properties['datapoints'][0]['time-histories'][0]['values'] = {
+            'filename': 'rcm_history.npy'}
+        d = DataPoint(properties['datapoints'][0], base_dir=str(history_dir))
+        with pytest.raises(ValueError) as excinfo:
+            d.volume_history
+        assert 'must be a 2-D array, not 1-D' in str(excinfo.value)
+
+    def test_contiguous_columns(self, history_dir):
+        inline = DataPoint(self.load_properties(None)['datapoints'][0])
+        properties = self.load_properties(history_dir)
+        from_file = DataPoint(properties['datapoints'][0], base_dir=str(history_dir))
+        for d in [inline, from_file]:
+            time = d.volume_history.time.magnitude
+            quantity = d.volume_history.quantity.magnitude
+            assert time.flags.c_contiguous and quantity.flags.c_contiguous
+            assert time.base is quantity.base
+            assert time.dtype == np.float64
+
+    @pytest.mark.parametrize('extension', ['.csv', '.npy'])
+    def test_float32(self, history_dir, extension):
+        values = np.loadtxt(str(history_dir.join('rcm_history.csv')), delimiter=',')
+        np.save(str(history_dir.join('rcm_history.npy')), values)
+        properties = self.load_properties(history_dir)
+        properties['datapoints'][0]['time-histories'][0]['values'] = {
+            'filename': 'rcm_history' + extension}
+        d = DataPoint(properties['datapoints'][0], base_dir=str(history_dir),
+                      history_dtype='float32')
+        quantity = d.volume_history.quantity.magnitude
+        assert quantity.dtype == np.float32
+        assert quantity.flags.c_contiguous
+        np.testing.assert_allclose(quantity, values[:, 1], rtol=1e-6)
+
+        c = ChemKED(str(history_dir.join('testfile_rcm.yaml')), skip_validation=True,
+                    history_dtype=np.float32)
+        assert c.datapoints[0].volume_history.time.dtype == np.float32
+
+    def test_float32_inline(self):
+        properties = self.load_properties(None)
+        d = DataPoint(properties['datapoints'][0], history_dtype='float32')
+        assert d.volume_history.quantity.magnitude.dtype == np.float32
+
+    def test_bad_dtype(self):
+        properties = self.load_properties(None)
+        with pytest.raises(ValueError) as excinfo:
+            DataPoint(properties['datapoints'][0], history_dtype='int32')
+        assert 'history_dtype must be a floating point type, not int32' in str(excinfo.value)
+
+    def test_pickle_before_read(self, history_dir):
+        c = ChemKED(str(history_dir.join('testfile_rcm.yaml')), skip_validation=True)
+        d = pickle.loads(pickle.dumps(c.datapoints[0]))
+        np.testing.assert_array_equal(d.volume_history.quantity.magnitude,
+                                      c.datapoints[0].volume_history.quantity.magnitude)
+
+
+class TestHistoryUncertainty(object):
+    """
+    """
+    def load_history(self, uncertainty, values=None):
+        """Return the properties of the RCM test datapoint, with the uncertainty of its history."""
+        filename = pkg_resources.resource_filename(__name__, 'testfile_rcm.yaml')
+        with open(filename) as f:
+            properties = yaml.safe_load(f)['datapoints'][0]
+        history = properties['time-histories'][0]
+        history['uncertainty'] = uncertainty
+        if values is not None:
+            history['values'] = values
+        return properties
+
+    def test_none(self):
+        d = DataPoint(self.load_history(None))
+        assert d.volume_history.uncertainty is None
+
+    def test_absolute_value(self):
+        d = DataPoint(self.load_history({'type': 'absolute', 'value': '10 mm**3'}))
+        uncertainty = d.volume_history.uncertainty
+        assert uncertainty.units == d.volume_history.quantity.units
+        assert uncertainty.shape == d.volume_history.quantity.shape
+        np.testing.assert_allclose(uncertainty.magnitude, 0.01)
+        # A single value is broadcast rather than copied for each point
+        assert uncertainty.magnitude.strides == (0,)
+
+    def test_pickle_absolute_value(self):
+        d = DataPoint(self.load_history({'type': 'absolute', 'value': '10 mm**3'}))
+        e = pickle.loads(pickle.dumps(d))
+        uncertainty = e.volume_history.uncertainty
+        assert uncertainty.magnitude.strides == (0,)
+        np.testing.assert_array_equal(uncertainty.magnitude,
+                                      d.volume_history.uncertainty.magnitude)
+
+    def test_relative_value(self):
+        d = DataPoint(self.load_history({'type': 'relative', 'value': '0.05'}))
+        np.testing.assert_allclose(d.volume_history.uncertainty.magnitude,
+                                   0.05 * d.volume_history.quantity.magnitude)
+
+    def test_absolute_column(self):
+        values = [[0.0, 500.0, 2.0], [0.001, 400.0, 3.0]]
+        d = DataPoint(self.load_history({'type': 'absolute', 'column': 2, 'units': 'cm**3'},
+                                        values))
+        history = d.volume_history
+        np.testing.assert_allclose(history.uncertainty.magnitude, [2.0, 3.0])
+        assert np.shares_memory(history.uncertainty.magnitude, history.quantity.magnitude.base)
+
+    def test_absolute_column_converted(self):
+        values = [[0.0, 500.0, 2.0], [0.001, 400.0, 3.0]]
+        d = DataPoint(self.load_history({'type': 'absolute', 'column': 2, 'units': 'mm**3'},
+                                        values))
+        np.testing.assert_allclose(d.volume_history.uncertainty.magnitude, [2e-3, 3e-3])
+
+    def test_offset_units(self):
+        """Only the scale of the conversion applies to the uncertainty"""
+        properties = self.load_history({'type': 'absolute', 'column': 2, 'units': 'delta_degC'},
+                                       [[0.0, 500.0, 2.0], [0.001, 400.0, 3.0]])
+        history = properties['time-histories'][0]
+        history['type'] = 'temperature'
+        history['quantity']['units'] = 'K'
+        d = DataPoint(properties)
+        np.testing.assert_allclose(d.temperature_history.uncertainty.magnitude, [2.0, 3.0])
+
+    def test_relative_column(self):
+        values = [[0.0, 500.0, 0.01], [0.001, 400.0, 0.02]]
+        d = DataPoint(self.load_history(
+            {'type': 'relative', 'column': 2, 'units': 'dimensionless'}, values))
+        np.testing.assert_allclose(d.volume_history.uncertainty.magnitude, [5.0, 8.0])
+
+    def test_float32(self):
+        d = DataPoint(self.load_history({'type': 'relative', 'value': '0.05'}),
+                      history_dtype='float32')
+        assert d.volume_history.uncertainty.magnitude.dtype == np.float32
+
+    def test_pickle(self):
+        d = DataPoint(self.load_history({'type': 'absolute', 'value': '10 mm**3'}))
+        e = pickle.loads(pickle.dumps(d))
+        np.testing.assert_allclose(e.volume_history.uncertainty.magnitude,
+                                   d.volume_history.uncertainty.magnitude)
+        assert e.volume_history.uncertainty.units == d.volume_history.uncertainty.units
+
+
+def _compressed_volume(c):
+    """Used by TestPickle in a worker process."""
+    history = c.datapoints[0].volume_history
+    return c, (history.quantity[-1] + Q_(1.0, 'cm**3')).to('cm3').magnitude
+
+
+class TestPickle(object):
+    """
+    """
+    def load(self, name):
+        filename = pkg_resources.resource_filename(__name__, name)
+        return ChemKED(filename, skip_validation=True)
+
+    def test_datapoint(self):
+        from ..validation import units
+        c = self.load('testfile_rcm.yaml')
+        d = pickle.loads(pickle.dumps(c.datapoints[0]))
+        assert d.volume_history.quantity.units == units.cm3
+        assert d.volume_history.quantity._REGISTRY is units
+        np.testing.assert_array_equal(d.volume_history.time.magnitude,
+                                      c.datapoints[0].volume_history.time.magnitude)
+        assert d.rcm_data == c.datapoints[0].rcm_data
+        assert d.composition == c.datapoints[0].composition
+        assert isinstance(d.volume_history, type(c.datapoints[0].volume_history))
+
+    def test_uncertainty(self):
+        from ..validation import units
+        c = self.load('testfile_uncertainty.yaml')
+        for p in c.datapoints:
+            q = pickle.loads(pickle.dumps(p))
+            for attr in ['temperature', 'pressure', 'ignition_delay']:
+                value, loaded = getattr(p, attr), getattr(q, attr)
+                assert isinstance(loaded, type(value))
+                if isinstance(value, units.Measurement):
+                    assert loaded.value == value.value
+                    assert loaded.error == value.error
+                else:
+                    assert loaded == value
+
+    def test_chemked(self):
+        c = self.load('testfile_st.yaml')
+        d = pickle.loads(pickle.dumps(c))
+        assert d._properties == c._properties
+        assert d.reference == c.reference
+        assert d.get_dataframe().equals(c.get_dataframe())
+
+    def test_process_pool(self):
+        from concurrent.futures import ProcessPoolExecutor
+        c = self.load('testfile_rcm.yaml')
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            d, volume = executor.submit(_compressed_volume, c).result()
+        expected = c.datapoints[0].volume_history.quantity[-1] + Q_(1.0, 'cm3')
+        assert volume == expected.magnitude
+        assert d.datapoints[0].volume_history.quantity[-1] + Q_(1.0, 'cm3') == expected
+        assert d.get_dataframe().equals(c.get_dataframe())
@@ -0,0 +1,148 @@
+"""
+Test module for compiled.py
+"""
+# Standard libraries
+import os
+import warnings
+from copy import deepcopy
+
+import pkg_resources
+import pytest
+
+# Local imports
+from ..validation import schema, OurValidator, load_yaml
+from ..compiled import CompiledValidator
+from ..chemked import ChemKED
+from . import test_validation
+
+
+class DifferentialValidator(object):
+    """Validator that checks that the compiled engine agrees with Cerberus.
+
+    The compiled engine gives the warnings, and the errors of both engines are compared.
+    """
+    def __init__(self, schema):
+        self.schema = schema
+        self.compiled = None
+
+    @property
+    def errors(self):
+        return self.compiled.errors
+
+    @property
+    def document_error_tree(self):
+        return self.compiled.document_error_tree
+
+    def validate(self, document, update=False):
+        compiled = self.compiled = CompiledValidator(self.schema)
+        valid = compiled.validate(deepcopy(document), update=update)
+
+        reference = OurValidator(self.schema)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            reference_valid = reference.validate(deepcopy(document), update=update)
+
+        assert valid == reference_valid
+        assert _errors(compiled) == _errors(reference)
+        return valid
+
+
+def _errors(validator):
+    """Return the errors of a validator, or the type of the exception raised by Cerberus when it
+    cannot format them."""
+    try:
+        return validator.errors
+    except (NotImplementedError, TypeError) as e:
+        # Cerberus 1.0 raises NotImplemented, which is a TypeError
+        return type(e)
+
+
+class TestCompiledValidatorCorpus(test_validation.TestValidator):
+    """Run the validation tests with the compiled engine, comparing its results with Cerberus.
+    """
+    @pytest.fixture(autouse=True)
+    def differential_validator(self, monkeypatch):
+        monkeypatch.setattr(test_validation, 'v', DifferentialValidator(schema))
+
+
+class TestCompiledValidator(object):
+    """
+    """
+    @pytest.fixture(scope='function')
+    def properties(self, request):
+        filename = pkg_resources.resource_filename(__name__, request.param)
+        with open(filename, 'r') as f:
+            properties = load_yaml(f)
+
+        # Remove the DOI and ORCIDs so the tests do not need the web APIs
+        properties['reference'].pop('doi', None)
+        for author in properties['file-authors'] + properties['reference']['authors']:
+            author.pop('ORCID', None)
+        return properties
+
+    def test_schema_is_compiled(self):
+        assert CompiledValidator(schema).is_compiled
+
+    @pytest.mark.parametrize('properties', [
+        f for f in sorted(os.listdir(os.path.dirname(__file__)))
+        if f.startswith('testfile_') and f.endswith('.yaml')
+    ], indirect=['properties'])
+    def test_test_files(self, properties):
+        """The engines agree on the validity and errors of each test file"""
+        DifferentialValidator(schema).validate(properties)
+
+    @pytest.mark.parametrize('properties', ['testfile_st.yaml'], indirect=['properties'])
+    def test_valid_document_skips_cerberus(self, properties, monkeypatch):
+        """Valid documents are not validated by Cerberus"""
+        def fail(*args, **kwargs):
+            raise AssertionError('Cerberus should not be used')
+
+        monkeypatch.setattr(OurValidator, 'validate', fail)
+        assert CompiledValidator(schema).validate(properties)
+
+    @pytest.mark.parametrize('properties', ['testfile_st.yaml'], indirect=['properties'])
+    def test_errors_reset(self, properties):
+        """The errors of a previous validation are discarded"""
+        validator = CompiledValidator(schema)
+        bad = deepcopy(properties)
+        bad['file-version'] = 'one'
+        assert not validator.validate(bad)
+        assert validator.errors == {'file-version': ['must be of integer type']}
+        assert validator.validate(properties)
+        assert validator.errors == {}
+
+    def test_update(self):
+        """Required fields are not checked when updating"""
+        validator = CompiledValidator(schema)
+        assert validator.validate({'experiment-type': 'ignition delay'}, update=True)
+        assert not validator.validate({'experiment-type': 'ignition delay'})
+        assert validator.errors['datapoints'] == ['required field']
+
+    def test_unknown_field(self):
+        validator = CompiledValidator(schema)
+        assert not validator.validate({'not-a-field': 1}, update=True)
+        assert validator.errors == {'not-a-field': ['unknown field']}
+
+    def test_uncompilable_schema(self):
+        """Schemas with rules that are not compiled are validated by Cerberus"""
+        validator = CompiledValidator({'value': {'type': 'integer', 'coerce': int}})
+        assert not validator.is_compiled
+        assert validator.validate({'value': '1'})
+
+    def test_compiled_once(self):
+        """Validators for the same schema share the compiled checks"""
+        assert CompiledValidator(schema)._check is CompiledValidator(schema)._check
+
+    @pytest.mark.parametrize('properties', ['testfile_st.yaml'], indirect=['properties'])
+    @pytest.mark.parametrize('engine', ['compiled', 'cerberus'])
+    def test_chemked_engines(self, properties, engine):
+        """ChemKED raises the same errors with either validation engine"""
+        ChemKED(dict_input=properties, validation_engine=engine)
+        properties['file-version'] = 'one'
+        with pytest.raises(ValueError) as excinfo:
+            ChemKED(dict_input=properties, validation_engine=engine)
+        assert 'must be of integer type' in str(excinfo.value)
+
+    def test_chemked_unknown_engine(self):
+        with pytest.raises(ValueError, match='validation_engine'):
+            ChemKED(dict_input={}, validation_engine='fast')
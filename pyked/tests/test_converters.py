@@ -10,6 +10,7 @@ import socket
 from tempfile import TemporaryDirectory
 import xml.etree.ElementTree as etree
 from shutil import copy
+from copy import deepcopy
 
 import pytest
 import numpy.random
@@ -22,10 +23,12 @@ from ..converters import (ParseError, KeywordError, MissingElementError,
                           )
 from ..converters import (get_file_metadata, get_reference, get_experiment_kind,
                           get_common_properties, get_ignition_type, get_datapoints,
-                          ReSpecTh_to_ChemKED, main, respth2ck, ck2respth
+                          ReSpecTh_to_ChemKED, main, respth2ck, ck2respth,
+                          histories_to_sidecars, ck_sidecars, _parse_ReSpecTh
                           )
 from .._version import __version__
 from ..chemked import ChemKED
+from .. import crossref
 
 
 class TestErrors(object):
@@ -347,6 +350,38 @@ class TestGetReference(object):
                 } in ref['authors']
         assert {'name': 'Chih-Jen Sung'} in ref['authors']
 
+    def test_reference_cached(self, fake_crossref):
+        """Ensure the DOI lookup is cached and shared with validation.
+        """
+        from .test_validation import CROSSREF_REFERENCE
+        doi = '10.1016/j.ijhydene.2007.04.008'
+        fake_crossref.responses['/works/' + doi] = (200, {'message': CROSSREF_REFERENCE})
+        root = etree.Element('experiment')
+        ref = etree.SubElement(root, 'bibliographyLink')
+        ref.set('doi', doi)
+
+        for _ in range(2):
+            ref = get_reference(root)
+            assert ref['journal'] == 'International Journal of Hydrogen Energy'
+            assert ref['year'] == 2007
+            assert ref['volume'] == 32
+        assert crossref.search_doi(doi) == CROSSREF_REFERENCE
+        assert len(fake_crossref.requests) == 1
+
+    def test_reference_not_found_cached(self, fake_crossref):
+        """Ensure a DOI that is not found is cached and falls back on the preferredKey.
+        """
+        root = etree.Element('experiment')
+        ref = etree.SubElement(root, 'bibliographyLink')
+        ref.set('doi', '10.1000/missing')
+        ref.set('preferredKey', 'Chaumeix et al., IJHE, 2007')
+
+        for _ in range(2):
+            with pytest.warns(UserWarning):
+                ref = get_reference(root)
+            assert ref['detail'] == 'Chaumeix et al., IJHE, 2007.'
+        assert len(fake_crossref.requests) == 1
+
 
 class TestGetExperiment(object):
     """
@@ -1395,6 +1430,77 @@ class TestConvertReSpecTh(object):
         assert c.file_authors[1]['name'] == file_author
         assert c.file_authors[1].get('ORCID', None) is None
 
+    @pytest.mark.filterwarnings('ignore:Using DOI')
+    def test_streaming_matches_tree(self):
+        """Test that the streamed time histories match the ones parsed from the whole tree.
+        """
+        filename = pkg_resources.resource_filename(__name__, 'testfile_rcm.xml')
+        properties = ReSpecTh_to_ChemKED(filename, validate=False)
+        expected = get_datapoints(etree.parse(filename).getroot())
+        assert properties['datapoints'][0]['time-histories'] == expected[0]['time-histories']
+        assert len(expected[0]['time-histories'][0]['values']) > 0
+
+    def test_long_history(self, tmpdir):
+        """Test that long time histories are collected and removed from the tree.
+        """
+        root = etree.Element('experiment')
+        datagroup = etree.SubElement(root, 'dataGroup')
+        prop = etree.SubElement(datagroup, 'property')
+        prop.set('id', 'x1')
+        prop.set('name', 'temperature')
+        prop.set('units', 'K')
+        datapoint = etree.SubElement(datagroup, 'dataPoint')
+        etree.SubElement(datapoint, 'x1').text = '1000.0'
+
+        datagroup = etree.SubElement(root, 'dataGroup')
+        for tag, name, units in [('x2', 'time', 's'), ('x3', 'pressure', 'bar'),
+                                 ('x4', 'temperature', 'K')]:
+            prop = etree.SubElement(datagroup, 'property')
+            prop.set('id', tag)
+            prop.set('name', name)
+            prop.set('units', units)
+        times = numpy.linspace(0.0, 0.1, 3000)
+        for time in times:
+            datapoint = etree.SubElement(datagroup, 'dataPoint')
+            etree.SubElement(datapoint, 'x2').text = repr(float(time))
+            etree.SubElement(datapoint, 'x3').text = repr(float(time * 2.0))
+            etree.SubElement(datapoint, 'x4').text = repr(float(time * 3.0))
+        filename = str(tmpdir.join('long.xml'))
+        etree.ElementTree(root).write(filename)
+
+        parsed_root, time_histories = _parse_ReSpecTh(filename)
+        assert len(parsed_root.findall('dataGroup')) == 1
+        assert [t['type'] for t in time_histories] == ['pressure', 'temperature']
+        assert time_histories[1]['values'] == [[t, t * 3.0] for t in times]
+
+        parsed_root, time_histories = _parse_ReSpecTh(filename, str(tmpdir.join('long')))
+        values = numpy.load(str(tmpdir.join('long_history_1.npy')))
+        assert values.flags.f_contiguous
+        assert_allclose(values, numpy.column_stack([times, times * 2.0, times * 3.0]))
+        assert [(t['quantity']['column'], t['values']) for t in time_histories] == [
+            (1, {'filename': 'long_history_1.npy'}), (2, {'filename': 'long_history_1.npy'})]
+
+    @pytest.mark.filterwarnings('ignore:Using DOI')
+    def test_sidecars(self, tmpdir):
+        """Test writing the time history values of a ReSpecTh file to a sidecar file.
+        """
+        from ..validation import dump_yaml
+        filename = pkg_resources.resource_filename(__name__, 'testfile_rcm.xml')
+        expected = ChemKED(dict_input=ReSpecTh_to_ChemKED(filename), skip_validation=True)
+
+        properties = ReSpecTh_to_ChemKED(filename, sidecar_prefix=str(tmpdir.join('rcm')))
+        assert properties['datapoints'][0]['time-histories'][0]['values'] == {
+            'filename': 'rcm_history_1.npy'}
+        yaml_file = str(tmpdir.join('rcm.yaml'))
+        with open(yaml_file, 'w') as f:
+            dump_yaml(properties, f)
+        c = ChemKED(yaml_file, skip_validation=True)
+        history = c.datapoints[0].volume_history
+        assert_allclose(history.time.magnitude,
+                        expected.datapoints[0].volume_history.time.magnitude)
+        assert_allclose(history.quantity.magnitude,
+                        expected.datapoints[0].volume_history.quantity.magnitude)
+
 
 class TestConverterMain(object):
     """
@@ -1476,6 +1582,28 @@ class TestConverterMain(object):
         m = str(record.pop(UserWarning).message)
         assert m == 'Using DOI to obtain reference information, rather than preferredKey.'
 
+    @pytest.mark.filterwarnings('ignore:Using DOI')
+    def test_conversion_respth2ck_sidecars(self, fake_crossref):
+        """Test respth2ck converter writes the time histories to sidecar files with --sidecars.
+        """
+        fake_crossref.responses['/works/10.1002/kin.20180'] = (200, {'message': {
+            'container-title': ['International Journal of Chemical Kinetics'],
+            'published-print': {'date-parts': [[2006]]},
+            'volume': '38',
+            'page': '516-529',
+            'author': [{'given': 'G.', 'family': 'Mittal'}, {'given': 'C. J.', 'family': 'Sung'},
+                       {'given': 'R. A.', 'family': 'Yetter'}],
+        }})
+        filename = pkg_resources.resource_filename(__name__, 'testfile_rcm.xml')
+
+        with TemporaryDirectory() as temp_dir:
+            newfile = os.path.join(temp_dir, 'test.yaml')
+            respth2ck(['-i', filename, '-o', newfile, '--sidecars'])
+
+            assert os.path.exists(os.path.join(temp_dir, 'test_history_1.npy'))
+            c = ChemKED(newfile, skip_validation=True)
+            assert len(c.datapoints[0].volume_history.time) > 0
+
     def test_conversion_ck2respth(self):
         """Test ck2respth converter when used via command-line arguments.
         """
@@ -1488,6 +1616,22 @@ class TestConverterMain(object):
 
             assert os.path.exists(newfile)
 
+    def test_conversion_ck2respth_profile(self, capsys):
+        """Test ck2respth converter prints the validation timings with --profile.
+        """
+        file_path = os.path.join('testfile_st.yaml')
+        filename = pkg_resources.resource_filename(__name__, file_path)
+
+        with TemporaryDirectory() as temp_dir:
+            newfile = os.path.join(temp_dir, 'test.xml')
+            ck2respth(['-i', filename, '-o', newfile, '--profile'])
+
+            assert os.path.exists(newfile)
+
+        out = capsys.readouterr().out
+        assert out.splitlines()[0].split() == ['stage/rule', 'calls', 'time', '(ms)']
+        assert 'isvalid_quantity' in out
+
     def test_conversion_invalid_xml_xml(self):
         """Test converter main raises errors when two xml files are passed.
         """
@@ -1517,3 +1661,73 @@ class TestConverterMain(object):
         with pytest.raises(KeywordError) as excinfo:
             main(['-i', filename, '-o', 'test.py'])
         assert 'Input/output args need to be .xml/.yaml' in str(excinfo.value)
+
+    def test_refresh_cache(self, fake_crossref):
+        """Test that the converter main looks up the DOIs again with --refresh-cache, and caches
+        the new results.
+        """
+        from requests.exceptions import HTTPError
+        doi = '10.1000/cached'
+        cache = crossref.get_reference_cache()
+        cache.set(doi, {'status': 404})
+        fake_crossref.responses['/works/' + doi] = (200, {'message': {'title': ['Found']}})
+        file_path = os.path.join('testfile_st.xml')
+        filename = pkg_resources.resource_filename(__name__, file_path)
+
+        with pytest.raises(KeywordError):
+            main(['-i', filename, '-o', 'test.xml'])
+        with pytest.raises(HTTPError):
+            crossref.search_doi(doi)
+
+        with pytest.raises(KeywordError):
+            main(['-i', filename, '-o', 'test.xml', '--refresh-cache'])
+        assert crossref.search_doi(doi) == {'title': ['Found']}
+        assert cache.get(doi) == {'status': 200, 'message': {'title': ['Found']}}
+
+
+class TestHistoriesToSidecars(object):
+    """
+    """
+    @pytest.fixture
+    def yaml_file(self, tmpdir):
+        """The RCM test file with a second datapoint, whose volume history is in a CSV file."""
+        from ..validation import load_yaml, dump_yaml
+        copy(pkg_resources.resource_filename(__name__, 'rcm_history.csv'), str(tmpdir))
+        with open(pkg_resources.resource_filename(__name__, 'testfile_rcm.yaml')) as f:
+            properties = load_yaml(f)
+        properties['datapoints'].append(deepcopy(properties['datapoints'][0]))
+        properties['datapoints'][1]['time-histories'][0]['values'] = {
+            'filename': 'rcm_history.csv'}
+        filename = str(tmpdir.join('testfile_rcm.yaml'))
+        with open(filename, 'w') as f:
+            dump_yaml(properties, f)
+        return filename
+
+    def test_rewrite(self, yaml_file, tmpdir):
+        original = ChemKED(yaml_file, skip_validation=True)
+        output = str(tmpdir.mkdir('out').join('rcm.yaml'))
+        sidecars = histories_to_sidecars(yaml_file, output)
+        assert [os.path.basename(f) for f in sidecars] == [
+            'rcm_{}_volume.npy'.format(i) for i in range(len(original.datapoints))]
+
+        c = ChemKED(output, validation='units')
+        for d, o in zip(c.datapoints, original.datapoints):
+            quantity = d.volume_history.quantity.magnitude
+            assert isinstance(quantity.base, numpy.memmap)
+            assert quantity.flags.f_contiguous
+            assert_allclose(quantity, o.volume_history.quantity.magnitude)
+            assert_allclose(d.volume_history.time.magnitude, o.volume_history.time.magnitude)
+
+    def test_in_place(self, yaml_file, tmpdir, capsys):
+        ck_sidecars(['-i', yaml_file])
+        assert 'Wrote 2 sidecar files' in capsys.readouterr().out
+        ck_sidecars(['-i', yaml_file])
+        assert 'Wrote 0 sidecar files' in capsys.readouterr().out
+        c = ChemKED(yaml_file, skip_validation=True)
+        assert len(c.datapoints[1].volume_history.time) == 97
+
+    def test_min_rows(self, yaml_file, tmpdir):
+        output = str(tmpdir.mkdir('out').join('rcm.yaml'))
+        assert histories_to_sidecars(yaml_file, output, min_rows=1000) == []
+        c = ChemKED(output, skip_validation=True)
+        assert len(c.datapoints[1].volume_history.time) == 97
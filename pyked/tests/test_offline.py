@@ -0,0 +1,206 @@
+"""
+Tests for offline validation
+"""
+
+# Standard libraries
+import os
+import json
+import socket
+import pkg_resources
+import warnings
+
+import pytest
+import yaml
+from requests.exceptions import HTTPError
+
+# Local imports
+from .. import offline
+from ..offline import MetadataBundle, MissingMetadataError, set_offline_bundle, export_bundle
+from ..chemked import ChemKED
+from ..crossref import search_doi
+from ..orcid import search_orcid
+from ..converters import get_reference
+from .test_validation import CROSSREF_REFERENCE
+
+DOI = '10.1016/j.ijhydene.2007.04.008'
+ORCID = '0000-0003-4425-7097'
+PERSON = {'name': {'given-names': {'value': 'Kyle E'}, 'family-name': {'value': 'Niemeyer'}}}
+
+
+@pytest.fixture
+def bundle():
+    return MetadataBundle(dois={DOI: CROSSREF_REFERENCE, '10.1000/missing': None},
+                          orcids={ORCID: PERSON, '0000-0000-0000-0000': None})
+
+
+@pytest.fixture
+def no_socket(monkeypatch):
+    """Fail the test if a socket is opened."""
+    def guard(*args, **kwargs):
+        raise AssertionError('a socket was opened in offline mode')
+    monkeypatch.setattr(socket, 'socket', guard)
+
+
+class TestMetadataBundle(object):
+    """
+    """
+    def test_search(self, bundle):
+        assert bundle.search_doi(DOI) == CROSSREF_REFERENCE
+        assert bundle.search_doi(DOI.upper()) == CROSSREF_REFERENCE
+        assert bundle.search_orcid(ORCID) == PERSON
+        assert len(bundle) == 4
+
+    def test_not_found(self, bundle):
+        with pytest.raises(HTTPError) as excinfo:
+            bundle.search_doi('10.1000/missing')
+        assert excinfo.value.response.status_code == 404
+        with pytest.raises(HTTPError):
+            bundle.search_orcid('0000-0000-0000-0000')
+
+    def test_missing(self, bundle):
+        with pytest.raises(MissingMetadataError):
+            bundle.search_doi('10.1000/other')
+        with pytest.raises(MissingMetadataError):
+            bundle.search_orcid('0000-0000-0000-0001')
+
+    def test_save_load(self, bundle, tmpdir):
+        filename = str(tmpdir.join('bundle.json'))
+        bundle.save(filename)
+        loaded = MetadataBundle.load(filename)
+        assert loaded.dois == bundle.dois
+        assert loaded.orcids == bundle.orcids
+
+    def test_load_invalid(self, tmpdir):
+        filename = tmpdir.join('bundle.json')
+        filename.write(json.dumps({'doi': {}}))
+        with pytest.raises(ValueError):
+            MetadataBundle.load(str(filename))
+
+
+class TestOfflineMode(object):
+    """
+    """
+    def test_search_functions(self, bundle, no_socket):
+        set_offline_bundle(bundle)
+        assert search_doi(DOI) == CROSSREF_REFERENCE
+        assert search_orcid(ORCID) == PERSON
+        with pytest.raises(MissingMetadataError):
+            search_doi('10.1000/other')
+
+    def test_environment_variable(self, bundle, tmpdir, monkeypatch):
+        filename = str(tmpdir.join('bundle.json'))
+        bundle.save(filename)
+        monkeypatch.setenv('PYKED_OFFLINE_BUNDLE', filename)
+        monkeypatch.setattr(offline, '_bundle_loaded', False)
+        assert offline.get_offline_bundle().orcids == bundle.orcids
+
+        set_offline_bundle(None)
+        assert offline.get_offline_bundle() is None
+
+    def test_set_filename(self, bundle, tmpdir):
+        filename = str(tmpdir.join('bundle.json'))
+        bundle.save(filename)
+        set_offline_bundle(filename)
+        assert offline.get_offline_bundle().dois == bundle.dois
+
+    def test_validation(self, bundle, no_socket):
+        """Ensure a file is fully validated in offline mode, without opening any sockets."""
+        set_offline_bundle(bundle)
+        filename = pkg_resources.resource_filename(__name__, 'testfile_st.yaml')
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            c = ChemKED(filename)
+        assert c.reference.doi == DOI
+
+    def test_validation_errors(self, bundle, no_socket):
+        bundle.add_doi(DOI, dict(CROSSREF_REFERENCE, volume='33'))
+        bundle.add_orcid(ORCID, None)
+        set_offline_bundle(bundle)
+        filename = pkg_resources.resource_filename(__name__, 'testfile_st.yaml')
+        with pytest.raises(ValueError) as excinfo:
+            ChemKED(filename)
+        assert 'volume should be 33' in str(excinfo.value)
+        assert 'ORCID incorrect or invalid for Kyle E Niemeyer' in str(excinfo.value)
+
+    def test_validation_missing(self, no_socket):
+        set_offline_bundle(MetadataBundle())
+        filename = pkg_resources.resource_filename(__name__, 'testfile_st.yaml')
+        with pytest.warns(UserWarning) as record:
+            ChemKED(filename)
+        messages = [str(w.message) for w in record]
+        assert 'DOI not in the offline metadata bundle, DOI not validated.' in messages
+        assert 'ORCID not in the offline metadata bundle, ORCID not validated.' in messages
+
+    def test_get_reference(self, bundle, no_socket):
+        import xml.etree.ElementTree as etree
+        set_offline_bundle(bundle)
+        root = etree.Element('experiment')
+        etree.SubElement(root, 'bibliographyLink').set('doi', DOI)
+        assert get_reference(root)['journal'] == 'International Journal of Hydrogen Energy'
+
+        root = etree.Element('experiment')
+        link = etree.SubElement(root, 'bibliographyLink')
+        link.set('doi', '10.1000/other')
+        link.set('preferredKey', 'Some reference')
+        with pytest.warns(UserWarning):
+            assert get_reference(root)['detail'] == 'Some reference.'
+
+
+class TestExportBundle(object):
+    """
+    """
+    @pytest.fixture
+    def database(self, tmpdir):
+        filename = pkg_resources.resource_filename(__name__, 'testfile_st.yaml')
+        with open(filename, 'r') as f:
+            properties = yaml.safe_load(f)
+        tmpdir.ensure_dir('db').join('st.yaml').write(yaml.safe_dump(properties))
+        properties['reference']['doi'] = '10.1000/missing'
+        properties['file-authors'].append({'name': 'Nobody', 'ORCID': '0000-0000-0000-0000'})
+        tmpdir.join('other.yaml').write(yaml.safe_dump(properties))
+        return tmpdir
+
+    @pytest.fixture
+    def fake_orcid(self, web_api):
+        from ..orcid import OrcidClient, set_orcid_client
+        set_orcid_client(OrcidClient(base_url=web_api.url, retries=0))
+        web_api.responses['/{}/person'.format(ORCID)] = (200, PERSON)
+        return web_api
+
+    def test_export(self, database, fake_crossref, fake_orcid, capsys):
+        fake_crossref.responses['/works/' + DOI] = (200, {'message': CROSSREF_REFERENCE})
+        output = str(database.join('bundle.json'))
+        export_bundle(['-o', output, str(database.join('db')), str(database.join('other.yaml'))])
+        assert 'Exported 2 DOIs and 2 ORCIDs from 2 files' in capsys.readouterr().out
+
+        bundle = MetadataBundle.load(output)
+        assert bundle.search_doi(DOI) == CROSSREF_REFERENCE
+        assert bundle.search_orcid(ORCID) == PERSON
+        assert bundle.dois['10.1000/missing'] is None
+        assert bundle.orcids['0000-0000-0000-0000'] is None
+
+    def test_export_ignores_offline_mode(self, database, fake_crossref, fake_orcid):
+        fake_crossref.responses['/works/' + DOI] = (200, {'message': CROSSREF_REFERENCE})
+        set_offline_bundle(MetadataBundle())
+        output = str(database.join('bundle.json'))
+        export_bundle(['-o', output, str(database.join('db'))])
+        assert MetadataBundle.load(output).search_doi(DOI) == CROSSREF_REFERENCE
+
+    def test_update(self, database, fake_crossref, fake_orcid):
+        output = str(database.join('bundle.json'))
+        MetadataBundle(dois={'10.1000/old': CROSSREF_REFERENCE}).save(output)
+        export_bundle(['-o', output, '--update', str(database.join('db'))])
+        bundle = MetadataBundle.load(output)
+        assert sorted(bundle.dois) == ['10.1000/old', DOI]
+
+        export_bundle(['-o', output, str(database.join('db'))])
+        assert '10.1000/old' not in MetadataBundle.load(output).dois
+
+    def test_lookup_errors_skipped(self, database, fake_crossref, fake_orcid):
+        fake_crossref.responses['/works/' + DOI] = (500, None)
+        output = str(database.join('bundle.json'))
+        with pytest.warns(UserWarning) as record:
+            export_bundle(['-o', output, str(database.join('db'))])
+        assert 'could not be looked up' in str(record[0].message)
+        assert MetadataBundle.load(output).dois == {}
+        assert os.path.exists(output)
@@ -0,0 +1,164 @@
+"""
+Tests for the ORCID client
+"""
+
+# Standard libraries
+from requests.exceptions import HTTPError, ConnectionError, Timeout
+
+import pytest
+
+# Local imports
+from .. import orcid
+from ..orcid import OrcidClient, search_orcid
+from ..cache import MetadataCache
+from ..validation import OurValidator, schema
+
+ORCID = '0000-0003-4425-7097'
+PERSON = {'name': {'given-names': {'value': 'Kyle E'}, 'family-name': {'value': 'Niemeyer'}}}
+"""Response of the ORCID API for the person associated with ``ORCID``"""
+
+
+class TestOrcidClient(object):
+    """
+    """
+    @pytest.fixture
+    def client(self, web_api, tmpdir):
+        return OrcidClient(base_url=web_api.url, timeout=(1, 1), backoff_factor=0,
+                           cache=MetadataCache(str(tmpdir.join('orcid.sqlite'))))
+
+    def test_search(self, client, web_api):
+        web_api.responses['/{}/person'.format(ORCID)] = (200, PERSON)
+        assert client.search(ORCID) == PERSON
+        assert client.search(ORCID) == PERSON
+        assert web_api.requests == ['/{}/person'.format(ORCID)]
+
+    def test_session_reused(self, client, web_api):
+        web_api.responses['/{}/person'.format(ORCID)] = (200, PERSON)
+        session = client.session
+        client.search(ORCID)
+        assert client.session is session
+        assert session.headers['Accept'] == 'application/json'
+
+    def test_persistent_cache(self, client, web_api):
+        web_api.responses['/{}/person'.format(ORCID)] = (200, PERSON)
+        client.search(ORCID)
+        new_client = OrcidClient(base_url=web_api.url, cache=client.cache)
+        assert new_client.search(ORCID) == PERSON
+        assert len(web_api.requests) == 1
+
+    def test_memory_cache_eviction(self, web_api):
+        client = OrcidClient(base_url=web_api.url, memory_cache_size=1)
+        for orcid_id in ['0000-0000-0000-0001', '0000-0000-0000-0002']:
+            web_api.responses['/{}/person'.format(orcid_id)] = (200, PERSON)
+            client.search(orcid_id)
+        client.search('0000-0000-0000-0002')
+        assert len(web_api.requests) == 2
+        client.search('0000-0000-0000-0001')
+        assert len(web_api.requests) == 3
+
+    def test_not_found_cached(self, client, web_api):
+        for _ in range(2):
+            with pytest.raises(HTTPError) as excinfo:
+                client.search(ORCID)
+            assert excinfo.value.response.status_code == 404
+        assert len(web_api.requests) == 1
+
+    def test_clear_cache(self, client, web_api):
+        web_api.responses['/{}/person'.format(ORCID)] = (200, PERSON)
+        client.search(ORCID)
+        client.clear_cache()
+        assert len(client.cache) == 0
+        client.search(ORCID)
+        assert len(web_api.requests) == 2
+
+    def test_refresh_cache(self, client, web_api):
+        client.cache.set(ORCID, {'status': 404})
+        web_api.responses['/{}/person'.format(ORCID)] = (200, PERSON)
+        client.refresh_cache()
+        for _ in range(2):
+            assert client.search(ORCID) == PERSON
+        assert client.cache.get(ORCID) == {'status': 200, 'person': PERSON}
+        assert len(web_api.requests) == 1
+
+    def test_retry(self, client, web_api):
+        web_api.responses['/{}/person'.format(ORCID)] = [(503, None), (502, None), (200, PERSON)]
+        assert client.search(ORCID) == PERSON
+        assert len(web_api.requests) == 3
+
+    def test_retries_exhausted(self, web_api):
+        client = OrcidClient(base_url=web_api.url, retries=1, backoff_factor=0)
+        web_api.responses['/{}/person'.format(ORCID)] = (503, None)
+        with pytest.raises(HTTPError) as excinfo:
+            client.search(ORCID)
+        assert excinfo.value.response.status_code == 503
+        assert len(web_api.requests) == 2
+        # Server errors are not cached
+        with pytest.raises(HTTPError):
+            client.search(ORCID)
+        assert len(web_api.requests) == 4
+
+    def test_read_timeout(self, web_api):
+        client = OrcidClient(base_url=web_api.url, timeout=(1, 0.1), retries=0)
+        web_api.responses['/{}/person'.format(ORCID)] = (200, PERSON)
+        web_api.delay = 0.5
+        # Requests reports read timeouts as a ConnectionError when retries are configured
+        with pytest.raises((Timeout, ConnectionError)):
+            client.search(ORCID)
+
+    def test_connection_error(self):
+        client = OrcidClient(base_url='http://127.0.0.1:1', retries=0)
+        with pytest.raises(ConnectionError):
+            client.search(ORCID)
+
+    def test_search_orcid_uses_client(self, client, web_api):
+        orcid.set_orcid_client(client)
+        web_api.responses['/{}/person'.format(ORCID)] = (200, PERSON)
+        assert search_orcid(ORCID) == PERSON
+        assert orcid.get_orcid_client() is client
+
+    def test_disk_cache_opt_in(self, tmpdir, monkeypatch):
+        """Nothing is written to the cache directory unless the cache is enabled"""
+        monkeypatch.setattr(orcid, '_orcid_client', None)
+        monkeypatch.setattr(orcid, '_use_default_cache', True)
+        monkeypatch.setenv('PYKED_CACHE_DIR', str(tmpdir))
+        monkeypatch.delenv('PYKED_ORCID_CACHE', raising=False)
+        assert orcid.get_orcid_client().cache is None
+
+        monkeypatch.setenv('PYKED_ORCID_CACHE', '1')
+        assert orcid.get_orcid_client().cache.filename == str(tmpdir.join('orcid.sqlite'))
+
+    def test_enable_cache(self, client, tmpdir, monkeypatch):
+        monkeypatch.setattr(orcid, '_orcid_client', None)
+        monkeypatch.setattr(orcid, '_use_default_cache', True)
+        monkeypatch.setenv('PYKED_CACHE_DIR', str(tmpdir.mkdir('cache')))
+        cache = orcid.enable_orcid_cache()
+        assert orcid.get_orcid_client().cache is cache
+        assert cache.filename == str(tmpdir.join('cache', 'orcid.sqlite'))
+
+        # The cache of a client that was set is not replaced
+        orcid.set_orcid_client(OrcidClient())
+        assert orcid.enable_orcid_cache() is None
+        orcid.set_orcid_client(client)
+        assert orcid.enable_orcid_cache() is client.cache
+
+    def test_validator(self, client, web_api):
+        orcid.set_orcid_client(client)
+        web_api.responses['/{}/person'.format(ORCID)] = (200, PERSON)
+        v = OurValidator(schema)
+        for _ in range(2):
+            assert v.validate({'file-authors': [{'name': 'Kyle E Niemeyer', 'ORCID': ORCID}]},
+                              update=True)
+        assert not v.validate({'file-authors': [{'name': 'Bryan W Weber', 'ORCID': ORCID}]},
+                              update=True)
+        assert len(web_api.requests) == 1
+
+    def test_validator_timeout(self, web_api):
+        orcid.set_orcid_client(OrcidClient(base_url=web_api.url, timeout=(1, 0.1), retries=0))
+        web_api.responses['/{}/person'.format(ORCID)] = (200, PERSON)
+        web_api.delay = 0.5
+        v = OurValidator(schema)
+        with pytest.warns(UserWarning) as record:
+            v.validate({'file-authors': [{'name': 'Kyle E Niemeyer', 'ORCID': ORCID}]},
+                       update=True)
+        m = str(record.pop(UserWarning).message)
+        assert m == 'network not available, ORCID not validated.'
@@ -0,0 +1,181 @@
+"""
+Tests for the snapshots of ChemKED objects
+"""
+
+# Standard libraries
+import os
+import pickle
+import pkg_resources
+from shutil import copy
+
+import numpy as np
+import pytest
+
+# Local imports
+from .. import snapshot
+from ..cache import FileCache
+from ..chemked import ChemKED, DataPoint
+from ..snapshot import dumps, loads
+from ..validation import units, Q_
+
+
+@pytest.fixture
+def cache(tmpdir):
+    cache = FileCache(str(tmpdir.join('snapshots')))
+    snapshot.set_snapshot_cache(cache)
+    return cache
+
+
+@pytest.fixture
+def yaml_file(tmpdir):
+    filename = pkg_resources.resource_filename(__name__, 'testfile_st.yaml')
+    return copy(filename, str(tmpdir))
+
+
+class TestSerialization(object):
+    """
+    """
+    def test_quantity(self):
+        quantity = loads(dumps(Q_(1.5, 'cm3')))
+        assert quantity == Q_(1.5, 'cm3')
+        assert quantity._REGISTRY is units
+        assert quantity + Q_(1.0, 'cm**3') == Q_(2.5, 'cm3')
+
+    def test_array(self):
+        quantity = loads(dumps(Q_(np.arange(5.0), 'kPa')))
+        np.testing.assert_array_equal(quantity.magnitude, np.arange(5.0))
+        assert quantity.units == units.kPa
+
+    def test_broadcast_array(self):
+        magnitude = np.broadcast_to(np.float32(0.5), (10000,))
+        data = dumps(Q_(magnitude, 'kPa'))
+        assert len(data) < 1000
+        quantity = loads(data)
+        assert quantity.magnitude.strides == (0,)
+        assert quantity.magnitude.dtype == np.float32
+        np.testing.assert_array_equal(quantity.magnitude, magnitude)
+
+    def test_measurement(self):
+        measurement = loads(dumps(Q_(1000.0, 'K').plus_minus(10.0)))
+        assert isinstance(measurement, units.Measurement)
+        assert measurement.value == Q_(1000.0, 'K')
+        assert measurement.error == Q_(10.0, 'K')
+
+    def test_nested(self):
+        obj = {'a': [Q_(1.0, 'atm'), (Q_(2, 'us'), 'text')], 'b': np.ones(3)}
+        loaded = loads(dumps(obj))
+        assert loaded['a'][0] == Q_(1.0, 'atm')
+        assert loaded['a'][1] == (Q_(2, 'us'), 'text')
+        np.testing.assert_array_equal(loaded['b'], np.ones(3))
+
+    def test_encode_quantities(self):
+        from ..chemked import TimeHistory
+        history = TimeHistory(time=Q_(np.arange(3.0), 's'), quantity=Q_(np.ones(3), 'cm3'),
+                              type='volume')
+        obj = {'a': [Q_(1.0, 'K').plus_minus(2.0), (1, 'text')], 'history': history}
+        encoded = snapshot.encode_quantities(obj)
+        assert not isinstance(encoded['history'].time, units.Quantity)
+
+        decoded = snapshot.decode_quantities(pickle.loads(pickle.dumps(encoded)))
+        assert decoded['a'][0].error == Q_(2.0, 'K')
+        assert decoded['a'][1] == (1, 'text')
+        assert isinstance(decoded['history'], TimeHistory)
+        assert decoded['history'].quantity._REGISTRY is units
+        np.testing.assert_array_equal(decoded['history'].time.magnitude, np.arange(3.0))
+
+    def test_unknown_persistent_id(self):
+        with pytest.raises(pickle.UnpicklingError):
+            snapshot.QuantityUnpickler.persistent_load(None, ('other',))
+
+
+class TestSnapshots(object):
+    """
+    """
+    def test_round_trip(self, cache, yaml_file):
+        c = ChemKED(yaml_file, validation='units', use_snapshot=True)
+        assert len(cache) == 1
+        d = ChemKED(yaml_file, validation='units', use_snapshot=True)
+        assert cache.stats()['hits'] == 1
+
+        assert d.reference == c.reference
+        assert d.apparatus == c.apparatus
+        assert d.file_authors == c.file_authors
+        assert d._properties == c._properties
+        for p, q in zip(c.datapoints, d.datapoints):
+            assert q.temperature == p.temperature
+            assert q.ignition_delay == p.ignition_delay
+            assert q.composition == p.composition
+        assert d.get_dataframe().equals(c.get_dataframe())
+
+    def test_not_rebuilt(self, cache, yaml_file, monkeypatch):
+        ChemKED(yaml_file, validation='units', use_snapshot=True)
+
+        def fail(self, properties):
+            raise AssertionError('the datapoints should not be built')
+
+        monkeypatch.setattr(DataPoint, '__init__', fail)
+        c = ChemKED(yaml_file, validation='units', use_snapshot=True)
+        assert len(c.datapoints) == 5
+
+    def test_changed_file(self, cache, yaml_file):
+        ChemKED(yaml_file, validation='units', use_snapshot=True)
+        with open(yaml_file, 'a') as f:
+            f.write('\n# a comment\n')
+        ChemKED(yaml_file, validation='units', use_snapshot=True)
+        assert cache.stats()['hits'] == 0
+        assert len(cache) == 2
+
+    def test_options(self, cache, yaml_file):
+        """Snapshots are not shared between validation profiles"""
+        ChemKED(yaml_file, validation='units', use_snapshot=True)
+        ChemKED(yaml_file, validation='structural', use_snapshot=True)
+        ChemKED(yaml_file, skip_validation=True, use_snapshot=True)
+        assert cache.stats()['hits'] == 0
+        assert len(cache) == 3
+
+    def test_not_used(self, cache, yaml_file):
+        ChemKED(yaml_file, validation='units')
+        ChemKED(yaml_file, validation='units', use_snapshot=True, profile_validation=True)
+        assert len(cache) == 0
+
+    def test_damaged(self, cache, yaml_file, tmpdir):
+        ChemKED(yaml_file, validation='units', use_snapshot=True)
+        for f in tmpdir.join('snapshots').listdir():
+            f.write(b'damaged', mode='wb')
+        c = ChemKED(yaml_file, validation='units', use_snapshot=True)
+        assert len(c.datapoints) == 5
+
+    def test_history_file(self, cache, tmpdir):
+        """Snapshots are not used after a file of time history values changes"""
+        import yaml
+        csv_file = copy(pkg_resources.resource_filename(__name__, 'rcm_history.csv'),
+                        str(tmpdir))
+        with open(pkg_resources.resource_filename(__name__, 'testfile_rcm.yaml')) as f:
+            properties = yaml.safe_load(f)
+        properties['datapoints'][0]['time-histories'][0]['values'] = {'filename': csv_file}
+        yaml_file = str(tmpdir.join('testfile_rcm.yaml'))
+        with open(yaml_file, 'w') as f:
+            yaml.safe_dump(properties, f)
+
+        c = ChemKED(yaml_file, validation='units', use_snapshot=True)
+        ChemKED(yaml_file, validation='units', use_snapshot=True)
+        assert cache.stats()['hits'] == 1
+        n_times = len(c.datapoints[0].volume_history.time)
+
+        with open(csv_file) as f:
+            lines = f.readlines()
+        with open(csv_file, 'w') as f:
+            f.writelines(lines[:-1])
+        os.utime(csv_file, (0, 0))
+        d = ChemKED(yaml_file, validation='units', use_snapshot=True)
+        assert len(d.datapoints[0].volume_history.time) == n_times - 1
+
+    def test_validate_after_hit(self, cache, yaml_file):
+        ChemKED(yaml_file, validation='units', use_snapshot=True)
+        c = ChemKED(yaml_file, validation='units', use_snapshot=True)
+        assert cache.stats()['hits'] == 1
+        c.validate_yaml(c._properties)
+
+    def test_disabled(self, yaml_file):
+        c = ChemKED(yaml_file, validation='units', use_snapshot=True)
+        assert len(c.datapoints) == 5
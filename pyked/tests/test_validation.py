@@ -7,11 +7,19 @@ import os
 import pkg_resources
 from requests.exceptions import ConnectionError
 import socket
+import subprocess
+import sys
+import time
+from copy import deepcopy
+from itertools import chain
 
+import pint
 import pytest
 import yaml
 
-from ..validation import schema, OurValidator, compare_name, property_units
+from ..validation import (schema, OurValidator, compare_name, property_units, load_schema,
+                          parse_quantity, Q_)
+from .. import validation, crossref, orcid
 from .._version import __version__
 
 
@@ -483,6 +491,51 @@ class TestValidator(object):
         time_history['values'] = [[0, 1, 2], [1, 2, 3]]
         assert not v.validate({'datapoints': [{'time-histories': [time_history]}]}, update=True)
 
+    @pytest.mark.parametrize('values', [{'filename': 'history.csv'},
+                                        {'filename': 'history.npy'},
+                                        {'filename': 'history.npz', 'array': 'pressure'}])
+    def test_time_history_file(self, values):
+        """Test that time histories with values in other files are valid
+        """
+        time_history = {'type': 'pressure', 'quantity': {'units': 'bar', 'column': 1}}
+        time_history['time'] = {'units': 'second', 'column': 0}
+        time_history['values'] = values
+        assert v.validate({'datapoints': [{'time-histories': [time_history]}]}, update=True)
+
+    @pytest.mark.parametrize('uncertainty', [
+        {'type': 'absolute', 'value': '0.1 bar'},
+        {'type': 'relative', 'value': '0.01'},
+        {'type': 'absolute', 'column': 2, 'units': 'kPa'},
+        {'type': 'relative', 'column': 2, 'units': 'dimensionless'},
+        ])
+    def test_time_history_uncertainty(self, uncertainty):
+        """Test that a time history with uncertainty is valid
+        """
+        time_history = {'type': 'pressure', 'quantity': {'units': 'bar', 'column': 1}}
+        time_history['time'] = {'units': 'second', 'column': 0}
+        time_history['uncertainty'] = uncertainty
+        time_history['values'] = ([[0, 1, 0.1], [1, 2, 0.1]] if 'column' in uncertainty
+                                  else [[0, 1], [1, 2]])
+        assert v.validate({'datapoints': [{'time-histories': [time_history]}]}, update=True)
+
+    @pytest.mark.parametrize('uncertainty', [
+        {'type': 'absolute', 'value': '0.1 K'},
+        {'type': 'relative', 'value': '0.01 bar'},
+        {'type': 'absolute', 'column': 2, 'units': 'dimensionless'},
+        ])
+    def test_time_history_uncertainty_bad_units(self, uncertainty):
+        """Test that the units of the uncertainty of a time history are checked
+        """
+        time_history = {'type': 'pressure', 'quantity': {'units': 'bar', 'column': 1}}
+        time_history['time'] = {'units': 'second', 'column': 0}
+        time_history['uncertainty'] = uncertainty
+        time_history['values'] = ([[0, 1, 0.1], [1, 2, 0.1]] if 'column' in uncertainty
+                                  else [[0, 1], [1, 2]])
+        assert not v.validate({'datapoints': [{'time-histories': [time_history]}]}, update=True)
+        # Cerberus 1.1 cannot format errors from inside the datapoints oneof, so read the tree
+        errors = v.document_error_tree.fetch_errors_from(('datapoints', 0, 'time-histories', 0))
+        assert 'incompatible units of the uncertainty' in str(errors)
+
     def test_invalid_experiment_type(self):
         """Ensure that an invalid experiment type is an error
         """
@@ -848,3 +901,697 @@ class TestValidator(object):
         thermo['T_ranges'] = [200.0, '1000 K', 5000.0]
         properties['datapoints'][0]['composition']['species'][0]['thermo'] = thermo
         assert not v.validate(properties)
+
+
+class TestLoadSchema(object):
+    """
+    """
+    @pytest.fixture(scope='function')
+    def cache_dir(self, tmpdir, monkeypatch):
+        monkeypatch.setenv('PYKED_CACHE_DIR', str(tmpdir))
+        return tmpdir
+
+    def test_cached_schema_matches(self, cache_dir):
+        """Ensure the cached schema is identical to the parsed schema.
+        """
+        assert load_schema() == load_schema(use_cache=False)
+        assert len(cache_dir.listdir()) == 1
+        assert load_schema() == load_schema(use_cache=False)
+
+    def test_cache_used(self, cache_dir, monkeypatch):
+        """Ensure the schema files are not parsed again when the cache is present.
+        """
+        load_schema()
+
+        def guard(schema_text):
+            raise AssertionError('schema was parsed')
+
+        monkeypatch.setattr(validation, '_parse_schema', guard)
+        assert 'datapoints' in load_schema()
+
+    def test_no_cache(self, cache_dir):
+        """Ensure the cache can be bypassed.
+        """
+        load_schema(use_cache=False)
+        assert len(cache_dir.listdir()) == 0
+
+    def test_cache_rebuilt(self, cache_dir, monkeypatch):
+        """Ensure the cache is rebuilt when the schema files change.
+        """
+        load_schema()
+        schema_text = validation._read_schema_files()
+        schema_text = schema_text.replace('- shock tube\n', '- shock tube\n        - flame\n', 1)
+        monkeypatch.setattr(validation, '_read_schema_files', lambda: schema_text)
+        new_schema = load_schema()
+        assert 'flame' in new_schema['apparatus']['schema']['kind']['allowed']
+        assert len(cache_dir.listdir()) == 2
+
+    def test_cache_python_version(self, cache_dir, monkeypatch):
+        """Ensure the schema is cached separately for each Python version.
+        """
+        load_schema()
+        monkeypatch.setattr(validation.sys, 'version_info', (2, 7, 0))
+        load_schema()
+        assert len(cache_dir.listdir()) == 2
+
+    def test_unreadable_cache(self, cache_dir):
+        """Ensure a cache file written with an unsupported pickle protocol is rebuilt.
+        """
+        load_schema()
+        cache_file = cache_dir.listdir()[0]
+        cache_file.write_binary(b'\x80\xff')
+        assert load_schema() == load_schema(use_cache=False)
+
+    def test_unwritable_cache(self, tmpdir, monkeypatch):
+        """Ensure an unwritable cache directory does not prevent loading the schema.
+        """
+        cache_file = tmpdir.join('not-a-directory')
+        cache_file.write('')
+        monkeypatch.setenv('PYKED_CACHE_DIR', str(cache_file))
+        assert load_schema() == load_schema(use_cache=False)
+
+
+class TestLazyImports(object):
+    """
+    """
+    network_modules = ['habanero', 'requests']
+
+    def run_python(self, *args):
+        env = dict(os.environ)
+        package_dir = os.path.dirname(os.path.dirname(os.path.dirname(validation.__file__)))
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [package_dir, env.get('PYTHONPATH')]))
+        return subprocess.run([sys.executable] + list(args), env=env, check=True,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              universal_newlines=True)
+
+    def test_network_modules_not_imported(self):
+        """Ensure that importing PyKED does not import the network stack.
+        """
+        res = self.run_python(
+            '-c', 'import sys, pyked.chemked, pyked.converters; print(" ".join(sys.modules))'
+        )
+        imported = res.stdout.split()
+        assert 'pyked.chemked' in imported
+        for module in self.network_modules:
+            assert module not in imported
+
+    @pytest.mark.skipif(sys.version_info < (3, 7), reason='-X importtime requires Python 3.7')
+    def test_import_time(self):
+        """Measure the import time of PyKED and check the network stack is not part of it.
+        """
+        res = self.run_python('-X', 'importtime', '-c', 'import pyked.chemked')
+        cumulative = {}
+        for line in res.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumul, name = line.split('|')
+            name = name.strip()
+            cumulative[name] = int(cumul)
+
+        assert 'pyked.chemked' in cumulative
+        for module in self.network_modules:
+            assert module not in cumulative, 'pyked.chemked took {} us to import'.format(
+                cumulative['pyked.chemked'])
+
+    def test_crossref_api_created_on_demand(self, monkeypatch):
+        """Ensure the Crossref API instance is created once, when first requested.
+        """
+        monkeypatch.setattr(crossref, '_crossref_api', None)
+        api = validation.get_crossref_api()
+        assert validation.get_crossref_api() is api
+
+    def test_deprecated_crossref_api(self, monkeypatch):
+        """Ensure the deprecated crossref_api attribute reads and replaces the API instance.
+        """
+        monkeypatch.setattr(crossref, '_crossref_api', None)
+        with pytest.warns(DeprecationWarning):
+            api = validation.crossref_api
+        assert api is validation.get_crossref_api()
+
+        replacement = object()
+        with pytest.warns(DeprecationWarning):
+            validation.crossref_api = replacement
+        assert validation.get_crossref_api() is replacement
+
+
+CROSSREF_REFERENCE = {
+    'container-title': ['International Journal of Hydrogen Energy'],
+    'published-print': {'date-parts': [[2007, 9]]},
+    'volume': '32',
+    'page': '2216-2226',
+    'author': [{'given': 'N.', 'family': 'Chaumeix'}, {'given': 'S.', 'family': 'Pichon'},
+               {'given': 'F.', 'family': 'Lafosse'}, {'given': 'C.-E.', 'family': 'Paillard'}],
+}
+"""Crossref metadata of the reference in ``testfile_st.yaml``"""
+
+
+class TestCrossrefCache(object):
+    """
+    """
+    doi = '10.1016/j.ijhydene.2007.04.008'
+    reference = {
+        'doi': doi,
+        'authors': [{'name': 'N. Chaumeix'}, {'name': 'S. Pichon'}, {'name': 'F. Lafosse'},
+                    {'name': 'C.-E. Paillard'}],
+        'journal': 'International Journal of Hydrogen Energy',
+        'year': 2007,
+        'volume': 32,
+        'pages': '2216-2226',
+    }
+
+    def test_search_doi_cached(self, fake_crossref):
+        fake_crossref.responses['/works/' + self.doi] = (200, {'message': CROSSREF_REFERENCE})
+        assert crossref.search_doi(self.doi) == CROSSREF_REFERENCE
+        assert crossref.search_doi(self.doi) == CROSSREF_REFERENCE
+        assert crossref.search_doi(self.doi.upper()) == CROSSREF_REFERENCE
+        assert fake_crossref.requests == ['/works/' + self.doi]
+
+    def test_not_found_cached(self, fake_crossref):
+        from requests.exceptions import HTTPError
+        for _ in range(2):
+            with pytest.raises(HTTPError) as excinfo:
+                crossref.search_doi('10.1000/missing')
+            assert excinfo.value.response.status_code == 404
+        assert fake_crossref.requests == ['/works/10.1000/missing']
+
+    def test_server_error_not_cached(self, fake_crossref):
+        from requests.exceptions import HTTPError
+        import habanero
+        fake_crossref.responses['/works/10.1000/error'] = (500, None)
+        for _ in range(2):
+            with pytest.raises((HTTPError, habanero.RequestError)):
+                crossref.search_doi('10.1000/error')
+        assert len(fake_crossref.requests) == 2
+
+    def test_no_cache(self, fake_crossref):
+        crossref.set_reference_cache(None)
+        fake_crossref.responses['/works/' + self.doi] = (200, {'message': CROSSREF_REFERENCE})
+        crossref.search_doi(self.doi)
+        crossref.search_doi(self.doi)
+        assert len(fake_crossref.requests) == 2
+
+    def test_opt_in(self, fake_crossref, tmpdir, monkeypatch):
+        """Nothing is written to the cache directory unless the cache is enabled"""
+        monkeypatch.setattr(crossref, '_reference_cache', None)
+        monkeypatch.setattr(crossref, '_use_default_cache', True)
+        monkeypatch.setenv('PYKED_CACHE_DIR', str(tmpdir.mkdir('cache')))
+        monkeypatch.delenv('PYKED_REFERENCE_CACHE', raising=False)
+        fake_crossref.responses['/works/' + self.doi] = (200, {'message': CROSSREF_REFERENCE})
+        crossref.search_doi(self.doi)
+        assert crossref.get_reference_cache() is None
+        assert tmpdir.join('cache').listdir() == []
+
+        monkeypatch.setenv('PYKED_REFERENCE_CACHE', '1')
+        crossref.search_doi(self.doi)
+        assert tmpdir.join('cache', 'crossref.sqlite').check()
+
+    def test_enable(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(crossref, '_use_default_cache', True)
+        monkeypatch.setenv('PYKED_CACHE_DIR', str(tmpdir))
+        cache = crossref.enable_reference_cache()
+        assert crossref.get_reference_cache() is cache
+        assert cache.filename == str(tmpdir.join('crossref.sqlite'))
+
+        # A cache that was set is not replaced
+        crossref.set_reference_cache(None)
+        assert crossref.enable_reference_cache() is None
+
+    def test_refresh(self, fake_crossref):
+        cache = crossref.get_reference_cache()
+        cache.set(self.doi, {'status': 404})
+        fake_crossref.responses['/works/' + self.doi] = (200, {'message': CROSSREF_REFERENCE})
+        crossref.enable_reference_cache(refresh=True)
+        for _ in range(2):
+            assert crossref.search_doi(self.doi) == CROSSREF_REFERENCE
+        assert cache.get(self.doi) == {'status': 200, 'message': CROSSREF_REFERENCE}
+        assert len(fake_crossref.requests) == 1
+
+    def test_validator_uses_cache(self, fake_crossref):
+        fake_crossref.responses['/works/' + self.doi] = (200, {'message': CROSSREF_REFERENCE})
+        for _ in range(2):
+            assert v.validate({'reference': self.reference}, update=True)
+        assert len(fake_crossref.requests) == 1
+
+        reference = dict(self.reference, year=2008)
+        v.validate({'reference': reference}, update=True)
+        assert 'year should be 2007' in v.errors['reference']
+        assert len(fake_crossref.requests) == 1
+
+    def test_validator_not_found_cached(self, fake_crossref):
+        reference = dict(self.reference, doi='10.1000/missing')
+        for _ in range(2):
+            v.validate({'reference': reference}, update=True)
+            assert v.errors['reference'] == ['DOI not found']
+        assert len(fake_crossref.requests) == 1
+
+
+class TestPrefetchMetadata(object):
+    """
+    """
+    orcids = ['0000-0000-0000-000{}'.format(i) for i in range(5)]
+
+    @pytest.fixture
+    def fake_orcid(self, web_api):
+        orcid.set_orcid_client(orcid.OrcidClient(base_url=web_api.url, retries=0))
+        for i, orcid_id in enumerate(self.orcids):
+            person = {'name': {'given-names': {'value': 'Author'},
+                               'family-name': {'value': str(i)}}}
+            web_api.responses['/{}/person'.format(orcid_id)] = (200, person)
+        return web_api
+
+    @pytest.fixture
+    def properties(self):
+        authors = [{'name': 'Author {}'.format(i), 'ORCID': o} for i, o in enumerate(self.orcids)]
+        reference = dict(TestCrossrefCache.reference, doi='10.1000/a')
+        return {'file-authors': authors[:2], 'reference': reference}
+
+    def test_lookups(self, fake_crossref, fake_orcid, properties):
+        fake_crossref.responses['/works/10.1000/a'] = (200, {'message': CROSSREF_REFERENCE})
+        properties['reference']['authors'] = properties['file-authors'] + [{'name': 'X'}]
+        prefetched = validation.prefetch_metadata(properties)
+        assert set(prefetched) == {('doi', '10.1000/a'), ('orcid', self.orcids[0]),
+                                   ('orcid', self.orcids[1])}
+        assert prefetched[('doi', '10.1000/a')] == CROSSREF_REFERENCE
+        assert prefetched[('orcid', self.orcids[1])]['name']['family-name']['value'] == '1'
+        assert len(fake_crossref.requests) == 3
+
+    def test_batch(self, fake_crossref, fake_orcid, properties):
+        other = {'file-authors': [{'name': 'Author 4', 'ORCID': self.orcids[4]}],
+                 'reference': {'doi': '10.1000/b', 'authors': []}}
+        prefetched = validation.prefetch_metadata([properties, other, properties])
+        assert len(prefetched) == 5
+        assert len(fake_crossref.requests) == 5
+
+    def test_exclude(self, fake_crossref, fake_orcid, properties):
+        prefetched = validation.prefetch_metadata(properties)
+        n_requests = len(fake_crossref.requests)
+        assert validation.prefetch_metadata(properties, exclude=prefetched) == {}
+        assert len(fake_crossref.requests) == n_requests
+
+        properties['file-authors'].append({'name': 'Author 3', 'ORCID': self.orcids[3]})
+        new = validation.prefetch_metadata(properties, exclude=prefetched)
+        assert list(new) == [('orcid', self.orcids[3])]
+        assert len(fake_crossref.requests) == n_requests + 1
+
+    def test_empty(self):
+        assert validation.prefetch_metadata({}) == {}
+        assert validation.prefetch_metadata({'file-authors': 'bad', 'reference': []}) == {}
+
+    def test_errors(self, fake_crossref, fake_orcid, properties):
+        from requests.exceptions import HTTPError
+        properties['file-authors'].append({'name': 'Nobody', 'ORCID': '0000-0000-0000-0009'})
+        prefetched = validation.prefetch_metadata(properties)
+        assert isinstance(prefetched[('doi', '10.1000/a')], HTTPError)
+        assert isinstance(prefetched[('orcid', '0000-0000-0000-0009')], HTTPError)
+
+        n_requests = len(fake_crossref.requests)
+        validator = OurValidator(schema, prefetched=prefetched)
+        validator.validate(properties, update=True)
+        assert validator.errors['reference'] == ['DOI not found']
+        assert validator.errors['file-authors'] == [
+            {2: ['ORCID incorrect or invalid for Nobody']}]
+        assert len(fake_crossref.requests) == n_requests
+
+    def test_validator_uses_prefetched(self, fake_crossref, fake_orcid, properties):
+        fake_crossref.responses['/works/10.1000/a'] = (200, {'message': CROSSREF_REFERENCE})
+        prefetched = validation.prefetch_metadata(properties)
+        n_requests = len(fake_crossref.requests)
+        validator = OurValidator(schema, prefetched=prefetched)
+        assert validator.validate(properties, update=True)
+        assert len(fake_crossref.requests) == n_requests
+
+        # Lookups that were not prefetched are made by the rules
+        properties['file-authors'].append({'name': 'Author 3', 'ORCID': self.orcids[3]})
+        assert validator.validate(properties, update=True)
+        assert len(fake_crossref.requests) == n_requests + 1
+
+    def test_concurrent(self, fake_crossref, fake_orcid, properties):
+        """Ensure the lookups are made at the same time, not one after another."""
+        fake_crossref.responses['/works/10.1000/a'] = (200, {'message': CROSSREF_REFERENCE})
+        properties['reference']['authors'] = [{'name': 'Author {}'.format(i), 'ORCID': o}
+                                              for i, o in enumerate(self.orcids)]
+        fake_crossref.delay = 0.5
+        start = time.monotonic()
+        prefetched = validation.prefetch_metadata(properties)
+        elapsed = time.monotonic() - start
+        assert len(prefetched) == 6
+        assert not any(isinstance(r, Exception) for r in prefetched.values())
+        assert elapsed < 6 * 0.5 / 2
+
+
+class TestParseQuantity(object):
+    """
+    """
+    @pytest.mark.parametrize('value', [
+        '220 kPa', '1.0 atm', '471.54 us', '1e3 K', '1.0E-3 s', '-5 K', '.5 s', '5. K',
+        ' 3 K ', '0.5', '1.0 cm3', '2 cm**3', '1.0 kPa/ms', '1.0 m/s**2', '2 K ms', '10 1/s',
+        '1.0 / second', 0.5, 4,
+    ])
+    def test_matches_pint(self, value):
+        """Ensure the fast path gives the same quantity as the pint parser.
+        """
+        quantity = parse_quantity(value)
+        expected = Q_(value)
+        assert repr(quantity) == repr(expected)
+        assert type(quantity.magnitude) == type(expected.magnitude)
+
+    def test_units_cached(self):
+        """Ensure units are only parsed once per unit string.
+        """
+        parse_quantity('1.0 mbar')
+        hits = validation.parse_units.cache_info().hits
+        parse_quantity('2.0 mbar')
+        assert validation.parse_units.cache_info().hits == hits + 1
+
+    def test_new_quantity_returned(self):
+        """Ensure cached parses do not share a mutable quantity.
+        """
+        quantity = parse_quantity('1.0 atm')
+        quantity.ito('kPa')
+        assert parse_quantity('1.0 atm') == Q_(1.0, 'atm')
+        assert str(parse_quantity('1.0 atm').units) == 'atmosphere'
+
+    def test_undefined_units(self):
+        """Ensure undefined units raise the pint error.
+        """
+        with pytest.raises(pint.UndefinedUnitError):
+            parse_quantity('1.0 foo')
+
+
+class TestYaml(object):
+    """
+    """
+    yaml_files = ['testfile_st.yaml', 'testfile_st2.yaml', 'testfile_rcm.yaml',
+                  'testfile_required.yaml', 'testfile_uncertainty.yaml',
+                  'testfile_many_species.yaml', 'testfile_st_thermo.yaml']
+
+    def read_file(self, filename):
+        filename = pkg_resources.resource_filename(__name__, filename)
+        with open(filename, 'r') as f:
+            return f.read()
+
+    @pytest.mark.parametrize('filename', yaml_files)
+    def test_load_matches_safe_load(self, filename):
+        """Ensure the loader gives the same result as the pure-Python safe loader.
+        """
+        text = self.read_file(filename)
+        assert validation.load_yaml(text) == yaml.load(text, Loader=yaml.SafeLoader)
+
+    @pytest.mark.skipif(not yaml.__with_libyaml__, reason='libyaml not available')
+    @pytest.mark.parametrize('filename', yaml_files)
+    @pytest.mark.parametrize('kwargs', [{}, {'default_flow_style': False}])
+    def test_libyaml_parity(self, filename, kwargs):
+        """Ensure the libyaml and pure-Python implementations give identical results.
+        """
+        text = self.read_file(filename)
+        properties = yaml.load(text, Loader=yaml.CSafeLoader)
+        assert properties == yaml.load(text, Loader=yaml.SafeLoader)
+
+        c_output = yaml.dump(properties, Dumper=yaml.CSafeDumper, **kwargs)
+        py_output = yaml.dump(properties, Dumper=yaml.SafeDumper, **kwargs)
+        assert c_output == py_output
+
+    @pytest.mark.parametrize('filename', yaml_files)
+    def test_fallback_without_libyaml(self, filename, monkeypatch):
+        """Ensure the pure-Python loader and dumper give the same output.
+        """
+        text = self.read_file(filename)
+        properties = validation.load_yaml(text)
+        output = validation.dump_yaml(properties)
+
+        monkeypatch.setattr(validation, 'YamlLoader', yaml.SafeLoader)
+        monkeypatch.setattr(validation, 'YamlDumper', yaml.SafeDumper)
+        assert validation.load_yaml(text) == properties
+        assert validation.dump_yaml(properties) == output
+
+
+class TestPrepareSchema(object):
+    """
+    """
+    @pytest.fixture
+    def properties(self):
+        filename = pkg_resources.resource_filename(__name__, 'testfile_st.yaml')
+        with open(filename, 'r') as f:
+            properties = yaml.safe_load(f)
+        properties['reference'].pop('doi')
+        for author in properties['file-authors'] + properties['reference']['authors']:
+            author.pop('ORCID', None)
+        return properties
+
+    def test_prepared_once(self):
+        prepared = validation.prepare_schema(schema)
+        assert validation.prepare_schema(schema) is prepared
+        assert OurValidator(prepared).schema is prepared
+
+    def test_other_schema(self):
+        other_schema = {'value': {'type': 'integer'}}
+        prepared = validation.prepare_schema(other_schema)
+        assert prepared is not validation.prepare_schema(schema)
+        assert OurValidator(prepared).validate({'value': 1})
+        assert not OurValidator(prepared).validate({'value': 'one'})
+
+    def test_same_errors(self, properties):
+        properties['file-version'] = 'one'
+        properties['reference']['authors'] = []
+        validator = OurValidator(schema)
+        prepared_validator = OurValidator(validation.prepare_schema(schema))
+        assert not validator.validate(properties)
+        assert not prepared_validator.validate(properties)
+        assert prepared_validator.errors == validator.errors
+
+    def test_threads(self, properties):
+        """Validators in different threads share the prepared schema"""
+        from concurrent.futures import ThreadPoolExecutor
+        bad = deepcopy(properties)
+        bad['file-version'] = 'one'
+        documents = [properties, bad] * 4
+
+        def validate(document):
+            validator = OurValidator(validation.prepare_schema(schema))
+            return validator.validate(document), validator.errors
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(validate, documents))
+        assert results == [(True, {}), (False, {'file-version': ['must be of integer type']})] * 4
+
+
+class TestValidationProfiles(object):
+    """
+    """
+    @pytest.fixture
+    def properties(self):
+        filename = pkg_resources.resource_filename(__name__, 'testfile_st.yaml')
+        with open(filename, 'r') as f:
+            properties = yaml.safe_load(f)
+        properties['reference'].pop('doi')
+        for author in properties['file-authors'] + properties['reference']['authors']:
+            author.pop('ORCID', None)
+        return properties
+
+    def test_full(self):
+        assert validation.profile_schema('full') is schema
+
+    @pytest.mark.parametrize('profile', ['structural', 'units'])
+    def test_rules_removed(self, profile):
+        profile_schema = validation.profile_schema(profile)
+        assert validation.profile_schema(profile) is profile_schema
+        text = repr(profile_schema)
+        for rule in validation.validation_profiles[profile]:
+            assert rule not in text
+        for rule in set(chain.from_iterable(validation.rule_families.values())):
+            if rule not in validation.validation_profiles[profile]:
+                assert rule in text
+
+        # Parts of the schema without the rules are shared
+        assert profile_schema['chemked-version'] is schema['chemked-version']
+
+    def test_unknown_profile(self):
+        with pytest.raises(ValueError, match='validation profile'):
+            validation.profile_schema('nightly')
+
+    @pytest.mark.parametrize('profile, valid', [
+        ('structural', True), ('units', False), ('full', False),
+    ])
+    def test_units_rules(self, properties, profile, valid):
+        properties['datapoints'][0]['temperature'] = ['1000 meter']
+        v = OurValidator(validation.profile_schema(profile))
+        assert v.validate(properties) is valid
+
+    @pytest.mark.parametrize('profile', ['structural', 'units', 'full'])
+    def test_structure_checked(self, properties, profile):
+        properties['file-version'] = 'one'
+        v = OurValidator(validation.profile_schema(profile))
+        assert not v.validate(properties)
+        assert v.errors == {'file-version': ['must be of integer type']}
+
+    @pytest.mark.parametrize('profile, network', [
+        ('structural', False), ('units', False), ('full', True),
+    ])
+    def test_network_rules(self, profile, network, monkeypatch):
+        lookups = []
+        person = {'name': {'given-names': {'value': 'A'}, 'family-name': {'value': 'B'}}}
+        monkeypatch.setattr(validation, '_search', lambda kind, key: lookups.append(key) or person)
+        v = OurValidator(validation.profile_schema(profile))
+        v.validate({'file-authors': [{'name': 'A B', 'ORCID': '0000-0000-0000-0000'}]},
+                   update=True)
+        assert bool(lookups) is network
+        assert validation._needs_lookups(profile) is network
+
+
+class TestValidationTimings(object):
+    """
+    """
+    @pytest.fixture
+    def properties(self):
+        filename = pkg_resources.resource_filename(__name__, 'testfile_st.yaml')
+        with open(filename, 'r') as f:
+            properties = yaml.safe_load(f)
+        properties['reference'].pop('doi')
+        for author in properties['file-authors'] + properties['reference']['authors']:
+            author.pop('ORCID', None)
+        return properties
+
+    def test_record(self):
+        timings = validation.ValidationTimings()
+        timings.record('rules', 'isvalid_unit', 0.5)
+        timings.record('rules', 'isvalid_unit', 0.25)
+        with timings.timed('stages', 'cerberus'):
+            pass
+        report = timings.report()
+        assert report['rules'] == {'isvalid_unit': {'calls': 2, 'time': 0.75}}
+        assert report['stages']['cerberus']['calls'] == 1
+
+    def test_cerberus(self, properties):
+        timings = validation.ValidationTimings()
+        v = OurValidator(schema, timings=timings)
+        assert v.validate(properties)
+        report = timings.report()
+        assert list(report['stages']) == ['cerberus']
+        assert report['stages']['cerberus']['calls'] == 1
+        assert report['rules']['isvalid_quantity']['calls'] > 0
+        assert 'isvalid_reference' in report['rules']
+        rule_time = sum(r['time'] for r in report['rules'].values())
+        assert rule_time <= report['stages']['cerberus']['time']
+
+    def test_compiled(self, properties):
+        from ..compiled import CompiledValidator
+
+        cerberus_timings = validation.ValidationTimings()
+        OurValidator(schema, timings=cerberus_timings).validate(properties)
+        timings = validation.ValidationTimings()
+        assert CompiledValidator(schema, timings=timings).validate(properties)
+        report = timings.report()
+        assert list(report['stages']) == ['compiled']
+        assert ({k: v['calls'] for k, v in report['rules'].items()} ==
+                {k: v['calls'] for k, v in cerberus_timings.report()['rules'].items()})
+
+    def test_not_recorded(self, properties):
+        """Validators without timings still validate"""
+        v = OurValidator(schema)
+        assert v.validate(properties)
+        assert v(properties)
+
+    def test_format(self):
+        report = {'stages': {'cerberus': {'calls': 1, 'time': 0.5}},
+                  'rules': {'isvalid_unit': {'calls': 2, 'time': 0.001},
+                            'isvalid_quantity': {'calls': 3, 'time': 0.25}}}
+        lines = validation.format_timings(report).splitlines()
+        assert lines[0].split() == ['stage/rule', 'calls', 'time', '(ms)']
+        assert lines[1].split() == ['cerberus', '1', '500.000']
+        assert lines[2].split() == ['isvalid_quantity', '3', '250.000']
+        assert lines[3].split() == ['isvalid_unit', '2', '1.000']
+
+
+class TestValidationCache(object):
+    """
+    """
+    @pytest.fixture
+    def cache(self, tmpdir):
+        from ..cache import MetadataCache
+        cache = MetadataCache(str(tmpdir.join('validation.sqlite')))
+        validation.set_validation_cache(cache)
+        return cache
+
+    @pytest.fixture
+    def properties(self):
+        filename = pkg_resources.resource_filename(__name__, 'testfile_st.yaml')
+        with open(filename, 'r') as f:
+            return yaml.safe_load(f)
+
+    def test_key(self, properties):
+        key = validation.validation_key(properties)
+        assert key == validation.validation_key(deepcopy(properties))
+        assert key != validation.validation_key(properties, 'units')
+
+        # The order of the keys does not matter, but the values do
+        reordered = dict(reversed(list(properties.items())))
+        assert validation.validation_key(reordered) == key
+        properties['file-version'] += 1
+        assert validation.validation_key(properties) != key
+
+    def test_key_version(self, properties, monkeypatch):
+        key = validation.validation_key(properties)
+        monkeypatch.setattr(validation, '__version__', '0.0.0')
+        assert validation.validation_key(properties) != key
+
+    def test_store(self, cache, properties):
+        assert not validation.is_validated(properties)
+        assert validation.store_validated(properties)
+        assert validation.is_validated(properties)
+        assert not validation.is_validated(properties, 'structural')
+        assert cache.stats() == {'hits': 1, 'misses': 2, 'entries': 1}
+
+    def test_failed_lookups(self, cache, properties):
+        """Results are not stored if the DOIs or ORCIDs could not be checked"""
+        prefetched = {('doi', properties['reference']['doi']): ConnectionError()}
+        assert not validation.store_validated(properties, prefetched=prefetched)
+        assert not validation.is_validated(properties)
+
+        # Failed lookups of other files do not matter
+        prefetched = {('doi', '10.1000/other'): ConnectionError()}
+        assert validation.store_validated(properties, prefetched=prefetched)
+
+    def test_invalidate(self, cache, properties):
+        validation.store_validated(properties)
+        validation.store_validated(properties, 'units')
+        validation.invalidate_validation(properties)
+        assert not validation.is_validated(properties)
+        assert not validation.is_validated(properties, 'units')
+
+        validation.store_validated(properties)
+        validation.clear_validation_cache()
+        assert len(cache) == 0
+
+    def test_disabled(self, properties):
+        validation.set_validation_cache(None)
+        assert not validation.store_validated(properties)
+        assert not validation.is_validated(properties)
+        validation.clear_validation_cache()
+        validation.invalidate_validation(properties)
+
+    def test_opt_in(self, properties, tmpdir, monkeypatch):
+        """Nothing is written to the cache directory unless the cache is enabled"""
+        monkeypatch.setattr(validation, '_use_default_validation_cache', True)
+        monkeypatch.setenv('PYKED_CACHE_DIR', str(tmpdir))
+        monkeypatch.delenv('PYKED_VALIDATION_CACHE', raising=False)
+        assert validation.get_validation_cache() is None
+        assert not validation.store_validated(properties)
+        assert tmpdir.listdir() == []
+
+        monkeypatch.setenv('PYKED_VALIDATION_CACHE', '0')
+        assert validation.get_validation_cache() is None
+
+        monkeypatch.setenv('PYKED_VALIDATION_CACHE', '1')
+        assert validation.store_validated(properties)
+        assert tmpdir.join('validation.sqlite').check()
+
+    def test_enable(self, properties, tmpdir, monkeypatch):
+        monkeypatch.setattr(validation, '_use_default_validation_cache', True)
+        monkeypatch.setenv('PYKED_CACHE_DIR', str(tmpdir))
+        cache = validation.enable_validation_cache()
+        assert validation.get_validation_cache() is cache
+        assert cache.filename == str(tmpdir.join('validation.sqlite'))
+
+        # A cache that was set is not replaced
+        validation.set_validation_cache(None)
+        assert validation.enable_validation_cache() is None
@@ -2,16 +2,35 @@
 """
 from warnings import warn
 import re
+import os
+import sys
+import pickle
+import hashlib
+import json
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 
-from pkg_resources import resource_filename
 import yaml
 
 import numpy as np
 import pint
-from requests.exceptions import HTTPError, ConnectionError
 from cerberus import Validator, SchemaError
-import habanero
 from .orcid import search_orcid
+from .crossref import get_crossref_api, search_doi  # noqa: F401
+from .offline import MissingMetadataError
+from .cache import get_cache_dir, read_pickle, write_pickle, MetadataCache
+from ._version import __version__
+
+# Use the libyaml bindings for loading and dumping when PyYAML was built with them
+try:
+    from yaml import CSafeLoader as YamlLoader, CSafeDumper as YamlDumper
+except ImportError:  # pragma: no cover
+    from yaml import SafeLoader as YamlLoader, SafeDumper as YamlDumper
 
 units = pint.UnitRegistry()
 """Unit registry to contain the units used in PyKED"""
@@ -19,52 +38,136 @@ units = pint.UnitRegistry()
 units.define('cm3 = centimeter**3')
 Q_ = units.Quantity
 
-crossref_api = habanero.Crossref(mailto='prometheus@pr.omethe.us')
+schema_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schemas')
+"""`str`: Directory containing the ChemKED schema files"""
+
 
-# Load the ChemKED schema definition file
-schema_file = resource_filename(__name__, 'schemas/chemked_schema.yaml')
-with open(schema_file, 'r') as f:
-    schema_list = f.readlines()
+def load_yaml(stream):
+    """Load a YAML document using the safe loader, with libyaml if available.
+
+    Args:
+        stream (`str` or file-like): The YAML document
 
-inc_start = None
-inc_end = None
-inc_list = []
-no_includes = False
-for l_num, l in enumerate(schema_list):
-    if l.startswith('!include'):
-        if no_includes:  # pragma: no cover
-            raise SchemaError('All included files must be first in the main schema')
+    Returns:
+        The Python object represented by the document
+    """
+    return yaml.load(stream, Loader=YamlLoader)
 
-        if inc_start is None:
-            inc_start = l_num
 
-        if inc_end is not None:  # pragma: no cover
-            raise SchemaError('All included files must be first in the main schema')
+def dump_yaml(data, stream=None, **kwargs):
+    """Dump an object to YAML using the safe dumper, with libyaml if available.
+
+    Args:
+        data: The object to be dumped
+        stream (file-like, optional): Stream to write to. If not given, the YAML is returned as a
+            `str`.
+        kwargs: Additional formatting options passed to `yaml.dump`
+
+    Returns:
+        `str`: The YAML document if ``stream`` is not given, otherwise `None`
+    """
+    return yaml.dump(data, stream, Dumper=YamlDumper, **kwargs)
+
+
+def _read_schema_files():
+    """Read the ChemKED schema definition file and splice in the included files.
+
+    Returns:
+        `str`: The text of the main schema file with the ``!include`` lines replaced by the
+            contents of the included files.
+    """
+    schema_file = os.path.join(schema_dir, 'chemked_schema.yaml')
+    with open(schema_file, 'r') as f:
+        schema_list = f.readlines()
+
+    inc_start = None
+    inc_end = None
+    inc_list = []
+    no_includes = False
+    for l_num, l in enumerate(schema_list):
+        if l.startswith('!include'):
+            if no_includes:  # pragma: no cover
+                raise SchemaError('All included files must be first in the main schema')
+
+            if inc_start is None:
+                inc_start = l_num
+
+            if inc_end is not None:  # pragma: no cover
+                raise SchemaError('All included files must be first in the main schema')
+
+            inc_fname = l.split('!include')[1].strip()
+            inc_fname = os.path.join(schema_dir, inc_fname)
+            with open(inc_fname, 'r') as f:
+                inc_list.extend(f.readlines())
+        else:
+            if not l.strip() or l.startswith('#') or l.startswith('---'):
+                continue
+
+            if inc_start is None:  # pragma: no cover
+                no_includes = True
+
+            if inc_start is not None and inc_end is None:
+                inc_end = l_num
+
+    schema_list[inc_start:inc_end] = inc_list
+    return ''.join(schema_list)
+
+
+def _parse_schema(schema_text):
+    """Parse the merged schema text into the dictionary used by the validator.
+
+    Args:
+        schema_text (`str`): Merged schema text from `_read_schema_files`
+
+    Returns:
+        `dict`: The ChemKED schema
+    """
+    schema = load_yaml(schema_text)
+
+    # These top-level keys in the schema serve as references for lower-level keys.
+    # They are removed to prevent conflicts due to required variables, etc.
+    for key in ['author', 'value-unit-required', 'value-unit-optional',
+                'composition', 'ignition-type', 'value-with-uncertainty',
+                'value-without-uncertainty',
+                ]:
+        del schema[key]
+
+    return schema
 
-        inc_fname = l.split('!include')[1].strip()
-        inc_fname = resource_filename(__name__, 'schemas/' + inc_fname)
-        with open(inc_fname, 'r') as f:
-            inc_list.extend(f.readlines())
-    else:
-        if not l.strip() or l.startswith('#') or l.startswith('---'):
-            continue
 
-        if inc_start is None:  # pragma: no cover
-            no_includes = True
+def load_schema(*, use_cache=True):
+    """Load the ChemKED schema, using a cached copy if available.
 
-        if inc_start is not None and inc_end is None:
-            inc_end = l_num
+    Parsing the YAML schema files is comparatively slow, so the parsed schema is stored in the
+    PyKED cache directory (see `~pyked.cache.get_cache_dir`). The cache file is keyed by a hash
+    of the contents of the schema files, the PyKED version, and the Python version and pickle
+    protocol, so it is rebuilt automatically whenever any of them changes.
 
-schema_list[inc_start:inc_end] = inc_list
-schema = yaml.safe_load(''.join(schema_list))
+    Args:
+        use_cache (`bool`, optional, keyword-only): Set to `False` to always parse the schema
+            files and bypass the cache.
+
+    Returns:
+        `dict`: The ChemKED schema
+    """
+    schema_text = _read_schema_files()
+    if not use_cache:
+        return _parse_schema(schema_text)
 
-# These top-level keys in the schema serve as references for lower-level keys.
-# They are removed to prevent conflicts due to required variables, etc.
-for key in ['author', 'value-unit-required', 'value-unit-optional',
-            'composition', 'ignition-type', 'value-with-uncertainty',
-            'value-without-uncertainty',
-            ]:
-    del schema[key]
+    python_version = '{}.{}-{}'.format(sys.version_info[0], sys.version_info[1],
+                                       pickle.HIGHEST_PROTOCOL)
+    key = hashlib.sha256((schema_text + __version__ + python_version).encode('utf-8')).hexdigest()
+    cache_file = os.path.join(get_cache_dir(), 'schema-{}.pickle'.format(key))
+    schema = read_pickle(cache_file)
+    if schema is None:
+        schema = _parse_schema(schema_text)
+        write_pickle(schema, cache_file)
+
+    return schema
+
+
+schema = load_schema()
+"""`dict`: The ChemKED schema used to validate files"""
 
 # SI units for available value-type properties
 property_units = {
@@ -88,6 +191,109 @@ property_units = {
 }
 
 
+# A number followed by optional units that start with a letter, e.g. "1.0 atm" or "471.54 us"
+_quantity_re = re.compile(
+    r'^\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*([A-Za-z_].*?)?\s*$'
+)
+_integer_re = re.compile(r'^[-+]?\d+$')
+
+
+@lru_cache(maxsize=256)
+def parse_units(unit_string):
+    """Parse a units string into a `~pint.Unit` of the PyKED unit registry.
+
+    Parsed units are cached, so repeated unit strings are only parsed once.
+
+    Args:
+        unit_string (`str`): String representation of the units, e.g. ``'kPa'``
+
+    Returns:
+        `~pint.Unit`: The parsed units
+    """
+    return units.parse_units(unit_string)
+
+
+@lru_cache(maxsize=4096)
+def _split_quantity(quantity_string):
+    """Split a string into a magnitude and parsed units.
+
+    Returns:
+        `tuple`: The magnitude and `~pint.Unit`, or `None` if the string is not a simple number
+            followed by units.
+    """
+    match = _quantity_re.match(quantity_string)
+    if match is None:
+        return None
+
+    magnitude, unit_string = match.groups()
+    # Keep the same magnitude type as the pint parser, which gives an int for integers
+    if _integer_re.match(magnitude):
+        magnitude = int(magnitude)
+    else:
+        magnitude = float(magnitude)
+
+    try:
+        unit = parse_units(unit_string or '')
+    except Exception:
+        # Let the full pint parser handle (and report) anything unusual
+        return None
+
+    return magnitude, unit
+
+
+def parse_quantity(value):
+    """Parse a value with units into a `~pint.Quantity`.
+
+    Strings of the form "number units" (e.g., "1.0 atm") are split directly into the magnitude
+    and units, with the parsed units cached per unit string. Any other expression falls back to
+    the full pint expression parser. Values that are not strings are treated as dimensionless.
+
+    Examples:
+        >>> parse_quantity('1.0 atm')
+        <Quantity(1.0, 'atmosphere')>
+        >>> parse_quantity(0.5)
+        <Quantity(0.5, 'dimensionless')>
+
+    Args:
+        value (`str` or `float`): The value to be parsed
+
+    Returns:
+        `~pint.Quantity`: The parsed quantity
+    """
+    if not isinstance(value, str):
+        return Q_(value)
+
+    parsed = _split_quantity(value)
+    if parsed is None:
+        return Q_(value)
+
+    return Q_(*parsed)
+
+
+@lru_cache(maxsize=4096)
+def _quantity_error(value, field):
+    """Check that a quantity is positive and has the units of a property.
+
+    The results are cached, since the same values appear many times in large files.
+
+    Args:
+        value (`str` or `float`): The value of the quantity
+        field (`str`): The property, used to look up the units in `property_units`
+
+    Returns:
+        `str`: The error message, or `None` if the quantity is valid
+    """
+    quantity = parse_quantity(value)
+    low_lim = Q_(0.0, parse_units(property_units[field]))
+
+    try:
+        if quantity <= low_lim:
+            return 'value must be greater than 0.0 {}'.format(property_units[field])
+    except pint.DimensionalityError:
+        return 'incompatible units; should be consistent with ' + property_units[field]
+    return None
+
+
 def compare_name(given_name, family_name, question_name):
     """Compares a name in question to a specified name separated into given and family.
 
@@ -166,9 +372,217 @@ def compare_name(given_name, family_name, question_name):
     return given_name == first_name and family_name == family_name_compare
 
 
+def _collect_lookups(properties):
+    """Return the DOI and ORCID lookups needed to validate the properties of a ChemKED file.
+
+    Args:
+        properties (`dict`): Dictionary created from the parsed YAML file
+
+    Returns:
+        `list`: The lookups as ``('doi', doi)`` and ``('orcid', orcid)`` tuples
+    """
+    lookups = []
+    authors = []
+    if isinstance(properties.get('file-authors'), list):
+        authors.extend(properties['file-authors'])
+    reference = properties.get('reference')
+    if isinstance(reference, dict):
+        if isinstance(reference.get('doi'), str):
+            lookups.append(('doi', reference['doi']))
+        if isinstance(reference.get('authors'), list):
+            authors.extend(reference['authors'])
+    for author in authors:
+        if isinstance(author, dict) and isinstance(author.get('ORCID'), str):
+            lookups.append(('orcid', author['ORCID']))
+    return lookups
+
+
+def _search(kind, key):
+    """Look up a DOI with Crossref or an ORCID with the ORCID API."""
+    if kind == 'doi':
+        return search_doi(key)
+    else:
+        return search_orcid(key)
+
+
+def prefetch_metadata(properties, *, max_workers=8, exclude=()):
+    """Look up all of the DOIs and ORCIDs in ChemKED properties concurrently.
+
+    The results can be passed to `OurValidator` with the ``prefetched`` keyword argument, so the
+    validation rules do not make network requests one after another. Each DOI and ORCID is only
+    looked up once, even if it is present in more than one author or file.
+
+    Args:
+        properties (`dict` or `list`): Dictionary created from a parsed YAML file, or a list of
+            such dictionaries
+        max_workers (`int`, optional): Maximum number of concurrent lookups. Must be supplied as
+            a keyword-argument.
+        exclude (optional): Lookups that are not made, such as the keys of the results of an
+            earlier call. Must be supplied as a keyword-argument.
+
+    Returns:
+        `dict`: Mapping of ``('doi', doi)`` and ``('orcid', orcid)`` to the result of
+            `~pyked.crossref.search_doi` or `~pyked.orcid.search_orcid`, or to the exception that
+            was raised by the lookup
+
+    Examples:
+        >>> prefetched = prefetch_metadata(properties)
+        >>> validator = OurValidator(schema, prefetched=prefetched)
+        >>> validator.validate(properties)
+    """
+    if isinstance(properties, dict):
+        properties = [properties]
+    lookups = [lookup for lookup in OrderedDict.fromkeys(chain.from_iterable(
+        _collect_lookups(p) for p in properties if isinstance(p, dict)
+    )) if lookup not in exclude]
+    if not lookups:
+        return {}
+
+    def lookup(kind_key):
+        try:
+            return _search(*kind_key)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(lookups))) as executor:
+        return dict(zip(lookups, executor.map(lookup, lookups)))
+
+
+class ValidationTimings(object):
+    """Call counts and cumulative wall time of the stages and custom rules of validation.
+
+    Pass an instance to `OurValidator` or `~pyked.compiled.CompiledValidator` with the
+    ``timings`` keyword argument to record how long each ``isvalid_*`` rule takes and how long
+    the whole validation takes. The time of the whole validation includes the time of the rules.
+    An instance can be shared by several validators, including validators in other threads.
+
+    Examples:
+        >>> timings = ValidationTimings()
+        >>> validator = OurValidator(schema, timings=timings)
+        >>> validator.validate(properties)
+        >>> timings.report()['rules']['isvalid_quantity']
+        {'calls': 125, 'time': 0.0123}
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timings = {'stages': {}, 'rules': {}}
+
+    def record(self, kind, name, seconds):
+        """Add a call to a stage or rule.
+
+        Args:
+            kind (`str`): ``'stages'`` or ``'rules'``
+            name (`str`): The stage, such as ``'cerberus'``, or the rule, such as
+                ``'isvalid_quantity'``
+            seconds (`float`): The wall time of the call
+        """
+        with self._lock:
+            entry = self._timings[kind].setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    @contextmanager
+    def timed(self, kind, name):
+        """Context manager that records the wall time of its body as a call to a stage or rule.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(kind, name, time.perf_counter() - start)
+
+    def report(self):
+        """Return the recorded timings.
+
+        Returns:
+            `dict`: With keys ``'stages'`` and ``'rules'``, each mapping the names of the stages
+                or rules to a `dict` of the number of ``'calls'`` and the cumulative ``'time'``
+                in seconds
+        """
+        with self._lock:
+            return {kind: {name: {'calls': calls, 'time': seconds}
+                           for name, (calls, seconds) in entries.items()}
+                    for kind, entries in self._timings.items()}
+
+
+def format_timings(report):
+    """Format the timings of a validation as a table, with the slowest stages and rules first.
+
+    Args:
+        report (`dict`): The timings from `ValidationTimings.report`
+
+    Returns:
+        `str`: The table of call counts and times in milliseconds
+    """
+    lines = ['{:<24} {:>8} {:>12}'.format('stage/rule', 'calls', 'time (ms)')]
+    for kind in ['stages', 'rules']:
+        entries = sorted(report[kind].items(), key=lambda item: -item[1]['time'])
+        for name, entry in entries:
+            lines.append('{:<24} {:>8} {:>12.3f}'.format(name, entry['calls'],
+                                                         entry['time'] * 1e3))
+    return '\n'.join(lines)
+
+
+def _timed_rule(method):
+    """Decorate a custom validation rule to record its timings in the ``timings`` config."""
+    rule = method.__name__[len('_validate_'):]
+
+    @wraps(method)
+    def timed_rule(self, *args):
+        timings = self._config.get('timings')
+        if timings is None:
+            return method(self, *args)
+        with timings.timed('rules', rule):
+            return method(self, *args)
+
+    return timed_rule
+
+
 class OurValidator(Validator):
     """Custom validator with rules for Quantities and references.
+
+    Arguments:
+        prefetched (`dict`, optional): Results of the DOI and ORCID lookups from
+            `prefetch_metadata`. Lookups that are not included are made when the rules are
+            validated. Must be supplied as a keyword-argument.
+        timings (`ValidationTimings`, optional): Records the time taken by the validation and by
+            each custom rule. Must be supplied as a keyword-argument.
     """
+    def validate(self, document, schema=None, update=False, normalize=True):
+        """Validate a document, recording the time taken if ``timings`` was given.
+
+        See `cerberus.Validator.validate`.
+        """
+        timings = self._config.get('timings')
+        if timings is None or self.is_child:
+            return super().validate(document, schema=schema, update=update, normalize=normalize)
+        with timings.timed('stages', 'cerberus'):
+            return super().validate(document, schema=schema, update=update, normalize=normalize)
+
+    __call__ = validate
+
+    def _lookup(self, kind, key):
+        """Return the result of a DOI or ORCID lookup, using the prefetched results if available.
+
+        Args:
+            kind (`str`): ``'doi'`` or ``'orcid'``
+            key (`str`): The DOI or ORCID to look up
+
+        Returns:
+            `dict`: The result of the lookup
+
+        Raises:
+            The exception raised by the lookup
+        """
+        prefetched = self._config.get('prefetched')
+        if prefetched is not None and (kind, key) in prefetched:
+            result = prefetched[(kind, key)]
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return _search(kind, key)
+
+    @_timed_rule
     def _validate_isvalid_t_range(self, isvalid_t_range, field, values):
         """Checks that the temperature ranges given for thermo data are valid
         Args:
@@ -199,6 +613,7 @@ class OurValidator(Validator):
         if max([T_low, T_mid, T_hi]) != T_hi:
             self._error(field, 'The last element of the T_range must be the upper limit')
 
+    @_timed_rule
     def _validate_isvalid_unit(self, isvalid_unit, field, value):
         """Checks for appropriate units using Pint unit registry.
         Args:
@@ -210,7 +625,7 @@ class OurValidator(Validator):
             {'isvalid_unit': {'type': 'bool'}, 'field': {'type': 'str'},
              'value': {'type': 'dict'}}
         """
-        quantity = 1.0 * units(value['units'])
+        quantity = Q_(1.0, parse_units(value['units']))
         try:
             quantity.to(property_units[field])
         except pint.DimensionalityError:
@@ -218,6 +633,7 @@ class OurValidator(Validator):
                         'with ' + property_units[field]
                         )
 
+    @_timed_rule
     def _validate_isvalid_history(self, isvalid_history, field, value):
         """Checks that the given time history is properly formatted.
 
@@ -236,7 +652,7 @@ class OurValidator(Validator):
             history_type = 'emission'
         elif history_type.endswith('absorption'):
             history_type = 'absorption'
-        quantity = 1.0*(units(value['quantity']['units']))
+        quantity = Q_(1.0, parse_units(value['quantity']['units']))
         try:
             quantity.to(property_units[history_type])
         except pint.DimensionalityError:
@@ -244,14 +660,34 @@ class OurValidator(Validator):
                         'with ' + property_units[history_type])
 
         # Check that time has appropriate units
-        time = 1.0*(units(value['time']['units']))
+        time = Q_(1.0, parse_units(value['time']['units']))
         try:
             time.to(property_units['time'])
         except pint.DimensionalityError:
             self._error(field, 'incompatible units; should be consistent '
                         'with ' + property_units['time'])
 
-        # Check that the values have the right number of columns
+        # Check that the uncertainty has appropriate units
+        uncertainty = value.get('uncertainty')
+        if uncertainty is not None:
+            if 'value' in uncertainty:
+                unc = parse_quantity(uncertainty['value'])
+            else:
+                unc = Q_(1.0, parse_units(uncertainty['units']))
+            if uncertainty['type'] == 'relative':
+                expected = 'dimensionless'
+            else:
+                expected = value['quantity']['units']
+            try:
+                unc.to(parse_units(expected))
+            except pint.DimensionalityError:
+                self._error(field, 'incompatible units of the uncertainty; should be consistent '
+                            'with ' + expected)
+
+        # Check that the values have the right number of columns. Values in other files are
+        # only read when they are used, so their columns are not checked.
+        if isinstance(value['values'], dict):
+            return
         n_cols = len(value['values'][0])
         max_cols = max(value['time']['column'],
                        value['quantity']['column'],
@@ -261,6 +697,7 @@ class OurValidator(Validator):
         elif n_cols < max_cols:
             self._error(field, 'not enough columns in the values')
 
+    @_timed_rule
     def _validate_isvalid_quantity(self, isvalid_quantity, field, value):
         """Checks for valid given value and appropriate units.
 
@@ -273,19 +710,14 @@ class OurValidator(Validator):
             {'isvalid_quantity': {'type': 'bool'}, 'field': {'type': 'str'},
              'value': {'type': 'list'}}
         """
-        quantity = Q_(value[0])
-        low_lim = 0.0 * units(property_units[field])
-
-        try:
-            if quantity <= low_lim:
-                self._error(
-                    field, 'value must be greater than 0.0 {}'.format(property_units[field]),
-                )
-        except pint.DimensionalityError:
-            self._error(field, 'incompatible units; should be consistent '
-                        'with ' + property_units[field]
-                        )
+        if isinstance(value[0], (str, int, float)):
+            message = _quantity_error(value[0], field)
+        else:
+            message = _quantity_error.__wrapped__(value[0], field)
+        if message is not None:
+            self._error(field, message)
 
+    @_timed_rule
     def _validate_isvalid_uncertainty(self, isvalid_uncertainty, field, value):
         """Checks for valid given value and appropriate units with uncertainty.
 
@@ -314,6 +746,7 @@ class OurValidator(Validator):
             if value[1].get('lower-uncertainty') is not None:
                 self._validate_isvalid_quantity(True, field, [value[1]['lower-uncertainty']])
 
+    @_timed_rule
     def _validate_isvalid_reference(self, isvalid_reference, field, value):
         """Checks valid reference metadata using DOI (if present).
 
@@ -328,14 +761,20 @@ class OurValidator(Validator):
 
         """
         if 'doi' in value:
+            from requests.exceptions import HTTPError, ConnectionError
+            import habanero
+
             try:
-                ref = crossref_api.works(ids=value['doi'])['message']
+                ref = self._lookup('doi', value['doi'])
             except (HTTPError, habanero.RequestError):
                 self._error(field, 'DOI not found')
                 return
             except ConnectionError:
                 warn('network not available, DOI not validated.')
                 return
+            except MissingMetadataError:
+                warn('DOI not in the offline metadata bundle, DOI not validated.')
+                return
 
             # Assume that the reference returned by the DOI lookup always has a container-title
             ref_container = ref.get('container-title')[0]
@@ -417,6 +856,7 @@ class OurValidator(Validator):
                             ', '.join(author_names)
                             )
 
+    @_timed_rule
     def _validate_isvalid_orcid(self, isvalid_orcid, field, value):
         """Checks for valid ORCID if given.
 
@@ -431,9 +871,11 @@ class OurValidator(Validator):
 
         """
         if isvalid_orcid and 'ORCID' in value:
+            from requests.exceptions import HTTPError, ConnectionError, Timeout
+
             try:
-                res = search_orcid(value['ORCID'])
-            except ConnectionError:
+                res = self._lookup('orcid', value['ORCID'])
+            except (ConnectionError, Timeout):
                 warn('network not available, ORCID not validated.')
                 return
             except HTTPError:
@@ -441,6 +883,9 @@ class OurValidator(Validator):
                             value['name']
                             )
                 return
+            except MissingMetadataError:
+                warn('ORCID not in the offline metadata bundle, ORCID not validated.')
+                return
 
             family_name = res['name']['family-name']['value']
             given_name = res['name']['given-names']['value']
@@ -450,6 +895,7 @@ class OurValidator(Validator):
                             ' '.join([given_name, family_name])
                             )
 
+    @_timed_rule
     def _validate_isvalid_composition(self, isvalid_composition, field, value):
         """Checks for valid specification of composition.
 
@@ -498,3 +944,302 @@ class OurValidator(Validator):
                         '{:f}'.format(sum_amount)
                         )
         # TODO: validate InChI, SMILES, or atomic-composition
+
+
+_prepared_schemas = {}
+_prepared_schemas_lock = threading.Lock()
+
+
+def prepare_schema(validation_schema, *, validator_class=OurValidator):
+    """Return a schema that has been normalized and checked by Cerberus, once per process.
+
+    Cerberus expands and checks the schema every time a validator is created, which takes
+    longer than validating a small file. Validators created with the prepared schema skip this
+    step. Each thread should still create its own validator, since validators store the state of
+    the document being validated; the prepared schema is only read.
+
+    The prepared schema is cached for the schema object, so the schema must not be changed after
+    it has been prepared.
+
+    Args:
+        validation_schema (`dict`): The schema, e.g. `schema`
+        validator_class (`type`, optional): The validator class the schema is prepared for. Must
+            be supplied as a keyword-argument.
+
+    Returns:
+        `~cerberus.schema.DefinitionSchema`: The prepared schema
+
+    Examples:
+        >>> validator = OurValidator(prepare_schema(schema))
+        >>> validator.validate(properties)
+        True
+    """
+    key = (id(validation_schema), validator_class)
+    entry = _prepared_schemas.get(key)
+    if entry is None or entry[0] is not validation_schema:
+        with _prepared_schemas_lock:
+            entry = _prepared_schemas.get(key)
+            if entry is None or entry[0] is not validation_schema:
+                entry = (validation_schema, validator_class(validation_schema).schema)
+                _prepared_schemas[key] = entry
+    return entry[1]
+
+
+rule_families = {
+    'network': frozenset(['isvalid_reference', 'isvalid_orcid']),
+    'units': frozenset(['isvalid_quantity', 'isvalid_uncertainty', 'isvalid_unit',
+                        'isvalid_history', 'isvalid_t_range']),
+    'composition': frozenset(['isvalid_composition']),
+}
+"""`dict`: The custom validation rules, grouped by what they check. The ``network`` rules look up
+DOIs and ORCIDs with web APIs, and the ``units`` rules parse quantities and units with Pint."""
+
+validation_profiles = {
+    'structural': rule_families['network'] | rule_families['units'] | rule_families['composition'],
+    'units': rule_families['network'],
+    'full': frozenset(),
+}
+"""`dict`: The rules turned off by each validation profile. The ``structural`` profile only
+checks the structure and types of the fields, the ``units`` profile also runs the rules that do
+not need a network connection, and the ``full`` profile runs all of the rules."""
+
+_profile_schemas = {}
+
+
+def _without_rules(definition, rules):
+    """Return a schema definition with the given rules removed at every level.
+
+    Parts of the definition without any of the rules are returned unchanged, rather than copied.
+    """
+    if isinstance(definition, dict):
+        stripped = {k: _without_rules(v, rules) for k, v in definition.items() if k not in rules}
+        if len(stripped) == len(definition) and all(stripped[k] is definition[k]
+                                                    for k in stripped):
+            return definition
+        return stripped
+    elif isinstance(definition, list):
+        stripped = [_without_rules(v, rules) for v in definition]
+        if all(a is b for a, b in zip(stripped, definition)):
+            return definition
+        return stripped
+    return definition
+
+
+def profile_schema(profile, validation_schema=None):
+    """Return the schema used by a validation profile.
+
+    The schema for each profile is only built once, so validators for the profile share the
+    prepared and compiled schemas (see `prepare_schema` and `~pyked.compiled`).
+
+    Args:
+        profile (`str`): The validation profile, one of the keys of `validation_profiles`
+        validation_schema (`dict`, optional): The full schema. Defaults to `schema`.
+
+    Returns:
+        `dict`: The schema without the rules that the profile turns off
+
+    Raises:
+        `ValueError`: If the profile is not known
+    """
+    if profile not in validation_profiles:
+        raise ValueError('validation profile must be one of {}'.format(
+            sorted(validation_profiles)))
+    if validation_schema is None:
+        validation_schema = schema
+
+    key = (profile, id(validation_schema))
+    entry = _profile_schemas.get(key)
+    if entry is None or entry[0] is not validation_schema:
+        entry = (validation_schema,
+                 _without_rules(validation_schema, validation_profiles[profile]))
+        _profile_schemas[key] = entry
+    return entry[1]
+
+
+def _needs_lookups(profile):
+    """Return whether a validation profile looks up DOIs and ORCIDs with the web APIs.
+
+    Args:
+        profile (`str`): The validation profile, one of the keys of `validation_profiles`
+
+    Returns:
+        `bool`: `True` if any of the ``network`` rules are run by the profile
+    """
+    return not rule_families['network'] <= validation_profiles[profile]
+
+
+_validation_cache = None
+_use_default_validation_cache = True
+_schema_hashes = {}
+
+
+def get_validation_cache():
+    """Return the cache of validation results.
+
+    The results are only cached on disk if the cache is enabled, so that loading ChemKED files
+    does not write to the user's cache directory unless asked to. The cache is enabled by
+    `enable_validation_cache`, by setting the ``PYKED_VALIDATION_CACHE`` environment variable to
+    ``1``, or by setting a cache with `set_validation_cache`. The ``ck_validate`` command enables
+    it unless ``--no-cache`` is given.
+
+    Returns:
+        `~pyked.cache.MetadataCache`: The cache of validation results, or `None` if caching is
+            disabled
+    """
+    enabled = os.environ.get('PYKED_VALIDATION_CACHE', '0') not in ['', '0']
+    if _validation_cache is None and enabled:
+        return enable_validation_cache()
+    return _validation_cache
+
+
+def enable_validation_cache():
+    """Cache the validation results in ``validation.sqlite`` in the PyKED cache directory.
+
+    The PyKED cache directory is given by `~pyked.cache.get_cache_dir`. A cache set with
+    `set_validation_cache`, including `None` to disable caching, is not replaced.
+
+    Returns:
+        `~pyked.cache.MetadataCache`: The cache of validation results, or `None` if caching was
+            disabled with `set_validation_cache`
+    """
+    global _validation_cache
+    if _validation_cache is None and _use_default_validation_cache:
+        _validation_cache = MetadataCache(os.path.join(get_cache_dir(), 'validation.sqlite'),
+                                          max_entries=100000)
+    return _validation_cache
+
+
+def set_validation_cache(cache):
+    """Set the cache used for validation results.
+
+    Args:
+        cache: The cache to use, or `None` to disable caching. Any object with ``get(key)``,
+            ``set(key, value)``, ``delete(key)``, and ``clear()`` methods like
+            `~pyked.cache.MetadataCache` can be used.
+    """
+    global _validation_cache, _use_default_validation_cache
+    _validation_cache = cache
+    _use_default_validation_cache = False
+
+
+def clear_validation_cache():
+    """Remove all of the validation results from the cache, so every file is validated again.
+    """
+    cache = get_validation_cache()
+    if cache is not None:
+        cache.clear()
+
+
+def _schema_hash(profile):
+    """Return the hash of the schema of a validation profile, computed once per process."""
+    if profile not in _schema_hashes:
+        text = json.dumps(profile_schema(profile), sort_keys=True, default=str)
+        _schema_hashes[profile] = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    return _schema_hashes[profile]
+
+
+def validation_key(properties, profile='full'):
+    """Return the key of the validation result of ChemKED properties in the validation cache.
+
+    The key is a hash of the properties, with the keys of each mapping sorted, the schema of the
+    validation profile, and the PyKED version, so it changes whenever any of them change.
+
+    Args:
+        properties (`dict`): Dictionary created from the parsed YAML file
+        profile (`str`, optional): The validation profile, one of the keys of
+            `validation_profiles`
+
+    Returns:
+        `str`: The key, or `None` if the properties cannot be hashed
+    """
+    try:
+        text = json.dumps(properties, sort_keys=True, separators=(',', ':'), default=str)
+    except (TypeError, ValueError):
+        return None
+    text = '\n'.join([text, _schema_hash(profile), profile, __version__])
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def is_validated(properties, profile='full'):
+    """Return whether ChemKED properties are in the validation cache as valid.
+
+    Args:
+        properties (`dict`): Dictionary created from the parsed YAML file
+        profile (`str`, optional): The validation profile, one of the keys of
+            `validation_profiles`
+
+    Returns:
+        `bool`: `True` if the properties were already validated with the profile
+    """
+    cache = get_validation_cache()
+    if cache is None:
+        return False
+    key = validation_key(properties, profile)
+    return key is not None and cache.get(key) is not None
+
+
+def store_validated(properties, profile='full', prefetched=None):
+    """Store ChemKED properties in the validation cache as valid.
+
+    If any of the DOI and ORCID lookups of the properties failed, the rules could not check them,
+    so the result is not stored.
+
+    Args:
+        properties (`dict`): Dictionary created from the parsed YAML file, which must be valid
+        profile (`str`, optional): The validation profile, one of the keys of
+            `validation_profiles`
+        prefetched (`dict`, optional): The results of the DOI and ORCID lookups used to
+            validate the properties, from `prefetch_metadata`
+
+    Returns:
+        `bool`: `True` if the result was stored
+    """
+    cache = get_validation_cache()
+    if cache is None:
+        return False
+    if prefetched and any(isinstance(prefetched.get(lookup), Exception)
+                          for lookup in _collect_lookups(properties)):
+        return False
+    key = validation_key(properties, profile)
+    if key is None:
+        return False
+    cache.set(key, {'valid': True})
+    return True
+
+
+def invalidate_validation(properties):
+    """Remove the validation results of ChemKED properties from the cache, for every profile.
+
+    Args:
+        properties (`dict`): Dictionary created from the parsed YAML file
+    """
+    cache = get_validation_cache()
+    if cache is None:
+        return
+    for profile in validation_profiles:
+        key = validation_key(properties, profile)
+        if key is not None:
+            cache.delete(key)
+
+
+class _ValidationModule(type(sys)):
+    """Module type that keeps the deprecated ``crossref_api`` attribute of this module.
+
+    Module-level ``__getattr__`` needs Python 3.7, so the attribute is a property of the class
+    of the module instead. The Crossref API instance is still only created when it is used.
+    """
+    @property
+    def crossref_api(self):
+        warn('pyked.validation.crossref_api is deprecated, use '
+             'pyked.crossref.get_crossref_api() instead', DeprecationWarning, stacklevel=2)
+        return get_crossref_api()
+
+    @crossref_api.setter
+    def crossref_api(self, api):
+        warn('pyked.validation.crossref_api is deprecated, set '
+             'pyked.crossref._crossref_api instead', DeprecationWarning, stacklevel=2)
+        from . import crossref
+        crossref._crossref_api = api
+
+
+sys.modules[__name__].__class__ = _ValidationModule
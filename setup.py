@@ -75,6 +75,9 @@ setup(
         'console_scripts': ['convert_ck=pyked.converters:main',
                             'respth2ck=pyked.converters:respth2ck',
                             'ck2respth=pyked.converters:ck2respth',
+                            'ck_export_bundle=pyked.offline:export_bundle',
+                            'ck_validate=pyked.batch:main',
+                            'ck_sidecars=pyked.converters:ck_sidecars',
                             ],
     }
 )